@@ -3,8 +3,6 @@
 Some miscellaneous functions, mostly used for testing.
 """
 import os
-import matplotlib
-import matplotlib.pyplot as pyplot
 
 
 class SAException(Exception):
@@ -21,6 +19,8 @@ def configureMatplotlib():
     """
     Configure matplotlib plots.
     """
+    import matplotlib
+    
     matplotlib.rc('axes', linewidth=2)
     matplotlib.rc('legend', fontsize=10, handlelength=2)
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Compare two sets of benchmark results (as saved by run_benchmarks.py).
+
+agent 10/26
+"""
+import json
+
+
+def compare(old_file, new_file, threshold = 0.1):
+    """
+    Print the change in time for each benchmark. Benchmarks that are
+    more than threshold slower are flagged.
+
+    Returns a list of the benchmarks that got slower.
+    """
+    with open(old_file) as fp:
+        old = json.load(fp)
+    with open(new_file) as fp:
+        new = json.load(fp)
+
+    print("old:", old["info"]["commit"], old["info"]["date"])
+    print("new:", new["info"]["commit"], new["info"]["date"])
+    print()
+
+    slower = []
+    for name in sorted(new["results"]):
+        if not name in old["results"]:
+            continue
+        
+        t_old = old["results"][name]["seconds"]
+        t_new = new["results"][name]["seconds"]
+        ratio = t_new/t_old
+        flag = ""
+        if (ratio > (1.0 + threshold)):
+            flag = "slower"
+            slower.append(name)
+        print("{0:24s} {1:9.3f} {2:9.3f} {3:6.2f}x {4:s}".format(name, t_old, t_new, ratio, flag))
+        
+    return slower
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Compare two sets of benchmark results.')
+
+    parser.add_argument('--old', dest='old', type=str, required=True,
+                        help = "The results JSON file to compare against.")
+    parser.add_argument('--new', dest='new', type=str, required=True,
+                        help = "The new results JSON file.")
+    parser.add_argument('--threshold', dest='threshold', type=float, required=False, default=0.1,
+                        help = "Fractional slow down to flag, the default is 0.1.")
+
+    args = parser.parse_args()
+
+    compare(args.old, args.new, threshold = args.threshold)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the conversion of a frame from ADU to photo-electrons
+and the padding of the frame for peak finding / fitting.
+
+This compares the original approach (new arrays for every step) with
+loading into re-used buffers (analysis_io.FrameReader.loadAFrame() with
+out, fitting.padArray() with out).
+
+agent 10/26
+"""
+import numpy
+import os
+import tempfile
+import timeit
+
+import storm_analysis.sa_library.analysis_io as analysisIO
+import storm_analysis.sa_library.datawriter as datawriter
+import storm_analysis.sa_library.fitting as fitting
+
+
+def originalLoadAFrame(frame_reader, frame_number):
+    """
+    FrameReader.loadAFrame() before buffer re-use.
+    """
+    frame = frame_reader.movie_data.loadAFrame(frame_number)
+    frame = (frame - frame_reader.offset) * (frame_reader.gain * frame_reader.rqe)
+    mask = (frame < 1.0)
+    if (numpy.sum(mask) > 0):
+        frame[mask] = 1.0
+    return frame
+
+def originalPadArray(ori_array, pad_size):
+    """
+    fitting.padArray() before buffer re-use.
+    """
+    [x_size, y_size] = ori_array.shape
+    lg_array = numpy.ones((x_size+2*pad_size,y_size+2*pad_size))
+    lg_array[pad_size:(x_size+pad_size),pad_size:(y_size+pad_size)] = ori_array.astype(numpy.float64)
+    lg_array[0:pad_size,:] = numpy.flipud(lg_array[pad_size:2*pad_size,:])
+    lg_array[(x_size+pad_size):(x_size+2*pad_size),:] = numpy.flipud(lg_array[x_size:(x_size+pad_size),:])
+    lg_array[:,0:pad_size] = numpy.fliplr(lg_array[:,pad_size:2*pad_size])
+    lg_array[:,(y_size+pad_size):(y_size+2*pad_size)] = numpy.fliplr(lg_array[:,y_size:(y_size+pad_size)])
+    return lg_array
+
+def benchmark(x_size = 256, y_size = 256, margin = 10, n_frames = 10, repeats = 20):
+    """
+    Returns [original ns/pixel, buffered ns/pixel].
+    """
+    movie_name = os.path.join(tempfile.mkdtemp(), "bench.dax")
+
+    # Make a movie. Values below the offset exercise the < 1.0 clamp.
+    numpy.random.seed(0)
+    dax_file = datawriter.DaxWriter(movie_name)
+    for i in range(n_frames):
+        image = numpy.random.normal(loc = 110.0, scale = 10.0, size = (y_size, x_size))
+        dax_file.addFrame(numpy.clip(image, 0, None).astype(numpy.uint16))
+    dax_file.close()
+
+    # memmap so that we are mostly measuring the conversion, not the I/O.
+    frame_reader = analysisIO.FrameReaderStd(movie_file = movie_name,
+                                             camera_gain = 2.0,
+                                             camera_offset = 100.0,
+                                             memmap = True)
+    frame_reader.verbose = False
+
+    frame_buffer = numpy.empty((y_size, x_size))
+    image_buffer = numpy.empty((y_size + 2*margin, x_size + 2*margin))
+
+    def original():
+        for i in range(n_frames):
+            originalPadArray(originalLoadAFrame(frame_reader, i), margin)
+
+    def buffered():
+        for i in range(n_frames):
+            fitting.padArray(frame_reader.loadAFrame(i, out = frame_buffer), margin, out = image_buffer)
+
+    # Check that both give the same answer.
+    for i in range(n_frames):
+        orig = originalPadArray(originalLoadAFrame(frame_reader, i), margin)
+        buff = fitting.padArray(frame_reader.loadAFrame(i, out = frame_buffer), margin, out = image_buffer)
+        assert numpy.array_equal(orig, buff)
+
+    n_pixels = float(x_size * y_size * n_frames)
+    times = []
+    for func in [original, buffered]:
+        elapsed = min(timeit.repeat(func, number = 1, repeat = repeats))
+        times.append(1.0e9 * elapsed / n_pixels)
+
+    frame_reader.close()
+    os.remove(movie_name)
+
+    return times
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'ADU to photo-electron conversion and padding micro-benchmark.')
+
+    parser.add_argument('--size', dest='size', type=int, required=False, default=256,
+                        help = "The frame size in pixels, the default is 256.")
+    parser.add_argument('--margin', dest='margin', type=int, required=False, default=10,
+                        help = "The padding margin in pixels, the default is 10.")
+
+    args = parser.parse_args()
+
+    [t_orig, t_buff] = benchmark(x_size = args.size, y_size = args.size, margin = args.margin)
+    print("original {0:.2f} ns/pixel, buffered {1:.2f} ns/pixel, speed-up {2:.2f}x".format(t_orig, t_buff, t_orig/t_buff))
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
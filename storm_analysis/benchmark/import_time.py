@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""
+Benchmark of how long it takes to import each of the entry point
+scripts (the modules that can be run from the command line). Each
+module is imported in a new Python process, as this is how the
+command line tools are used.
+
+Typical usage:
+
+python import_time.py --repeats 5
+
+python import_time.py --modules sa_utilities.hdf5_to_txt --detail
+
+agent 10/26
+"""
+import os
+import subprocess
+import sys
+import time
+
+import storm_analysis
+
+
+def entryPoints():
+    """
+    Returns the names of all the modules in storm_analysis that can
+    be run from the command line, other than tests and benchmarks.
+    """
+    sa_path = os.path.dirname(os.path.abspath(storm_analysis.__file__))
+
+    modules = []
+    for root, dirs, files in os.walk(sa_path):
+        dirs[:] = sorted(filter(lambda x: not (x in ["benchmark", "test"] or x.startswith(".") or x.startswith("_")), dirs))
+        for name in sorted(files):
+            if not name.endswith(".py") or name.startswith("_"):
+                continue
+            with open(os.path.join(root, name)) as fp:
+                if not ("__name__ == \"__main__\"" in fp.read()):
+                    continue
+            rel_path = os.path.relpath(os.path.join(root, name[:-3]), os.path.dirname(sa_path))
+            modules.append(rel_path.replace(os.sep, "."))
+    return modules
+
+def importDetail(module, n_slowest = 15):
+    """
+    Returns the n_slowest imports (cumulative time in seconds, module name)
+    when importing module, using Python's -X importtime option.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                          stdout = subprocess.PIPE,
+                          stderr = subprocess.PIPE,
+                          universal_newlines = True)
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        data = line[len("import time:"):].split("|")
+        try:
+            times.append([1.0e-6 * float(data[1]), data[2].strip()])
+        except ValueError:
+            # The header line.
+            pass
+    return sorted(times, reverse = True)[:n_slowest]
+
+def importTime(module, repeats = 3):
+    """
+    Returns the smallest time (in seconds) it took to start Python and
+    import module, or None if the module could not be imported.
+    """
+    best = None
+    for i in range(repeats):
+        start_time = time.time()
+        proc = subprocess.run([sys.executable, "-c", "import " + module],
+                              stdout = subprocess.DEVNULL,
+                              stderr = subprocess.DEVNULL)
+        elapsed = time.time() - start_time
+        if (proc.returncode != 0):
+            return None
+        if (best is None) or (elapsed < best):
+            best = elapsed
+    return best
+
+def benchmark(modules = None, repeats = 3):
+    """
+    Returns a dictionary of the import times in seconds. 'python' is
+    the time to start Python without importing anything.
+    """
+    if modules is None:
+        modules = entryPoints()
+
+    times = {"python" : importTime("sys", repeats = repeats)}
+    for module in modules:
+        times[module] = importTime(module, repeats = repeats)
+    return times
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Import time benchmark of the command line tools.')
+
+    parser.add_argument('--modules', dest='modules', type=str, required=False, nargs = "*",
+                        help = "The modules to time, for example 'sa_utilities.hdf5_to_txt'. The default is all of the entry points.")
+    parser.add_argument('--repeats', dest='repeats', type=int, required=False, default=3,
+                        help = "The number of times to import each module, the best time is reported. The default is 3.")
+    parser.add_argument('--detail', dest='detail', action='store_true', default=False,
+                        help = "Also list the slowest imports of each module.")
+
+    args = parser.parse_args()
+
+    modules = None
+    if args.modules is not None:
+        modules = []
+        for module in args.modules:
+            if not module.startswith("storm_analysis."):
+                module = "storm_analysis." + module
+            modules.append(module)
+
+    times = benchmark(modules = modules, repeats = args.repeats)
+
+    print("{0:60s} {1:s}".format("module", "time (s)"))
+    for module in sorted(times, key = lambda x: (times[x] is None, times[x])):
+        if times[module] is None:
+            print("  {0:58s} import failed".format(module))
+        else:
+            print("  {0:58s} {1:.3f}".format(module, times[module]))
+
+        if args.detail and (module != "python") and (times[module] is not None):
+            for [elapsed, name] in importDetail(module):
+                print("      {0:.3f} {1:s}".format(elapsed, name))
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+"""
+Make the (deterministic) data for the benchmarks. This creates the
+movies, the PSF models and the analysis parameters for each fitter,
+and a localization file for the I/O, tracking, drift correction and
+rendering benchmarks.
+
+Everything is written in the working directory.
+
+agent 10/26
+"""
+import numpy
+import pickle
+
+import storm_analysis.sa_library.parameters as parameters
+import storm_analysis.sa_library.sa_h5py as saH5Py
+
+import storm_analysis.simulator.background as background
+import storm_analysis.simulator.camera as camera
+import storm_analysis.simulator.emitters_on_grid as emittersOnGrid
+import storm_analysis.simulator.photophysics as photophysics
+import storm_analysis.simulator.psf as psf
+import storm_analysis.simulator.simulate as simulate
+
+import storm_analysis.psf_fft.make_psf_from_pf as makePSFFromPF
+import storm_analysis.pupilfn.make_pupil_fn as makePupilFn
+import storm_analysis.spliner.psf_to_spline as psfToSpline
+
+import storm_analysis.benchmark.settings as settings
+
+#
+# The 3D-DAOSTORM models that are benchmarked.
+#
+dao_models = ["2dfixed", "2d", "3d", "Z"]
+
+
+def commonParameters(params):
+    """
+    Parameters that are the same for all the fitters.
+    """
+    params.setAttr("max_frame", "int", -1)    
+    params.setAttr("start_frame", "int", -1)
+
+    params.setAttr("background_sigma", "float", 8.0)
+    params.setAttr("find_max_radius", "int", 5)
+    params.setAttr("iterations", "int", settings.iterations)
+    params.setAttr("pixel_size", "float", settings.pixel_size)
+    params.setAttr("sigma", "float", 1.5)
+    params.setAttr("threshold", "float", settings.threshold)
+
+    # Don't do tracking.
+    params.setAttr("descriptor", "string", "1")
+    params.setAttr("radius", "float", "0")
+
+    # Don't do drift-correction.
+    params.setAttr("d_scale", "int", 2)
+    params.setAttr("drift_correction", "int", 0)
+    params.setAttr("frame_step", "int", 500)
+    params.setAttr("z_correction", "int", 0)
+
+    return params
+
+def cameraParameters(params):
+    params.setAttr("camera_gain", "float", settings.camera_gain)
+    params.setAttr("camera_offset", "float", settings.camera_offset)
+    return params
+    
+def daoParameters(model):
+    """
+    Create a 3D-DAOSTORM parameters object.
+    """
+    params = cameraParameters(commonParameters(parameters.ParametersDAO()))
+
+    params.setAttr("fit_error_model", "string", "MLE")
+    params.setAttr("foreground_sigma", "float", 1.0)
+    params.setAttr("model", "string", model)
+    params.setAttr("roi_size", "int", 9)
+
+    params.setAttr("do_zfit", "int", 0)
+    params.setAttr("cutoff", "float", 0.0)    
+    params.setAttr("max_z", "float", 0.5)
+    params.setAttr("min_z", "float", -0.5)
+    params.setAttr("z_value", "float", 0.0)
+    params.setAttr("z_step", "float", 1.0)
+
+    params.setAttr("wx_wo", "float", 300.0)
+    params.setAttr("wx_c", "float", 150.0)
+    params.setAttr("wx_d", "float", 400.0)
+    params.setAttr("wxA", "float", 0.0)
+    params.setAttr("wxB", "float", 0.0)
+    params.setAttr("wxC", "float", 0.0)
+    params.setAttr("wxD", "float", 0.0)
+
+    params.setAttr("wy_wo", "float", 300.0)
+    params.setAttr("wy_c", "float", -150.0)
+    params.setAttr("wy_d", "float", 400.0)
+    params.setAttr("wyA", "float", 0.0)
+    params.setAttr("wyB", "float", 0.0)
+    params.setAttr("wyC", "float", 0.0)
+    params.setAttr("wyD", "float", 0.0)
+
+    return params
+
+def multiplaneParameters():
+    """
+    Create a Multiplane parameters object (pupil function PSF).
+    """
+    params = commonParameters(parameters.ParametersMultiplaneArb())
+
+    params.setAttr("find_max_radius", "int", 2)
+    params.setAttr("independent_heights", "int", 0)
+    params.setAttr("mapping", "filename", "map.map")
+    params.setAttr("max_z", "float", 0.75)
+    params.setAttr("min_z", "float", -0.75)
+    params.setAttr("z_value", "float-array", [-0.3, 0.0, 0.3])
+
+    for i in range(len(settings.z_planes)):
+        params.setAttr("channel" + str(i) + "_cal", "filename", "calib.npy")
+        params.setAttr("channel" + str(i) + "_ext", "string", "_c" + str(i+1) + ".dax")
+        params.setAttr("channel" + str(i) + "_offset", "int", 0)
+        params.setAttr("pupilfn" + str(i), "filename", "c" + str(i+1) + "_pupilfn.pfn")
+
+    return params
+
+def psfFFTParameters():
+    params = cameraParameters(commonParameters(parameters.ParametersPSFFFT()))
+    params.setAttr("psf", "filename", "psf.psf")
+    return params
+
+def pupilFnParameters():
+    params = cameraParameters(commonParameters(parameters.ParametersPupilFn()))
+    params.setAttr("max_z", "float", 0.5)
+    params.setAttr("min_z", "float", -0.5)
+    params.setAttr("pupil_function", "filename", "pupil_fn.pfn")
+    return params
+
+def splinerParameters():
+    params = cameraParameters(commonParameters(parameters.ParametersSpliner()))
+    params.setAttr("fit_error_model", "string", "MLE")
+    params.setAttr("spline", "filename", "psf.spline")
+    return params
+
+def makeLocalizations(h5_name, n_frames = None, locs_per_frame = None):
+    """
+    Create a localization file with always on emitters that drift
+    linearly in x, y and z.
+    """
+    if n_frames is None:
+        n_frames = settings.locs_frames
+    if locs_per_frame is None:
+        locs_per_frame = settings.locs_per_frame
+
+    numpy.random.seed(settings.seed)
+    margin = 10
+    sx = numpy.random.uniform(margin, settings.x_size - margin, locs_per_frame)
+    sy = numpy.random.uniform(margin, settings.y_size - margin, locs_per_frame)
+    sz = numpy.random.uniform(-settings.test_z_range, settings.test_z_range, locs_per_frame)
+    
+    with saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True) as h5:
+        h5.setMovieInformation(settings.x_size, settings.y_size, n_frames, "")
+        h5.setPixelSize(settings.pixel_size)
+        for i in range(n_frames):
+            locs = {"background" : numpy.random.uniform(10.0, 20.0, locs_per_frame),
+                    "height" : numpy.random.uniform(500.0, 1000.0, locs_per_frame),
+                    "sum" : numpy.random.uniform(2000.0, 4000.0, locs_per_frame),
+                    "x" : sx + 1.0e-4 * i + numpy.random.normal(scale = 0.1, size = locs_per_frame),
+                    "y" : sy - 5.0e-5 * i + numpy.random.normal(scale = 0.1, size = locs_per_frame),
+                    "z" : sz + 1.0e-5 * i + numpy.random.normal(scale = 0.02, size = locs_per_frame)}
+            h5.addLocalizations(locs, i)
+
+def makeMovie(movie_name, locs_name, psf_f, cam_f = None, photons = None):
+    if cam_f is None:
+        cam_f = lambda s, x, y, i3 : camera.Ideal(s, x, y, i3, settings.camera_offset)
+    if photons is None:
+        photons = settings.photons[1]
+        
+    bg_f = lambda s, x, y, i3 : background.UniformBackground(s, x, y, i3, photons = settings.photons[0])
+    pp_f = lambda s, x, y, i3 : photophysics.AlwaysOn(s, x, y, i3, photons)
+
+    numpy.random.seed(settings.seed)
+    sim = simulate.Simulate(background_factory = bg_f,
+                            camera_factory = cam_f,
+                            photophysics_factory = pp_f,
+                            psf_factory = psf_f,
+                            x_size = settings.x_size,
+                            y_size = settings.y_size)
+    sim.simulate(movie_name, locs_name, settings.n_frames, verbosity = settings.n_frames)
+
+def makeData(fitters = True, localizations = True):
+    """
+    fitters - Make the movies, PSFs and parameters for the fitters.
+    localizations - Make the localization file.
+    """
+    if fitters:
+        
+        # Emitter locations.
+        emittersOnGrid.emittersOnGrid("grid_list.hdf5",
+                                      settings.nx,
+                                      settings.ny,
+                                      1.5,
+                                      settings.spacing,
+                                      settings.test_z_range,
+                                      0.0,
+                                      seed = settings.seed)
+
+        # 3D-DAOSTORM, Gaussian PSF.
+        print("Creating 3D-DAOSTORM data.")
+        makeMovie("gaussian.dax",
+                  "grid_list.hdf5",
+                  lambda s, x, y, i3 : psf.GaussianPSF(s, x, y, i3, settings.pixel_size))
+        for model in dao_models:
+            daoParameters(model).toXMLFile("dao_" + model + ".xml")
+
+        # Spliner, pupilfn and PSF FFT, pupil function PSF.
+        print("Creating PSF model data.")
+        makeMovie("pupilfn.dax",
+                  "grid_list.hdf5",
+                  lambda s, x, y, i3 : psf.PupilFunction(s, x, y, i3, settings.pixel_size, settings.pupil_fn))
+
+        makePSFFromPF.makePSF("psf.psf",
+                              settings.psf_size,
+                              settings.pixel_size * 1.0e-3,
+                              settings.pupil_fn,
+                              settings.psf_z_range,
+                              settings.z_step)
+        psfFFTParameters().toXMLFile("psf_fft.xml")
+        
+        makePupilFn.makePupilFunction("pupil_fn.pfn",
+                                      settings.psf_size,
+                                      settings.pixel_size * 1.0e-3,
+                                      settings.pupil_fn)
+        pupilFnParameters().toXMLFile("pupilfn.xml")
+
+        # The spline is calculated from a more finely sampled PSF, with
+        # the additional information that measure_psf_beads.py provides.
+        makePSFFromPF.makePSF("spline_psf.psf",
+                              settings.psf_size,
+                              settings.pixel_size * 1.0e-3,
+                              settings.pupil_fn,
+                              settings.psf_z_range,
+                              0.5 * settings.z_step)
+        with open("spline_psf.psf", "rb") as fp:
+            psf_data = pickle.load(fp)
+        psf_data["type"] = "3D"
+        psf_data["version"] = 2.0
+        with open("spline_psf.psf", "wb") as fp:
+            pickle.dump(psf_data, fp)
+        psfToSpline.psfToSpline("spline_psf.psf", "psf.spline", settings.spline_size)
+        splinerParameters().toXMLFile("spliner.xml")
+
+        # Multiplane, pupil function PSF with one plane above and one below focus.
+        print("Creating Multiplane data.")
+        numpy.save("calib.npy", [numpy.zeros((settings.y_size, settings.x_size)) + settings.camera_offset,
+                                 numpy.ones((settings.y_size, settings.x_size)) * settings.camera_variance,
+                                 numpy.ones((settings.y_size, settings.x_size)) * settings.camera_gain,
+                                 numpy.ones((settings.y_size, settings.x_size)),
+                                 2])
+
+        mappings = {}
+        for [i, j] in [[0, 0], [0, 1], [1, 0]]:
+            mappings[str(i) + "_" + str(j) + "_x"] = numpy.array([0.0, 1.0, 0.0])
+            mappings[str(i) + "_" + str(j) + "_y"] = numpy.array([0.0, 0.0, 1.0])
+        with open("map.map", 'wb') as fp:
+            pickle.dump(mappings, fp)
+
+        locs = saH5Py.loadLocalizations("grid_list.hdf5")
+        for i, z_plane in enumerate(settings.z_planes):
+            saH5Py.saveLocalizations("grid_list_c" + str(i+1) + ".hdf5",
+                                     {"x" : locs["x"], "y" : locs["y"], "z" : locs["z"] + z_plane})
+
+            makePupilFn.makePupilFunction("c" + str(i+1) + "_pupilfn.pfn",
+                                          settings.psf_size,
+                                          settings.pixel_size * 1.0e-3,
+                                          settings.pupil_fn,
+                                          z_offset = -z_plane)
+            makeMovie("multiplane_c" + str(i+1) + ".dax",
+                      "grid_list_c" + str(i+1) + ".hdf5",
+                      lambda s, x, y, i3 : psf.PupilFunction(s, x, y, i3, settings.pixel_size, settings.pupil_fn),
+                      cam_f = lambda s, x, y, i3 : camera.SCMOS(s, x, y, i3, "calib.npy"),
+                      photons = settings.photons[1]/float(len(settings.z_planes)))
+        multiplaneParameters().toXMLFile("multiplane.xml")
+
+    if localizations:
+        print("Creating localization file.")
+        makeLocalizations("locs.hdf5")
+
+
+if (__name__ == "__main__"):
+    makeData()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+"""
+Benchmarks of the analysis hot paths. These time the analysis of
+simulated movies with each fitter, localization file I/O, tracking,
+drift correction and rendering.
+
+The results are saved in a JSON file, along with information about
+the commit and the computer, so that runs can be compared with
+compare.py.
+
+Typical usage:
+
+cd /tmp/bench
+python path/to/run_benchmarks.py --results results.json
+
+agent 10/26
+"""
+import datetime
+import glob
+import json
+import multiprocessing
+import numpy
+import os
+import platform
+import shutil
+import subprocess
+import time
+
+import storm_analysis
+import storm_analysis.sa_library.sa_h5py as saH5Py
+
+import storm_analysis.benchmark.make_data as makeData
+import storm_analysis.benchmark.settings as settings
+
+#
+# The names of the benchmarks.
+#
+fitters = ["2dfixed", "2d", "3d", "Z", "spliner", "pupilfn", "psf_fft", "multiplane"]
+others = ["io", "tracking", "drift", "rendering"]
+
+
+def analyzeMovie(fitter, h5_name):
+    """
+    Analyze the benchmark movie for a fitter.
+    """
+    if fitter in makeData.dao_models:
+        import storm_analysis.daostorm_3d.mufit_analysis as mfit
+        mfit.analyze("gaussian.dax", h5_name, "dao_" + fitter + ".xml")
+        
+    elif (fitter == "spliner"):
+        import storm_analysis.spliner.spline_analysis as splineAnalysis
+        splineAnalysis.analyze("pupilfn.dax", h5_name, "spliner.xml")
+        
+    elif (fitter == "pupilfn"):
+        import storm_analysis.pupilfn.pupilfn_analysis as pfAnalysis
+        pfAnalysis.analyze("pupilfn.dax", h5_name, "pupilfn.xml")
+        
+    elif (fitter == "psf_fft"):
+        import storm_analysis.psf_fft.psffft_analysis as psfFFTAnalysis
+        psfFFTAnalysis.analyze("pupilfn.dax", h5_name, "psf_fft.xml")
+        
+    elif (fitter == "multiplane"):
+        import storm_analysis.multi_plane.multi_plane as multiPlane
+        multiPlane.analyze("multiplane", h5_name, "multiplane.xml")
+
+    else:
+        raise Exception("Unknown fitter " + fitter)
+        
+def benchmarkDrift():
+    """
+    Time XYZ and RCC drift correction.
+    """
+    import storm_analysis.rcc.rcc_drift_correction as rccDriftCorrection
+    import storm_analysis.sa_utilities.xyz_drift_correction as xyzDriftCorrection
+
+    results = {}
+    h5_name = copyLocalizations("bench_drift.hdf5")
+    
+    [elapsed, temp] = timeIt(lambda : xyzDriftCorrection.xyzDriftCorrection(h5_name,
+                                                                           "bench_drift_xyz.txt",
+                                                                           settings.drift_step,
+                                                                           2,
+                                                                           -0.5,
+                                                                           0.5,
+                                                                           True))
+    results["drift.xyz"] = {"seconds" : elapsed}
+
+    [elapsed, temp] = timeIt(lambda : rccDriftCorrection.rccDriftCorrection(h5_name,
+                                                                           "bench_drift_rcc.txt",
+                                                                           settings.drift_step,
+                                                                           2,
+                                                                           -0.5,
+                                                                           0.5,
+                                                                           True,
+                                                                           make_plots = False))
+    results["drift.rcc"] = {"seconds" : elapsed}
+
+    return results
+
+def benchmarkFitter(fitter):
+    """
+    Time the analysis of a movie.
+    """
+    h5_name = "bench_" + fitter + ".hdf5"
+    removeFiles("bench_" + fitter + "*")
+
+    [elapsed, temp] = timeIt(lambda : analyzeMovie(fitter, h5_name))
+    with saH5Py.SAH5Reader(h5_name) as h5:
+        n_locs = h5.getNLocalizations()
+
+    return {"fitter." + fitter : {"seconds" : elapsed,
+                                  "frames_per_second" : settings.n_frames/elapsed,
+                                  "localizations" : n_locs}}
+
+def benchmarkIO():
+    """
+    Time localization file writing and reading.
+    """
+    results = {}
+    n_locs = settings.locs_frames * settings.locs_per_frame
+    
+    [elapsed, temp] = timeIt(lambda : makeData.makeLocalizations("bench_io.hdf5"))
+    results["io.write"] = {"seconds" : elapsed,
+                           "localizations_per_second" : n_locs/elapsed}
+
+    with saH5Py.SAH5Reader("bench_io.hdf5") as h5:
+        [elapsed, temp] = timeIt(lambda : h5.getLocalizations())
+        results["io.read_all"] = {"seconds" : elapsed,
+                                  "localizations_per_second" : n_locs/elapsed}
+
+        [elapsed, temp] = timeIt(lambda : h5.getLocalizationsInFrameRange(0, settings.drift_step))
+        results["io.read_range"] = {"seconds" : elapsed}
+
+        def iterate():
+            for fnum, locs in h5.localizationsIterator():
+                pass
+        [elapsed, temp] = timeIt(iterate)
+        results["io.iterate"] = {"seconds" : elapsed,
+                                 "frames_per_second" : settings.locs_frames/elapsed}
+        
+    return results
+
+def benchmarkRendering():
+    """
+    Time 2D and 3D rendering of the localizations.
+    """
+    import storm_analysis.sa_utilities.hdf5_to_image as h5Image
+
+    results = {}
+    h5_name = copyLocalizations("bench_rendering.hdf5")
+    
+    [elapsed, temp] = timeIt(lambda : h5Image.render2DImage(h5_name, scale = 4))
+    results["rendering.2d"] = {"seconds" : elapsed}
+
+    [elapsed, temp] = timeIt(lambda : h5Image.render2DImage(h5_name, scale = 4, sigma = 1.0))
+    results["rendering.2d_gaussian"] = {"seconds" : elapsed}
+
+    z_edges = numpy.linspace(-0.5, 0.5, 11)
+    [elapsed, temp] = timeIt(lambda : h5Image.render3DImage(h5_name, z_edges, scale = 4))
+    results["rendering.3d"] = {"seconds" : elapsed}
+
+    return results
+
+def benchmarkTracking():
+    """
+    Time tracking.
+    """
+    import storm_analysis.sa_utilities.tracker as tracker
+
+    h5_name = copyLocalizations("bench_tracking.hdf5")
+    [elapsed, temp] = timeIt(lambda : tracker.tracker(h5_name, descriptor = "1", radius = 0.5))
+    return {"tracking" : {"seconds" : elapsed,
+                          "frames_per_second" : settings.locs_frames/elapsed}}
+
+def copyLocalizations(h5_name):
+    shutil.copyfile("locs.hdf5", h5_name)
+    return h5_name
+
+def machineInfo():
+    """
+    Return information about the commit and the computer.
+    """
+    info = {"cpu_count" : multiprocessing.cpu_count(),
+            "date" : datetime.datetime.now().isoformat(),
+            "machine" : platform.machine(),
+            "numpy" : numpy.__version__,
+            "platform" : platform.platform(),
+            "processor" : platform.processor(),
+            "python" : platform.python_version()}
+    
+    try:
+        src_dir = os.path.dirname(os.path.dirname(storm_analysis.__file__))
+        info["commit"] = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                                 cwd = src_dir,
+                                                 stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["commit"] = None
+
+    return info
+
+def removeFiles(pattern):
+    for elt in glob.glob(pattern):
+        os.remove(elt)
+
+def runBenchmarks(results_file, benchmarks = None, make_data = True):
+    """
+    results_file - The JSON file to save the results in.
+    benchmarks - A list of the benchmarks to run, the default is all of them.
+    make_data - Create the movies, etc. If this is False then they must
+                already exist in the working directory.
+    """
+    if benchmarks is None:
+        benchmarks = fitters + others
+
+    if make_data:
+        makeData.makeData(fitters = any(elt in fitters for elt in benchmarks),
+                          localizations = any(elt in others for elt in benchmarks))
+
+    results = {}
+    for name in benchmarks:
+        print("Benchmarking", name)
+        if name in fitters:
+            results.update(benchmarkFitter(name))
+        elif (name == "io"):
+            results.update(benchmarkIO())
+        elif (name == "tracking"):
+            results.update(benchmarkTracking())
+        elif (name == "drift"):
+            results.update(benchmarkDrift())
+        elif (name == "rendering"):
+            results.update(benchmarkRendering())
+        else:
+            raise Exception("Unknown benchmark " + name)
+
+    with open(results_file, "w") as fp:
+        json.dump({"info" : machineInfo(), "results" : results}, fp, indent = 2, sort_keys = True)
+
+    print()
+    for name in sorted(results):
+        print("{0:24s} {1:.3f} seconds".format(name, results[name]["seconds"]))
+
+    return results
+    
+def timeIt(func):
+    start_time = time.time()
+    result = func()
+    return [time.time() - start_time, result]
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Benchmarks of the analysis hot paths.')
+
+    parser.add_argument('--results', dest='results', type=str, required=True,
+                        help = "The name of the JSON file to save the results in.")
+    parser.add_argument('--benchmarks', dest='benchmarks', type=str, required=False, nargs = "*", default=None,
+                        help = "The benchmarks to run, one or more of " + ", ".join(fitters + others) + ". The default is all of them.")
+    parser.add_argument('--no-data', dest='no_data', action='store_true', default=False,
+                        help = "Don't create the data, use the data from a previous run.")
+
+    args = parser.parse_args()
+
+    runBenchmarks(args.results, benchmarks = args.benchmarks, make_data = not args.no_data)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
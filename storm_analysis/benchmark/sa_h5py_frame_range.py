@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Benchmark of SAH5Py.getLocalizationsInFrameRange().
+
+This compares the original approach (loading and concatenating frame
+by frame) with the bulk reader, and with the bulk reader on a file that
+uses the 'columnar' layout.
+
+agent 10/26
+"""
+import numpy
+import os
+import tempfile
+import time
+
+import storm_analysis.sa_library.sa_h5py as saH5Py
+
+fields = ["background", "height", "sum", "x", "xsigma", "y", "ysigma", "z"]
+
+
+def originalFrameRange(h5, start, stop, fields):
+    """
+    SAH5Py.getLocalizationsInFrameRange() before the bulk reader.
+    """
+    locs = {}
+    for i in range(start, stop):
+        temp = h5.getLocalizationsInFrame(i, fields = fields)
+        if(not bool(temp)):
+            continue
+            
+        for field in temp:
+            if field in locs:
+                locs[field] = numpy.concatenate((locs[field], temp[field]))
+            else:
+                locs[field] = temp[field]
+    return locs
+
+def makeFile(h5_name, n_frames, locs_per_frame, layout):
+    numpy.random.seed(0)
+    with saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True, layout = layout) as h5:
+        h5.setMovieInformation(256, 256, n_frames, "")
+        for i in range(n_frames):
+            locs = {}
+            for field in fields:
+                locs[field] = numpy.random.uniform(size = locs_per_frame)
+            h5.addLocalizations(locs, i)
+
+def timeIt(func):
+    start_time = time.time()
+    locs = func()
+    return [time.time() - start_time, locs]
+
+def benchmark(n_frames = 20000, locs_per_frame = 500, range_frames = 2000, original = True):
+    """
+    The defaults give a file with 10M localizations.
+
+    Returns a dictionary of the times in seconds.
+    """
+    times = {}
+    names = {}
+    for layout in ["frames", "columnar"]:
+        names[layout] = os.path.join(tempfile.mkdtemp(), "bench_" + layout + ".hdf5")
+        [times["write_" + layout], temp] = timeIt(lambda : makeFile(names[layout], n_frames, locs_per_frame, layout))
+
+    with saH5Py.SAH5Reader(names["frames"]) as h5:
+        
+        # A frame range, like in drift correction.
+        if original:
+            [times["range_original"], locs_o] = timeIt(lambda : originalFrameRange(h5, 0, range_frames, fields))
+        [times["range_bulk"], locs_b] = timeIt(lambda : h5.getLocalizationsInFrameRange(0, range_frames, fields = fields))
+        if original:
+            for field in fields:
+                assert numpy.array_equal(locs_o[field], locs_b[field])
+                
+        # All the localizations.
+        [times["all_bulk"], locs_b] = timeIt(lambda : h5.getLocalizations(fields = fields))
+
+    with saH5Py.SAH5Reader(names["columnar"]) as h5:
+        [times["range_columnar"], locs_c] = timeIt(lambda : h5.getLocalizationsInFrameRange(0, range_frames, fields = fields))
+        [times["all_columnar"], locs_c] = timeIt(lambda : h5.getLocalizations(fields = fields))
+        for field in fields:
+            assert numpy.array_equal(locs_b[field], locs_c[field])
+
+    for layout in names:
+        os.remove(names[layout])
+
+    return times
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'SAH5Py frame range read benchmark.')
+
+    parser.add_argument('--frames', dest='frames', type=int, required=False, default=20000,
+                        help = "The number of frames, the default is 20000.")
+    parser.add_argument('--locs', dest='locs', type=int, required=False, default=500,
+                        help = "The number of localizations per frame, the default is 500.")
+    parser.add_argument('--range', dest='range', type=int, required=False, default=2000,
+                        help = "The size of the frame range to load, the default is 2000.")
+    parser.add_argument('--no-original', dest='original', action='store_false', default=True,
+                        help = "Don't time the original (slow) approach.")
+
+    args = parser.parse_args()
+
+    times = benchmark(n_frames = args.frames,
+                      locs_per_frame = args.locs,
+                      range_frames = args.range,
+                      original = args.original)
+    
+    print("{0:d} localizations".format(args.frames * args.locs))
+    for key in sorted(times):
+        print("  {0:15s} {1:.2f} seconds".format(key, times[key]))
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+Benchmark of the SAH5Py storage options.
+
+This writes the same localizations with different chunk sizes and
+compression options, then measures the file size and how long it
+takes to write the file and to read all of the localizations back.
+
+agent 10/26
+"""
+import numpy
+import os
+import tempfile
+import time
+
+import storm_analysis.sa_library.sa_h5py as saH5Py
+
+fields = ["background", "height", "sum", "x", "xsigma", "y", "ysigma", "z"]
+
+# The storage options to compare.
+options = {"none" : {},
+           "gzip" : {"compression" : "gzip"},
+           "gzip_shuffle" : {"compression" : "gzip", "shuffle" : True},
+           "lzf" : {"compression" : "lzf"},
+           "lzf_shuffle" : {"compression" : "lzf", "shuffle" : True},
+           "lzf_shuffle_single" : {"compression" : "lzf",
+                                   "shuffle" : True,
+                                   "single_precision" : ",".join(fields)}}
+
+
+def makeLocalizations(locs_per_frame):
+    """
+    Localizations with roughly the precision of real data, random
+    64 bit floats compress much worse than real localizations.
+    """
+    locs = {"background" : numpy.round(numpy.random.normal(loc = 20.0, scale = 2.0, size = locs_per_frame), 2),
+            "height" : numpy.round(numpy.random.uniform(low = 100.0, high = 1000.0, size = locs_per_frame), 1),
+            "x" : numpy.random.uniform(high = 256.0, size = locs_per_frame),
+            "xsigma" : numpy.round(numpy.random.normal(loc = 1.5, scale = 0.1, size = locs_per_frame), 3),
+            "y" : numpy.random.uniform(high = 256.0, size = locs_per_frame),
+            "ysigma" : numpy.round(numpy.random.normal(loc = 1.5, scale = 0.1, size = locs_per_frame), 3),
+            "z" : numpy.round(numpy.random.uniform(low = -0.5, high = 0.5, size = locs_per_frame), 3)}
+    locs["sum"] = numpy.round(2.0 * numpy.pi * locs["height"] * locs["xsigma"] * locs["ysigma"], 1)
+    return locs
+
+def makeFile(h5_name, frame_locs, layout, storage):
+    with saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True, layout = layout, storage = storage) as h5:
+        h5.setMovieInformation(256, 256, len(frame_locs), "")
+        for i, locs in enumerate(frame_locs):
+            h5.addLocalizations(locs, i)
+
+def readFile(h5_name):
+    with saH5Py.SAH5Reader(h5_name) as h5:
+        return h5.getLocalizations(fields = fields)
+
+def timeIt(func):
+    start_time = time.time()
+    locs = func()
+    return [time.time() - start_time, locs]
+
+def benchmark(n_frames = 10000, locs_per_frame = 500, layout = "columnar", chunk_size = 0):
+    """
+    The defaults give a file with 5M localizations.
+
+    Returns a dictionary of [write time, read time, file size in MB] for
+    each of the options.
+    """
+    numpy.random.seed(0)
+    frame_locs = []
+    for i in range(n_frames):
+        frame_locs.append(makeLocalizations(locs_per_frame))
+
+    results = {}
+    h5_dir = tempfile.mkdtemp()
+    for name in options:
+        storage = dict(options[name])
+        storage["chunk_size"] = chunk_size
+        h5_name = os.path.join(h5_dir, "bench_" + name + ".hdf5")
+        
+        [t_write, temp] = timeIt(lambda : makeFile(h5_name, frame_locs, layout, storage))
+        [t_read, locs] = timeIt(lambda : readFile(h5_name))
+        results[name] = [t_write, t_read, os.path.getsize(h5_name)/(1024.0 * 1024.0)]
+
+        # Check that we got the same localizations back.
+        for field in fields:
+            expected = numpy.concatenate([x[field] for x in frame_locs])
+            if "single_precision" in storage:
+                assert numpy.allclose(locs[field], expected, rtol = 1.0e-6)
+            else:
+                assert numpy.array_equal(locs[field], expected)
+        
+        os.remove(h5_name)
+    os.rmdir(h5_dir)
+    
+    return results
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'SAH5Py storage options benchmark.')
+
+    parser.add_argument('--frames', dest='frames', type=int, required=False, default=10000,
+                        help = "The number of frames, the default is 10000.")
+    parser.add_argument('--locs', dest='locs', type=int, required=False, default=500,
+                        help = "The number of localizations per frame, the default is 500.")
+    parser.add_argument('--layout', dest='layout', type=str, required=False, default="columnar",
+                        help = "The file layout, 'frames' or 'columnar' (the default).")
+    parser.add_argument('--chunk_size', dest='chunk_size', type=int, required=False, default=0,
+                        help = "The HDF5 chunk size, the default is the SAH5Py default.")
+
+    args = parser.parse_args()
+
+    results = benchmark(n_frames = args.frames,
+                        locs_per_frame = args.locs,
+                        layout = args.layout,
+                        chunk_size = args.chunk_size)
+
+    print("{0:d} localizations, '{1:s}' layout".format(args.frames * args.locs, args.layout))
+    print("  {0:20s} {1:>10s} {2:>10s} {3:>10s}".format("options", "write (s)", "read (s)", "size (MB)"))
+    for name in sorted(results):
+        print("  {0:20s} {1:10.2f} {2:10.2f} {3:10.1f}".format(name, *results[name]))
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
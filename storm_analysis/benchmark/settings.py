@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Settings to use for the benchmarks.
+
+agent 10/26
+"""
+
+camera_gain = 1.0
+camera_offset = 100.0
+camera_variance = 1.0
+iterations = 20
+
+# Each fitter is timed on a movie with this many frames.
+n_frames = 20
+nx = 12
+ny = 12
+photons = [20, 2000]
+pixel_size = 100.0
+psf_size = 30
+psf_z_range = 0.6
+pupil_fn = [[1.3, 2, 2]]
+seed = 0
+spacing = 20
+spline_size = 10
+test_z_range = 0.3
+threshold = 6.0
+x_size = 256
+y_size = 256
+z_planes = [-0.250, 0.250]
+z_step = 0.2
+
+# The localization file for the I/O, tracking, drift correction and
+# rendering benchmarks. The localizations are always on with a small
+# linear drift.
+locs_frames = 5000
+locs_per_frame = 200
+
+# Drift correction bin size in frames.
+drift_step = 500
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -14,6 +14,17 @@ def initFindAndFit(parameters):
     """
     Return the appropriate type of finder and fitter.
     """
+    if (parameters.getAttr("tile_size", 0) > 0):
+        return fitting.TiledPeakFinderFitter(find_fit_init = initFinderFitter,
+                                             parameters = parameters)
+    else:
+        return initFinderFitter(parameters)
+
+
+def initFinderFitter(parameters):
+    """
+    Return the appropriate type of (untiled) finder and fitter.
+    """
     fmodel = parameters.getAttr("model")
     emodel = parameters.getAttr("fit_error_model")
     
@@ -53,7 +64,8 @@ def initFindAndFit(parameters):
 
     # Create C fitter object.
     mfitter = None
-    kwds = {'roi_size' : finder.getROISize(),
+    kwds = {'n_threads' : parameters.getAttr("fit_threads", 1),
+            'roi_size' : finder.getROISize(),
             'rqe' : rqe,
             'scmos_cal' : variance,
             'wx_params' : wx_params,
@@ -59,7 +59,7 @@ class SAH5Clusters(saH5Py.SAH5Py):
             if (cl_size > 0):
                 cl_grp = clusters_grp.create_group(self.getClusterName(n_clusters))
                 for field in cluster_data:
-                    cl_grp.create_dataset(field, data = cluster_data[field][cl_mask])
+                    self.createDataset(cl_grp, field, cluster_data[field][cl_mask])
                 cl_grp.attrs['cl_size'] = cl_size
                 
                 n_clusters += 1
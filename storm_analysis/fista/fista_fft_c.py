@@ -10,6 +10,7 @@ import numpy
 from numpy.ctypeslib import ndpointer
 
 import storm_analysis.sa_library.cs_algorithm as csAlgorithm
+import storm_analysis.sa_library.fftw_wisdom as fftwWisdom
 import storm_analysis.sa_library.loadclib as loadclib
 import storm_analysis.sa_library.recenter_psf as recenterPSF
 
@@ -83,7 +84,9 @@ class FISTA(csAlgorithm.CSAlgorithm):
         for i in range(self.shape[2]):
             c_psfs[:,:,i] = recenterPSF.recenterPSF(psfs[:,:,i])
         c_psfs = numpy.ascontiguousarray(c_psfs, dtype = numpy.float)
+        fftwWisdom.importWisdom()
         self.c_fista = fista_fft.initialize3D(c_psfs, timestep, self.shape[0], self.shape[1], self.shape[2], self.dwls)
+        fftwWisdom.exportWisdom()
 
     def cleanup(self):
         fista_fft.cleanup(self.c_fista)
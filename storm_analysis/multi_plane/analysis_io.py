@@ -104,12 +104,17 @@ class MPMovieReader(object):
         self.backgrounds = []
         self.bg_estimators = []
         self.cur_frame = 0
+        self.descriptor = ""
         self.frames = []
         self.max_frame = 0
         self.offsets = []
         self.parameters = parameters
         self.planes = []
+        self.skip_descriptors = ""
 
+        if (parameters.getAttr("follow", 0) != 0):
+            raise analysisIO.AnalysisIOException("Multi-plane movies cannot be analyzed while they are being acquired.")
+        
         #
         # Load the movies and offsets for each plane/channel. At present
         # multiplane expects the sCMOS camera calibration data.
@@ -188,6 +193,9 @@ class MPMovieReader(object):
     def getNPlanes(self):
         return len(self.planes)
     
+    def hasNextFrame(self):
+        return True
+    
     def hashID(self):
         return self.planes[0].hashID()
 
@@ -202,6 +210,9 @@ class MPMovieReader(object):
 
             # Load planes & remove all values less than 1.0 as we are doing MLE fitting.
             self.frames = []
+            if self.skipCurrentFrame():
+                return True
+            
             frames = self.getFrames(self.cur_frame)
             for frame in frames:
                 mask = (frame < 1.0)
@@ -232,6 +243,9 @@ class MPMovieReader(object):
                 if (self.parameters.getAttr("max_frame") < self.movie_l):
                     self.max_frame = self.parameters.getAttr("max_frame")
 
+        # Configure frame skipping, if any.
+        [self.descriptor, self.skip_descriptors] = analysisIO.getSkipDescriptors(self.parameters)
+
         # Configure background estimator, if any.
         #
         # FIXME: Use of a background estimator has not been tested.
@@ -244,3 +258,15 @@ class MPMovieReader(object):
                                                              start_frame = self.cur_frame + self.offsets[i],
                                                              sample_size = s_size)
                 self.bg_estimators.append(bg_est)
+
+    def shouldSkip(self, frame_number):
+        """
+        Returns True if this frame should not be analyzed based on its descriptor.
+        """
+        return analysisIO.skipFrame(self.descriptor, self.skip_descriptors, frame_number)
+
+    def skipCurrentFrame(self):
+        """
+        Returns True if the current frame should not be analyzed.
+        """
+        return self.shouldSkip(self.cur_frame)
@@ -610,6 +610,15 @@ class MPFinderFitter(fitting.PeakFinderFitter):
     """
     Multi-plane peak finding and fitting.
     """
+    def getEmptyPeaks(self):
+        """
+        Create a list of dictionaries with no peaks.
+        """
+        peaks = []
+        for i in range(self.peak_finder.n_channels):
+            peaks.append(super(MPFinderFitter, self).getEmptyPeaks())
+        return peaks
+
     def getPeakProperties(self):
         """
         Create a list of dictionaries with the requested properties.
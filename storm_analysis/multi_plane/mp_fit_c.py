@@ -155,6 +155,20 @@ class MPFit(daoFitC.MultiFitter):
                 
             self.clib.mpCleanup(self.mfit)
 
+    def getFitCounters(self):
+        """
+        Return a dictionary with the current values of the fitting counters,
+        these are summed over all the channels.
+        """
+        counters = {"iterations" : self.getIterations(),
+                    "n_proximity" : self.n_proximity,
+                    "n_significance" : self.n_significance}
+        for name in daoFitC.fit_counters:
+            counters[name] = 0
+            for i in range(self.n_channels):
+                counters[name] += getattr(self.mfit.contents.fit_data[i].contents, name)
+        return counters
+
     def getFitImage(self):
         """
         Return the fit images for each channel.
@@ -196,6 +210,15 @@ class MPFit(daoFitC.MultiFitter):
         """
         return self.mfit.contents.fit_data[channel].contents.max_nfit
 
+    def getPeakProperties(self, p_names, channel = 0):
+        """
+        Return a dictionary of numpy arrays containing the requested properties.
+        """
+        props = {}
+        for p_name in p_names:
+            props[p_name] = self.getPeakProperty(p_name, channel = channel)
+        return props
+
     def getPeakProperty(self, p_name, channel = 0):
         """
         Return a numpy array containing the requested property.
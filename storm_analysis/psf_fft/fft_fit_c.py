@@ -27,6 +27,11 @@ def loadFFTFitC():
     fft_fit.mFitGetNError.argtypes = [ctypes.c_void_p]
     fft_fit.mFitGetNError.restype = ctypes.c_int
     
+    fft_fit.mFitGetPeakProperties.argtypes = [ctypes.c_void_p,
+                                              ndpointer(dtype=numpy.float64),
+                                              ndpointer(dtype=numpy.int32),
+                                              ctypes.c_int]
+
     fft_fit.mFitGetPeakPropertyDouble.argtypes = [ctypes.c_void_p,
                                                   ndpointer(dtype=numpy.float64),
                                                   ctypes.c_char_p]
@@ -55,6 +60,11 @@ def loadFFTFitC():
 
     fft_fit.mFitSetPeakStatus.argtypes = [ctypes.c_void_p,
                                           ndpointer(dtype=numpy.int32)]
+
+    fft_fit.mFitUpdateFitImage.argtypes = [ctypes.c_void_p,
+                                           ndpointer(dtype=numpy.float64),
+                                           ndpointer(dtype=numpy.int32)]
+    fft_fit.mFitUpdateFitImage.restype = ctypes.c_int
     
     # From psf_fft/fft_fit.c
     fft_fit.ftFitCleanup.argtypes = [ctypes.c_void_p]
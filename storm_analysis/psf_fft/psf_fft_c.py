@@ -10,6 +10,7 @@ import numpy
 from numpy.ctypeslib import ndpointer
 import os
 
+import storm_analysis.sa_library.fftw_wisdom as fftwWisdom
 import storm_analysis.sa_library.loadclib as loadclib
 
 psf_fft = loadclib.loadCLibrary("psf_fft")
@@ -54,10 +55,12 @@ class PSFFFT(object):
         self.psf_shape = psf.shape
 
         c_psf = numpy.ascontiguousarray(psf, dtype = numpy.float64)
+        fftwWisdom.importWisdom()
         self.pfft = psf_fft.pFTInitialize(c_psf,
                                           self.psf_shape[0],
                                           self.psf_shape[1],
                                           self.psf_shape[2])
+        fftwWisdom.exportWisdom()
 
     def cleanup(self):
         psf_fft.pFTCleanup(self.pfft)
@@ -43,7 +43,8 @@ def analyze(movie_name, mlist_name, settings_name):
     std_analysis.standardAnalysis(finder,
                                   movie_reader,
                                   data_writer,
-                                  parameters)
+                                  parameters,
+                                  find_peaks_init = findPeaksStd.initFindAndFit)
 
 
 if (__name__ == "__main__"):
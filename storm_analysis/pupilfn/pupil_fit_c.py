@@ -26,6 +26,11 @@ def loadPupilFitC():
     pupil_fit.mFitGetNError.argtypes = [ctypes.c_void_p]
     pupil_fit.mFitGetNError.restype = ctypes.c_int
     
+    pupil_fit.mFitGetPeakProperties.argtypes = [ctypes.c_void_p,
+                                                ndpointer(dtype=numpy.float64),
+                                                ndpointer(dtype=numpy.int32),
+                                                ctypes.c_int]
+
     pupil_fit.mFitGetPeakPropertyDouble.argtypes = [ctypes.c_void_p,
                                                     ndpointer(dtype=numpy.float64),
                                                     ctypes.c_char_p]
@@ -53,7 +58,12 @@ def loadPupilFitC():
     pupil_fit.mFitRemoveRunningPeaks.argtypes = [ctypes.c_void_p]
 
     pupil_fit.mFitSetPeakStatus.argtypes = [ctypes.c_void_p,
-                                            ndpointer(dtype=numpy.int32)]       
+                                            ndpointer(dtype=numpy.int32)]
+
+    pupil_fit.mFitUpdateFitImage.argtypes = [ctypes.c_void_p,
+                                             ndpointer(dtype=numpy.float64),
+                                             ndpointer(dtype=numpy.int32)]
+    pupil_fit.mFitUpdateFitImage.restype = ctypes.c_int
     
     # From pupilfn/pupil_fit.c
     pupil_fit.pfitCleanup.argtypes = [ctypes.c_void_p]
@@ -9,6 +9,7 @@ import numpy
 from numpy.ctypeslib import ndpointer
 import os
 
+import storm_analysis.sa_library.fftw_wisdom as fftwWisdom
 import storm_analysis.sa_library.loadclib as loadclib
 
 
@@ -104,10 +105,12 @@ class PupilFunction(object):
 
         # geometry.kz will be a complex number, but the magnitude of the
         # imaginary component is zero so we just ignore it.
+        fftwWisdom.importWisdom()
         self.pfn = pupil_fn.pfnInitialize(numpy.ascontiguousarray(geometry.kx, dtype = numpy.float64),
                                           numpy.ascontiguousarray(geometry.ky, dtype = numpy.float64),
                                           numpy.ascontiguousarray(numpy.real(geometry.kz), dtype = numpy.float64),
                                           geometry.size)
+        fftwWisdom.exportWisdom()
 
         if hasattr(geometry, "px_ex"):
             pupil_fn.pfnSetPNEN(self.pfn,
@@ -11,6 +11,7 @@ approach for the Z correction.
 Hazen 09/14
 """
 
+import multiprocessing
 import numpy
 import pickle
 import scipy.interpolate
@@ -20,8 +21,43 @@ import argparse
 import storm_analysis.sa_library.drift_utilities as driftUtils
 import storm_analysis.sa_library.imagecorrelation as imagecorrelation
 
+#
+# The correlator and the FFTs of the images of each bin. This is a
+# global so that each worker process only gets a copy once, at start up.
+#
+worker_data = {}
+
+#
+# The maximum number of images to correlate against a reference at once.
+#
+batch_size = 8
+
 
-def rccDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max, correct_z, make_plots = True):
+def initWorker(xy_corr, bin_ffts):
+    worker_data["xy_corr"] = xy_corr
+    worker_data["bin_ffts"] = bin_ffts
+    
+def pairOffsets(batch):
+    """
+    Calculate the offsets between the image of bin i and the images of
+    bins j_start to j_stop from their FFTs.
+
+    Returns a list of [i, j, dx, dy, success].
+    """
+    [i, j_start, j_stop] = batch
+    xy_corr = worker_data["xy_corr"]
+    bin_ffts = worker_data["bin_ffts"]
+    scale = float(xy_corr.scale)
+
+    xy_corr.setReferenceFFT(bin_ffts[i])
+    offsets = xy_corr.offsetsFromFFTs(numpy.array(bin_ffts[j_start:j_stop]))
+
+    results = []
+    for j, [corr, dx, dy, success] in enumerate(offsets):
+        results.append([i, j + j_start, dx/scale, dy/scale, success])
+    return results
+
+def rccDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max, correct_z, make_plots = True, n_processes = None):
     """
     hdf5_filename - The localizations file for drift estimation.
     drift_filename - A text file to save the estimated drift in.
@@ -30,6 +66,8 @@ def rccDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
     z_min - Minimum localization z value in microns.
     z_max - Maximum localization z value in microns.
     correct_z - Estimate drift in z as well as in x/y.
+    n_processes - The number of processes to use to calculate the offsets
+                  between the bins, the default is one per CPU.
     """
 
     z_bins = int((z_max - z_min)/0.05)
@@ -74,33 +112,50 @@ def rccDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
             frame += step
         bin_edges.append(frame)
 
-    # Estimate offsets between all pairs of sub images.        
+    # Create the image for each bin (once) and calculate its FFT.
     centers = []
-    pairs = []
+    bin_ffts = []
+    xy_corr = imagecorrelation.XYCorrelator(shape = h5_dc.im_shape_2D, scale = scale)
     for i in range(len(bin_edges)-1):
         centers.append((bin_edges[i+1] + bin_edges[i])/2)
-        for j in range(i+1, len(bin_edges)-1):
-            h5_dc.setFrameRange(bin_edges[i], bin_edges[i+1])
-            sub1 = h5_dc.grid2D()
-
-            h5_dc.setFrameRange(bin_edges[j], bin_edges[j+1])
-            sub2 = h5_dc.grid2D()
-
-            [corr, dx, dy, success] = imagecorrelation.xyOffset(sub1, sub2, scale)
+        h5_dc.setFrameRange(bin_edges[i], bin_edges[i+1])
+        bin_ffts.append(xy_corr.fft(h5_dc.grid2D()))
 
-            dx = dx/float(scale)
-            dy = dy/float(scale)
+    # Estimate offsets between all pairs of sub images, in batches
+    # of images that are correlated against the same reference.
+    batches = []
+    for i in range(len(bin_edges)-1):
+        for j in range(i+1, len(bin_edges)-1, batch_size):
+            batches.append([i, j, min(j + batch_size, len(bin_edges)-1)])
+
+    if n_processes is None:
+        n_processes = multiprocessing.cpu_count()
+    n_processes = min(n_processes, len(batches))
+
+    if (n_processes > 1):
+        pool = multiprocessing.Pool(processes = n_processes,
+                                    initializer = initWorker,
+                                    initargs = (xy_corr, bin_ffts))
+        results = pool.map(pairOffsets, batches)
+        pool.close()
+        pool.join()
+    else:
+        initWorker(xy_corr, bin_ffts)
+        results = list(map(pairOffsets, batches))
+    worker_data.clear()
 
-            print("offset between frame ranges", bin_edges[i], "-", bin_edges[i+1],
-                  "and", bin_edges[j], "-", bin_edges[j+1])
+    pairs = []
+    for [i, j, dx, dy, success] in [elt for batch in results for elt in batch]:
+        print("offset between frame ranges", bin_edges[i], "-", bin_edges[i+1],
+              "and", bin_edges[j], "-", bin_edges[j+1])
 
-            if success:
-                print(" -> {0:0.3f} {1:0.3f} good".format(dx, dy))
-            else:
-                print(" -> {0:0.3f} {1:0.3f} bad".format(dx, dy))
-            print("")
+        if success:
+            print(" -> {0:0.3f} {1:0.3f} good".format(dx, dy))
+        else:
+            print(" -> {0:0.3f} {1:0.3f} bad".format(dx, dy))
+        print("")
 
-            pairs.append([i, j, dx, dy, success])
+        pairs.append([i, j, dx, dy, success])
 
     print("--")
 
@@ -212,6 +267,7 @@ def rccDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
 
     driftz = numpy.zeros((dx.size))
     xyz_master = None
+    z_corr = None
     for i in range(len(bin_edges)-1):
         h5_dc.setFrameRange(bin_edges[i], bin_edges[i+1])
         h5_dc.setDriftCorrectionXY(driftx[i], drifty[i])
@@ -219,12 +275,14 @@ def rccDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
         
         if xyz_master is None:
             xyz_master = h5_dc.grid3D(z_min, z_max, drift_corrected = True)
+            z_corr = imagecorrelation.ZCorrelator(shape = xyz_master.shape)
+            z_corr.setReference(xyz_master)
             continue
 
         xyz_curr = h5_dc.grid3D(z_min, z_max, drift_corrected = True)
             
         # Do z correlation
-        [corr, fit, dz, z_success] = imagecorrelation.zOffset(xyz_master, xyz_curr)
+        [corr, fit, dz, z_success] = z_corr.offset(xyz_curr)
 
         # Update Values
         if z_success:
@@ -237,6 +295,7 @@ def rccDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
         if z_success:
             h5_dc.setDriftCorrectionZ(-dz)
             xyz_master += h5_dc.grid3D(z_min, z_max, drift_corrected = True)
+            z_corr.setReference(xyz_master)
 
         print("{0:d} {1:d} {2:0.3f}".format(bin_edges[i], bin_edges[i+1], dz))
         driftz[i] = -dz
@@ -282,10 +341,13 @@ if (__name__ == "__main__"):
                         help = "Maximum z value in microns.")
     parser.add_argument('--zcorrect', dest='correct_z', type=bool, required=False, default=True,
                         help = "Also perform drift correction in Z.")
+    parser.add_argument('--processes', dest='n_processes', type=int, required=False, default=None,
+                        help = "The number of processes to use, the default is one per CPU.")
 
     args = parser.parse_args()
 
-    rccDriftCorrection(args.mlist, args.drift, args.step, args.scale, args.zmin, args.zmax, args.correct_z)
+    rccDriftCorrection(args.mlist, args.drift, args.step, args.scale, args.zmin, args.zmax, args.correct_z,
+                       n_processes = args.n_processes)
 
 
 #
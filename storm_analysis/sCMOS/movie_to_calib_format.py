@@ -16,7 +16,7 @@ import sys
 
 import storm_analysis.sa_library.datareader as datareader
 
-def movieToCalibration(movie_name):
+def movieToCalibration(movie_name, block_size = 100):
     """
     Calculate calibration data from a movie. This includes
     the mean intensity per frame to reduce issues with
@@ -24,10 +24,11 @@ def movieToCalibration(movie_name):
     the movie.
 
     movie_name - The name of the movie.
+    block_size - The number of frames to process at once.
     """
 
     # Open the movie.
-    in_file = datareader.inferReader(movie_name)
+    in_file = datareader.inferReader(movie_name, memmap = True)
     [w, h, l] = in_file.filmSize()
 
     # Calculate frame mean, x & xx.
@@ -35,14 +36,16 @@ def movieToCalibration(movie_name):
     N = numpy.zeros((h,w), dtype = numpy.int64)
     NN = numpy.zeros((h,w), dtype = numpy.int64)
 
-    for i in range(l):
-        aframe = in_file.loadAFrame(i)
-        frame_mean[i] = numpy.mean(aframe)
+    for i in range(0, l, block_size):
+        frames = in_file.loadFrames(i, min(i + block_size, l))
+        frame_mean[i:i+frames.shape[0]] = numpy.mean(frames, axis = (1,2))
         
-        aframe = aframe.astype(numpy.int64)
-        N += aframe
-        NN += aframe * aframe
+        frames = frames.astype(numpy.int64)
+        N += numpy.sum(frames, axis = 0)
+        NN += numpy.sum(frames * frames, axis = 0)
 
+    in_file.close()
+    
     return [frame_mean, N, NN]
 
 
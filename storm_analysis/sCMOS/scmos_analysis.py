@@ -49,7 +49,8 @@ def analyze(movie_name, mlist_name, settings_name):
     std_analysis.standardAnalysis(finder,
                                   movie_reader,
                                   data_writer,
-                                  parameters)
+                                  parameters,
+                                  find_peaks_init = find_peaks.initFindAndFit)
 
 
 if (__name__ == "__main__"):
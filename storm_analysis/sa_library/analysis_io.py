@@ -8,9 +8,16 @@ Hazen 09/17
 import numpy
 import os
 import sys
+import threading
+import time
 
 from xml.etree import ElementTree
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 import storm_analysis.sa_library.datareader as datareader
 import storm_analysis.sa_library.parameters as params
 import storm_analysis.sa_library.readinsight3 as readinsight3
@@ -23,6 +30,93 @@ class AnalysisIOException(Exception):
     pass
 
 
+def getAOICrop(parameters, movie_x, movie_y):
+    """
+    Returns the part of the frame to analyze as [x_start, x_stop, y_start, y_stop],
+    this is the bounding box of the analysis AOI plus 'aoi_crop' pixels. Returns
+    None if the frames should not be cropped.
+    """
+    if (parameters is None) or (not parameters.hasAttr("aoi_crop")):
+        return None
+    if (parameters.getAttr("aoi_crop") < 0):
+        return None
+    
+    crop_margin = parameters.getAttr("aoi_crop")
+    crop = [0, movie_x, 0, movie_y]
+
+    # Circular AOI.
+    if parameters.hasAttr("x_center"):
+        rr = parameters.getAttr("aoi_radius")
+        xc = parameters.getAttr("x_center")
+        yc = parameters.getAttr("y_center")
+        crop = [xc - rr, xc + rr + 1, yc - rr, yc + rr + 1]
+
+    # Square AOI.
+    else:
+        if parameters.hasAttr("x_start"):
+            crop[0] = parameters.getAttr("x_start")
+        if parameters.hasAttr("x_stop"):
+            crop[1] = parameters.getAttr("x_stop")
+        if parameters.hasAttr("y_start"):
+            crop[2] = parameters.getAttr("y_start")
+        if parameters.hasAttr("y_stop"):
+            crop[3] = parameters.getAttr("y_stop")
+
+    crop = [max(0, crop[0] - crop_margin),
+            min(movie_x, crop[1] + crop_margin),
+            max(0, crop[2] - crop_margin),
+            min(movie_y, crop[3] + crop_margin)]
+
+    if (crop[0] >= crop[1]) or (crop[2] >= crop[3]):
+        raise AnalysisIOException("The analysis AOI is not inside the movie.")
+
+    # Nothing to crop.
+    if (crop == [0, movie_x, 0, movie_y]):
+        return None
+
+    return crop
+    
+
+def getSkipDescriptors(parameters):
+    """
+    Returns [descriptor, skip_descriptors]. Frames whose descriptor is in
+    skip_descriptors should not be analyzed. Both are empty strings if no
+    frames should be skipped.
+    """
+    if not (parameters.hasAttr("descriptor") and parameters.hasAttr("skip_descriptors")):
+        return ["", ""]
+
+    descriptor = parameters.getAttr("descriptor")
+    skip_descriptors = parameters.getAttr("skip_descriptors")
+    if (len(descriptor) == 0) or (len(skip_descriptors) == 0):
+        return ["", ""]
+
+    skipped = list(filter(lambda x: x in skip_descriptors, descriptor))
+    print("Skipping", len(skipped), "of every", len(descriptor), "frames based on their descriptor.")
+    return [descriptor, skip_descriptors]
+
+
+def getStorageOptions(parameters):
+    """
+    Returns the storage options of the HDF5 localization file, see
+    sa_h5py.SAH5Py, or None to use the defaults.
+    """
+    storage = {}
+    for [name, key] in [["hdf5_chunk_size", "chunk_size"],
+                        ["hdf5_compression", "compression"],
+                        ["hdf5_compression_level", "compression_level"],
+                        ["hdf5_shuffle", "shuffle"],
+                        ["hdf5_single_precision", "single_precision"]]:
+        if parameters.hasAttr(name):
+            storage[key] = parameters.getAttr(name)
+
+    if "shuffle" in storage:
+        storage["shuffle"] = bool(storage["shuffle"])
+        
+    if bool(storage):
+        return storage
+    
+
 def isLatestFormat(filename):
     """
     Returns True if the calibration file is the latest format. This
@@ -77,6 +171,15 @@ def loadCMOSCalibration(filename, verbose = False):
 
     raise AnalysisIOException("Unknown sCMOS data format.")
 
+
+def skipFrame(descriptor, skip_descriptors, frame_number):
+    """
+    Returns True if the descriptor of this frame is in skip_descriptors.
+    """
+    if (len(skip_descriptors) == 0):
+        return False
+    return (descriptor[frame_number % len(descriptor)] in skip_descriptors)
+
     
 class DataWriter(object):
     """
@@ -90,10 +193,23 @@ class DataWriter(object):
         self.start_frame = -1
         self.total_peaks = 0
 
+    def addFrameStats(self, frame_stats, frame_number):
+        """
+        Per-frame analysis statistics, see fitting.FrameStats. These are
+        ignored unless the writer supports saving them.
+        """
+        pass
+    
     def addPeaks(self, peaks, movie_reader):
         self.n_added = peaks["x"].size
         self.total_peaks += self.n_added
 
+    def flush(self):
+        """
+        Save the peaks that have been added so far, if the writer supports this.
+        """
+        pass
+
     def getNumberAdded(self):
         return self.n_added
     
@@ -114,6 +230,8 @@ class DataWriterHDF5(DataWriter):
     def __init__(self, parameters = None, sa_type = None, **kwds):
         super(DataWriterHDF5, self).__init__(**kwds)
 
+        self.frame_stats = []
+        self.movie_l = None
         self.movie_info_set = False
                 
         if os.path.exists(self.filename):
@@ -133,7 +251,9 @@ class DataWriterHDF5(DataWriter):
         else:
             self.h5 = saH5Py.SAH5Py(filename = self.filename,
                                     is_existing = False,
-                                    sa_type = sa_type)
+                                    sa_type = sa_type,
+                                    layout = parameters.getAttr("hdf5_layout", "frames"),
+                                    storage = getStorageOptions(parameters))
             
             # Save analysis parameters.
             etree = parameters.toXMLElementTree(False)
@@ -150,16 +270,43 @@ class DataWriterHDF5(DataWriter):
     def addPeaks(self, peaks, movie_reader):
         super(DataWriterHDF5, self).addPeaks(peaks, movie_reader)
 
-        if not self.movie_info_set:
+        # The length of a movie that is still being acquired can change.
+        if (not self.movie_info_set) or (self.movie_l != movie_reader.getMovieL()):
             self.h5.addMovieInformation(movie_reader)
             self.movie_info_set = True
+            self.movie_l = movie_reader.getMovieL()
 
         self.h5.addLocalizations(peaks, movie_reader.getCurrentFrameNumber())
 
+    def addFrameStats(self, frame_stats, frame_number):
+        self.frame_stats.append([frame_number, frame_stats])
+
     def close(self, finished):
+        self.writeFrameStats()
         self.h5.setAnalysisFinished(finished)
         self.h5.close(verbose = True)
 
+    def flush(self):
+        self.writeFrameStats()
+        self.h5.flush()
+
+    def writeFrameStats(self):
+        """
+        Save the per-frame statistics as a table with one row per frame.
+        """
+        if (len(self.frame_stats) == 0):
+            return
+
+        table = {"frame" : numpy.array([elt[0] for elt in self.frame_stats], dtype = numpy.int64)}
+        for field in self.frame_stats[0][1]:
+            values = [elt[1][field] for elt in self.frame_stats]
+            if isinstance(values[0], float):
+                table[field] = numpy.array(values, dtype = numpy.float64)
+            else:
+                table[field] = numpy.array(values, dtype = numpy.int64)
+        self.h5.addFrameStats(table)
+        self.frame_stats = []
+
         
 class DataWriterI3(DataWriter):
     """
@@ -219,45 +366,125 @@ class FrameReader(object):
     """
     Wraps datareader.Reader, converts frames from ADU to photo-electrons.
     """
-    def __init__(self, movie_file = None, parameters = None, **kwds):
+    def __init__(self, movie_file = None, parameters = None, memmap = False, **kwds):
+        """
+        memmap - Access the movie using numpy.memmap (.dax and .spe only).
+        """
         super(FrameReader, self).__init__(**kwds)
 
+        self.crop = None
+        self.following = False
         self.gain = None
         self.offset = None
         self.parameters = parameters
         self.rqe = 1.0
+        self.scale = None
         self.verbose = 1
         if self.parameters is not None:
             self.verbose = (self.parameters.getAttr("verbosity") == 1)
-        self.movie_data = datareader.inferReader(movie_file)
+            if self.parameters.hasAttr("follow"):
+                self.following = (self.parameters.getAttr("follow") != 0)
+
+        if self.following:
+            if (os.path.splitext(movie_file)[1] != ".dax"):
+                raise AnalysisIOException("Only .dax movies can be analyzed while they are being acquired.")
+            frame_size = None
+            if self.parameters.hasAttr("follow_frame_size"):
+                frame_size = self.parameters.getAttr("follow_frame_size")
+            bigendian = (self.parameters.getAttr("follow_bigendian", 0) != 0)
+            self.movie_data = datareader.DaxFollowReader(movie_file,
+                                                         frame_size = frame_size,
+                                                         bigendian = bigendian)
+        else:
+            self.movie_data = datareader.inferReader(movie_file, memmap = memmap)
 
     def close(self):
         self.movie_data.close()
 
     def filmSize(self):
-        return self.movie_data.filmSize()
+        """
+        Returns [x size, y size, length] of the frames that this returns,
+        so this is the size after cropping (if any).
+        """
+        [movie_x, movie_y, movie_l] = self.movie_data.filmSize()
+        if self.crop is not None:
+            movie_x = self.crop[1] - self.crop[0]
+            movie_y = self.crop[3] - self.crop[2]
+        return [movie_x, movie_y, movie_l]
 
     def hashID(self):
         return self.movie_data.hashID()
 
-    def loadAFrame(self, frame_number):
+    def isFollowing(self):
+        """
+        Returns True if the movie is still being acquired.
+        """
+        return self.following
 
+    def loadAFrame(self, frame_number, out = None):
+        """
+        Load a frame and convert it from ADU to photo-electrons.
+
+        frame_number - The frame to load.
+        out - (Optional) A 2D numpy float64 array to store the frame in. Re-using
+              the same array for every frame avoids the memory allocations and
+              temporary arrays of the conversion.
+
+        Returns the converted frame.
+        """
         # Load frame.
         frame = self.movie_data.loadAFrame(frame_number)
+        if self.crop is not None:
+            frame = frame[self.crop[2]:self.crop[3],self.crop[0]:self.crop[1]]
+
+        if out is None:
+            out = numpy.empty(frame.shape)
+
+        if self.scale is None:
+            self.scale = self.gain * self.rqe
 
         # Convert from ADU to photo-electrons and correct for RQE.
-        frame = (frame - self.offset) * (self.gain * self.rqe)
+        numpy.subtract(frame, self.offset, out = out, dtype = numpy.float64)
+        numpy.multiply(out, self.scale, out = out)
 
         # Set all values less than 1.0 to 1.0 as we are doing MLE fitting which
         # has zero tolerance for negative numbers..
         #
-        mask = (frame < 1.0)
-        if (numpy.sum(mask) > 0):
+        # numpy.fmin ignores NaNs, this matches (out < 1.0) without creating a mask.
+        #
+        if (numpy.fmin.reduce(out, axis = None) < 1.0):
             if self.verbose:
                 print(" Removing values < 1.0 in frame {0:0d}".format(frame_number))
-            frame[mask] = 1.0
-
-        return frame
+            numpy.maximum(out, 1.0, out = out)
+
+        return out
+
+    def setCrop(self, crop):
+        """
+        Only return the [x_start, x_stop, y_start, y_stop] part of each frame,
+        see getAOICrop(). The sCMOS calibration data is cropped to match.
+        This should only be called once.
+        """
+        self.crop = crop
+        self.scale = None
+        
+        c_slice = (slice(crop[2], crop[3]), slice(crop[0], crop[1]))
+        if isinstance(self.gain, numpy.ndarray):
+            self.gain = numpy.ascontiguousarray(self.gain[c_slice])
+        if isinstance(self.offset, numpy.ndarray):
+            self.offset = numpy.ascontiguousarray(self.offset[c_slice])
+        if isinstance(self.rqe, numpy.ndarray):
+            self.rqe = numpy.ascontiguousarray(self.rqe[c_slice])
+
+    def updateFilmSize(self):
+        """
+        Check for new frames of a movie that is still being acquired. Returns
+        True if the acquisition of the movie has finished.
+        """
+        finished = self.movie_data.update()
+        if finished:
+            self.following = False
+        return finished
 
 
 class FrameReaderStd(FrameReader):
@@ -295,6 +522,133 @@ class FrameReaderSCMOS(FrameReader):
         self.gain = 1.0/gain
         self.rqe = 1.0/rqe
 
+
+class FramePrefetcher(threading.Thread):
+    """
+    Loads frames and background estimates from a MovieReader in a 
+    background thread. This way reading the movie overlaps with the
+    analysis of the current frame.
+
+    This also counts how often the analysis had to wait for a frame
+    to be loaded (a 'stall').
+    """
+    def __init__(self, movie_reader = None, depth = None, start_frame = None, stop_frame = None, **kwds):
+        """
+        movie_reader - The MovieReader to load the frames from.
+        depth - The maximum number of frames to load ahead.
+        start_frame - The first frame to load.
+        stop_frame - Load up to, but not including, this frame.
+        """
+        super(FramePrefetcher, self).__init__(**kwds)
+        self.daemon = True
+
+        self.frame_queue = queue.Queue(maxsize = depth)
+        self.movie_reader = movie_reader
+        self.n_frames = 0
+        self.n_stalls = 0
+        self.running = True
+        self.stall_time = 0.0
+        self.start_frame = start_frame
+        self.stop_frame = stop_frame
+
+    def getFrame(self):
+        """
+        Return the next [frame, background] from the queue.
+        """
+        self.n_frames += 1
+        try:
+            item = self.frame_queue.get_nowait()
+        except queue.Empty:
+            self.n_stalls += 1
+            start_time = time.time()
+            item = self.frame_queue.get()
+            self.stall_time += time.time() - start_time
+
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def getStatistics(self):
+        """
+        Return [number of frames, number of stalls, total stall time in seconds].
+        """
+        return [self.n_frames, self.n_stalls, self.stall_time]
+            
+    def putItem(self, item):
+        while self.running:
+            try:
+                self.frame_queue.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                pass
+            
+    def run(self):
+        try:
+            for i in range(self.start_frame, self.stop_frame):
+                if not self.running:
+                    break
+                self.putItem(self.movie_reader.loadFrame(i))
+        except Exception as exception:
+            self.putItem(exception)
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+        
+class MovieFrame(object):
+    """
+    A single frame (and background estimate) from a MovieReader.
+
+    As far as PeakFinderFitter.analyzeImage() and DataWriter.addPeaks()
+    are concerned this behaves like a MovieReader, so it can be sent to
+    another process for analysis and then used to save the results. The
+    reference to the MovieReader is not pickled, it only stays valid in
+    the process that created this object.
+    """
+    def __init__(self, movie_reader = None, **kwds):
+        super(MovieFrame, self).__init__(**kwds)
+
+        self.background = movie_reader.getBackground()
+        self.crop = movie_reader.getCrop()
+        self.cur_frame = movie_reader.getCurrentFrameNumber()
+
+        # The MovieReader re-uses the memory for its frames, so we need a copy.
+        # Frames that are skipped are not loaded so there is nothing to copy.
+        self.frame = movie_reader.getFrame()
+        if self.frame is not None:
+            self.frame = numpy.copy(self.frame)
+        self.movie_reader = movie_reader
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["movie_reader"] = None
+        return state
+
+    def getBackground(self):
+        return self.background
+
+    def getCrop(self):
+        return self.crop
+    
+    def getCurrentFrameNumber(self):
+        return self.cur_frame
+
+    def getFrame(self):
+        return self.frame
+
+    def getMovieL(self):
+        return self.movie_reader.getMovieL()
+
+    def getMovieX(self):
+        return self.movie_reader.getMovieX()
+
+    def getMovieY(self):
+        return self.movie_reader.getMovieY()
+
+    def hashID(self):
+        return self.movie_reader.hashID()
+
     
 class MovieReader(object):
     """
@@ -305,30 +659,79 @@ class MovieReader(object):
     necessary in order to make the peakFinding() function also work with
     multi-channel data / analysis.
     """
+    follow_poll = 0.1  # How often (in seconds) to check for new frames of a
+                       # movie that is still being acquired.
+    
     def __init__(self, frame_reader = None, parameters = None, **kwds):
         super(MovieReader, self).__init__(**kwds)
 
         self.background = None
         self.bg_estimator = None
         self.cur_frame = -1
+        self.descriptor = ""
+        self.follow_timeout = None
         self.frame_reader = frame_reader
         self.frame = None
+        self.frame_buffer = None
+        self.hash_id = None
         self.max_frame = None
         [self.movie_x, self.movie_y, self.movie_l] = frame_reader.filmSize()
         self.parameters = parameters
+        self.prefetcher = None
+        self.skip_descriptors = ""
+
+        # Crop the frames to the analysis AOI, if requested. The movie
+        # size is still the size of the full frame.
+        self.crop = getAOICrop(parameters, self.movie_x, self.movie_y)
+        if self.crop is not None:
+            print("Cropping frames to", self.crop)
+            frame_reader.setCrop(self.crop)
 
     def close(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            [n_frames, n_stalls, stall_time] = self.prefetcher.getStatistics()
+            print("   waited for {0:d} of {1:d} frames, {2:.1f} seconds total.".format(n_stalls, n_frames, stall_time))
+            self.prefetcher = None
         self.frame_reader.close()
         
     def getBackground(self):
         return self.background
 
+    def getCrop(self):
+        """
+        Returns the [x_start, x_stop, y_start, y_stop] part of the full frame
+        that the frames are cropped to, or None if they are not cropped.
+        """
+        return self.crop
+    
     def getCurrentFrameNumber(self):
         return self.cur_frame
     
+    def getMaxFrame(self):
+        """
+        Returns the frame to stop the analysis on.
+        """
+        max_frame = self.movie_l
+        if self.parameters.hasAttr("max_frame"):
+            if (self.parameters.getAttr("max_frame") > 0):
+                if (self.parameters.getAttr("max_frame") < self.movie_l):
+                    max_frame = self.parameters.getAttr("max_frame")
+        return max_frame
+    
     def getFrame(self):
+        """
+        Note that the frame may be over-written by the next call to nextFrame().
+        This is None if the frame was skipped.
+        """
         return self.frame
 
+    def getMovieFrame(self):
+        """
+        Return a MovieFrame object for the current frame.
+        """
+        return MovieFrame(movie_reader = self)
+
     def getMovieL(self):
         return self.movie_l
     
@@ -338,44 +741,148 @@ class MovieReader(object):
     def getMovieY(self):
         return self.movie_y
 
+    def getPrefetcher(self):
+        return self.prefetcher
+
+    def hasNextFrame(self):
+        """
+        Returns False if nextFrame() would have to wait for the next frame of
+        a movie that is still being acquired.
+        """
+        if not self.frame_reader.isFollowing():
+            return True
+        return self.pollMovie(self.cur_frame + 1)
+        
     def hashID(self):
-        return self.frame_reader.hashID()
+        if self.hash_id is None:
+            self.hash_id = self.frame_reader.hashID()
+        return self.hash_id
 
-    def nextFrame(self):
-        self.cur_frame += 1
-        if (self.cur_frame < self.max_frame):
+    def loadFrame(self, frame_number, out = None):
+        """
+        Load a frame and the background estimate for the frame. This 
+        must be called sequentially as the background estimator 
+        expects to be used this way.
 
-            # Update background estimate.
-            if self.bg_estimator is not None:
-                self.background = self.bg_estimator.estimateBG(self.cur_frame)
+        out - (Optional) A 2D numpy float64 array to load the frame into.
 
-            # Load frame.
-            self.frame = self.frame_reader.loadAFrame(self.cur_frame)
+        Returns [frame, background], frame is None if the frame should be skipped.
+        """
+        background = None
+        
+        # Update background estimate.
+        if self.bg_estimator is not None:
+            background = self.bg_estimator.estimateBG(frame_number)
 
+        # Load frame, unless we are going to skip it.
+        frame = None
+        if not self.shouldSkip(frame_number):
+            frame = self.frame_reader.loadAFrame(frame_number, out = out)
+
+        return [frame, background]
+        
+    def nextFrame(self):
+        self.cur_frame += 1
+        if self.frame_reader.isFollowing():
+            self.waitForFrame(self.cur_frame)
+            
+        if (self.cur_frame < self.max_frame):
+            if self.prefetcher is not None:
+                [self.frame, self.background] = self.prefetcher.getFrame()
+            else:
+                # Re-use the same memory for every frame. This is not possible
+                # when prefetching as then several frames are in use at once.
+                if self.frame_buffer is None:
+                    [frame_x, frame_y, frame_l] = self.frame_reader.filmSize()
+                    self.frame_buffer = numpy.empty((frame_y, frame_x))
+                [self.frame, self.background] = self.loadFrame(self.cur_frame, out = self.frame_buffer)
             return True
         else:
             return False
         
     def setup(self, start_frame):
 
+        # The frames of a movie that is still being acquired may not exist yet.
+        following = self.frame_reader.isFollowing()
+        
         # Figure out where to start.
         self.cur_frame = start_frame
         if self.parameters.hasAttr("start_frame"):
             if (self.parameters.getAttr("start_frame") > self.cur_frame):
-                if (self.parameters.getAttr("start_frame") < self.movie_l):
+                if following or (self.parameters.getAttr("start_frame") < self.movie_l):
                     self.cur_frame = self.parameters.getAttr("start_frame") - 1
         
         # Figure out where to stop.
-        self.max_frame = self.movie_l
-        if self.parameters.hasAttr("max_frame"):
-            if (self.parameters.getAttr("max_frame") > 0):
-                if (self.parameters.getAttr("max_frame") < self.movie_l):
-                    self.max_frame = self.parameters.getAttr("max_frame")
+        self.max_frame = self.getMaxFrame()
+
+        if following:
+            print("Analyzing the movie while it is being acquired.")
+            self.follow_timeout = self.parameters.getAttr("follow_timeout", 60.0)
+
+        # Configure frame skipping, if any.
+        [self.descriptor, self.skip_descriptors] = getSkipDescriptors(self.parameters)
 
         # Configure background estimator, if any.
+        if following and (self.parameters.getAttr("static_background_estimate", 0) > 0):
+            raise AnalysisIOException("Static background estimation is not possible for a movie that is being acquired.")
+            
         if (self.parameters.getAttr("static_background_estimate", 0) > 0):
             print("Using static background estimator.")
             s_size = self.parameters.getAttr("static_background_estimate")
             self.bg_estimator = static_background.StaticBGEstimator(self.frame_reader,
-                                                                    start_frame = self.cur_frame,
+                                                                    start_frame = self.cur_frame + 1,
                                                                     sample_size = s_size)
+
+        # Configure frame prefetching, if requested. The prefetcher needs to
+        # know the length of the movie.
+        if following and (self.parameters.getAttr("prefetch_frames", 0) > 0):
+            print("Frame prefetching is not used for a movie that is being acquired.")
+            
+        elif (self.parameters.getAttr("prefetch_frames", 0) > 0):
+            print("Prefetching", self.parameters.getAttr("prefetch_frames"), "frames.")
+
+            # The prefetcher 'owns' the frame reader once it has started.
+            self.hashID()
+            
+            self.prefetcher = FramePrefetcher(movie_reader = self,
+                                              depth = self.parameters.getAttr("prefetch_frames"),
+                                              start_frame = self.cur_frame + 1,
+                                              stop_frame = self.max_frame)
+            self.prefetcher.start()
+
+    def pollMovie(self, frame_number):
+        """
+        Check for new frames of a movie that is still being acquired. Returns
+        True if the analysis does not need to wait any longer for frame_number.
+        """
+        finished = self.frame_reader.updateFilmSize()
+        self.movie_l = self.frame_reader.filmSize()[2]
+        self.max_frame = self.getMaxFrame()
+
+        # We are also done if we have reached the 'max_frame' parameter.
+        return finished or (frame_number < self.max_frame) or (self.max_frame < self.movie_l)
+    
+    def shouldSkip(self, frame_number):
+        """
+        Returns True if this frame should not be analyzed based on its descriptor.
+        """
+        return skipFrame(self.descriptor, self.skip_descriptors, frame_number)
+
+    def skipCurrentFrame(self):
+        """
+        Returns True if the current frame should not be analyzed.
+        """
+        return self.shouldSkip(self.cur_frame)
+
+    def waitForFrame(self, frame_number):
+        """
+        Wait for a frame of a movie that is still being acquired. This returns
+        when the frame is available, when the acquisition has finished, or if
+        there were no new frames for 'follow_timeout' seconds.
+        """
+        start_time = time.time()
+        while not self.pollMovie(frame_number):
+            if ((time.time() - start_time) > self.follow_timeout):
+                print("No new frames in", self.follow_timeout, "seconds, stopping.")
+                return
+            time.sleep(self.follow_poll)
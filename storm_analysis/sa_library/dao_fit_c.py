@@ -16,6 +16,30 @@ import storm_analysis.sa_library.ia_utilities_c as utilC
 import storm_analysis.sa_library.loadclib as loadclib
 
 
+#
+# The fitData counters of fitting problems, see getFitCounters().
+#
+fit_counters = ["n_dposv", "n_lost", "n_margin", "n_neg_fi", "n_neg_height", "n_non_converged", "n_non_decr"]
+
+#
+# The peak property codes for mFitGetPeakProperties(), see sa_library/multi_fit.h
+#
+peak_property_codes = {"background" : 0,
+                       "bg_sum" : 1,
+                       "error" : 2,
+                       "fg_sum" : 3,
+                       "height" : 4,
+                       "iterations" : 5,
+                       "significance" : 6,
+                       "status" : 7,
+                       "sum" : 8,
+                       "x" : 9,
+                       "xsigma" : 10,
+                       "y" : 11,
+                       "ysigma" : 12,
+                       "z" : 13}
+
+
 #
 # The Python definitions of the C structures in sa_library/multi_fit.h
 #
@@ -156,6 +180,11 @@ def loadDaoFitC():
     daofit.mFitGetNError.argtypes = [ctypes.c_void_p]
     daofit.mFitGetNError.restype = ctypes.c_int
     
+    daofit.mFitGetPeakProperties.argtypes = [ctypes.c_void_p,
+                                             ndpointer(dtype=numpy.float64),
+                                             ndpointer(dtype=numpy.int32),
+                                             ctypes.c_int]
+
     daofit.mFitGetPeakPropertyDouble.argtypes = [ctypes.c_void_p,
                                                  ndpointer(dtype=numpy.float64),
                                                  ctypes.c_char_p]
@@ -182,9 +211,17 @@ def loadDaoFitC():
 
     daofit.mFitRemoveRunningPeaks.argtypes = [ctypes.c_void_p]
 
+    daofit.mFitSetNThreads.argtypes = [ctypes.c_void_p,
+                                       ctypes.c_int]
+
     daofit.mFitSetPeakStatus.argtypes = [ctypes.c_void_p,
                                          ndpointer(dtype=numpy.int32)]
 
+    daofit.mFitUpdateFitImage.argtypes = [ctypes.c_void_p,
+                                          ndpointer(dtype=numpy.float64),
+                                          ndpointer(dtype=numpy.int32)]
+    daofit.mFitUpdateFitImage.restype = ctypes.c_int
+
     # These are from sa_library/dao_fit.c
     daofit.daoCleanup.argtypes = [ctypes.c_void_p]
         
@@ -284,6 +321,8 @@ class MultiFitter(object):
         super(MultiFitter, self).__init__(**kwds)
         self.clib = None
         self.default_tol = 1.0e-6
+        self.fit_image = None
+        self.fit_image_bounds = numpy.zeros(4, dtype = numpy.int32)
         self.im_shape = None
         self.iterations = 0
         self.max_z = max_z
@@ -355,14 +394,32 @@ class MultiFitter(object):
         # Get number of fitting iterations.
         self.getIterations()
 
+    def getFitCounters(self):
+        """
+        Return a dictionary with the current (cumulative) values of the
+        fitting counters, the number of iterations and the number of peaks
+        removed by the proximity and significance filters.
+        """
+        counters = {"iterations" : self.getIterations(),
+                    "n_proximity" : self.n_proximity,
+                    "n_significance" : self.n_significance}
+        for name in fit_counters:
+            counters[name] = getattr(self.mfit.contents, name)
+        return counters
+
     def getFitImage(self):
         """
         Get the fit image, i.e. f(x), an image created from drawing all of
         the current fits into a 2D array.
+
+        Only the regions of the fit image that have changed since the last
+        call are updated, so the returned array is re-used (and modified in
+        place) by subsequent calls. Copy it if you need to keep it.
         """
-        fit_image = numpy.ascontiguousarray(numpy.zeros(self.im_shape, dtype = numpy.float64))
-        self.clib.mFitGetFitImage(self.mfit, fit_image)
-        return fit_image
+        if self.fit_image is None:
+            self.fit_image = numpy.zeros(self.im_shape, dtype = numpy.float64)
+        self.clib.mFitUpdateFitImage(self.mfit, self.fit_image, self.fit_image_bounds)
+        return self.fit_image
 
     def getIterations(self):
         """
@@ -395,6 +452,40 @@ class MultiFitter(object):
         """
         return self.mfit.contents.max_nfit
 
+    def getPeakProperties(self, p_names):
+        """
+        Return a dictionary of numpy arrays containing the requested properties.
+
+        This gets all the properties from the C library in a single call, except
+        for those that are not supported by mFitGetPeakProperties() (i.e. 'jacobian').
+        """
+        c_codes = []
+        c_names = []
+        props = {}
+        for p_name in p_names:
+            if not p_name in self.peak_properties:
+                raise MultiFitterException("No such property '" + p_name + "'")
+            if p_name in peak_property_codes:
+                c_codes.append(peak_property_codes[p_name])
+                c_names.append(p_name)
+            else:
+                props[p_name] = self.getPeakProperty(p_name)
+
+        n_fit = self.getNFit()
+        values = numpy.zeros((len(c_names), n_fit), dtype = numpy.float64)
+        if (len(c_names) > 0) and (n_fit > 0):
+            self.clib.mFitGetPeakProperties(self.mfit,
+                                            values,
+                                            numpy.array(c_codes, dtype = numpy.int32),
+                                            len(c_codes))
+
+        for i, p_name in enumerate(c_names):
+            if (self.peak_properties[p_name] == "int"):
+                props[p_name] = values[i].astype(numpy.int32)
+            else:
+                props[p_name] = values[i]
+        return props
+        
     def getPeakProperty(self, p_name):
         """
         Return a numpy array containing the requested property.
@@ -561,9 +652,10 @@ class MultiFitterGaussian(MultiFitter):
     """
     Base class for Gaussian fitters (3D-DAOSTORM and sCMOS).
     """
-    def __init__(self, roi_size = 10, wx_params = None, wy_params = None, **kwds):
+    def __init__(self, roi_size = 10, wx_params = None, wy_params = None, n_threads = 1, **kwds):
         super(MultiFitterGaussian, self).__init__(**kwds)
 
+        self.n_threads = n_threads
         self.roi_size = roi_size
         self.wx_params = wx_params
         self.wy_params = wy_params
@@ -592,6 +684,10 @@ class MultiFitterGaussian(MultiFitter):
                                             self.scmos_cal.shape[0],
                                             self.roi_size)
 
+        # Gaussian fitting can use more than one thread.
+        if (self.n_threads > 1):
+            self.clib.mFitSetNThreads(self.mfit, self.n_threads)
+
     def newPeaks(self, peaks, peaks_type):
         """
         Pass new peaks to add to the C library.
@@ -10,7 +10,6 @@ import hashlib
 import numpy
 import os
 import re
-import tifffile
 
 
 # Avoid making astropy mandatory for everybody.
@@ -20,18 +19,21 @@ except ImportError:
     pass
 
 
-def inferReader(filename, verbose = False):
+def inferReader(filename, verbose = False, memmap = False):
     """
     Given a file name this will try to return the appropriate
     reader based on the file extension.
+
+    memmap - Use numpy.memmap to access the movie, this is only 
+             relevant for .dax and .spe movies.
     """
     ext = os.path.splitext(filename)[1]
     if (ext == ".dax"):
-        return DaxReader(filename, verbose = verbose)
+        return DaxReader(filename, verbose = verbose, memmap = memmap)
     elif (ext == ".fits"):
         return FITSReader(filename, verbose = verbose)
     elif (ext == ".spe"):
-        return SpeReader(filename, verbose = verbose)
+        return SpeReader(filename, verbose = verbose, memmap = memmap)
     elif (ext == ".tif") or (ext == ".tiff"):
         return TifReader(filename, verbose = verbose)
     else:
@@ -52,11 +54,18 @@ class Reader(object):
 
      2. loadAFrame(self, frame_number)
         Load the requested frame and return it as numpy array.
+
+    Subclasses can also implement loadFrames(self, start, stop) if
+    they can do better than loading the frames one at a time.
+
+    Readers that use numpy.memmap return read-only views of the
+    file from loadAFrame() and loadFrames(), not copies.
     """
     def __init__(self, filename, verbose = False):
         super(Reader, self).__init__()
         self.filename = filename
         self.fileptr = None
+        self.movie_memmap = None
         self.verbose = verbose
 
     def __del__(self):
@@ -74,6 +83,27 @@ class Reader(object):
         """
         length = 0
         average = numpy.zeros((self.image_height, self.image_width), numpy.float)
+
+        # Sum the frames in blocks if the movie is memmap'd, this is much
+        # faster than adding them up one frame at a time.
+        if self.isMemmap():
+            if start is None:
+                start = 0
+            if end is None:
+                end = self.number_frames
+            block_size = 100
+            for i in range(start, end, block_size):
+                if self.verbose:
+                    print(" processing frame:", i, " of", self.number_frames)
+                frames = self.loadFrames(i, min(i + block_size, end))
+                average += numpy.sum(frames, axis = 0, dtype = numpy.float64)
+                length += frames.shape[0]
+
+            if (length > 0):
+                average = average/float(length)
+
+            return average
+
         for [i, frame] in self.frameIterator(start, end):
             if self.verbose and ((i%10)==0):
                 print(" processing frame:", i, " of", self.number_frames)
@@ -85,10 +115,19 @@ class Reader(object):
             
         return average
 
+    def checkFramesRange(self, start, stop):
+        """
+        Check that start <= frame number < stop is a valid range of frames.
+        """
+        assert start >= 0, "Start must be greater than or equal to 0, it is " + str(start)
+        assert stop <= self.number_frames, "Stop must be less than or equal to " + str(self.number_frames)
+        assert stop > start, "Stop must be greater than start."
+
     def close(self):
         if self.fileptr is not None:
             self.fileptr.close()
             self.fileptr = None
+        self.movie_memmap = None
         
     def filmFilename(self):
         """
@@ -137,11 +176,34 @@ class Reader(object):
         """
         A (hopefully) unique string that identifies this movie.
         """
-        return hashlib.md5(self.loadAFrame(0).tostring()).hexdigest()
+        # Frames from a memmap'd big-endian file are not in the native byte order.
+        frame = self.loadAFrame(0)
+        frame = numpy.ascontiguousarray(frame, dtype = frame.dtype.newbyteorder("="))
+        return hashlib.md5(frame.tostring()).hexdigest()
+
+    def isMemmap(self):
+        """
+        Returns True if the movie is being accessed using numpy.memmap.
+        """
+        return self.movie_memmap is not None
 
     def loadAFrame(self, frame_number):
         assert frame_number >= 0, "Frame_number must be greater than or equal to 0, it is " + str(frame_number)
         assert frame_number < self.number_frames, "Frame number must be less than " + str(self.number_frames)
+
+    def loadFrames(self, start, stop):
+        """
+        Load the frames start <= frame number < stop and return them as 
+        a 3D numpy array.
+        """
+        self.checkFramesRange(start, stop)
+
+        frame = self.loadAFrame(start)
+        frames = numpy.zeros((stop - start, frame.shape[0], frame.shape[1]), dtype = frame.dtype)
+        frames[0,:,:] = frame
+        for i in range(start + 1, stop):
+            frames[i-start,:,:] = self.loadAFrame(i)
+        return frames
         
     def lockTarget(self):
         """
@@ -157,7 +219,7 @@ class DaxReader(Reader):
     """
     Dax reader class. This is a Zhuang lab custom format.
     """
-    def __init__(self, filename, verbose = False):
+    def __init__(self, filename, verbose = False, memmap = False):
         super(DaxReader, self).__init__(filename, verbose = verbose)
         
         # save the filenames
@@ -171,6 +233,58 @@ class DaxReader(Reader):
         self.image_width = None
 
         # extract the movie information from the associated inf file
+        self.readInfFile()
+
+        # set defaults, probably correct, but warn the user 
+        # that they couldn't be determined from the inf file.
+        if not self.image_height:
+            print("Could not determine image size, assuming 256x256.")
+            self.image_height = 256
+            self.image_width = 256
+
+        # open the dax file
+        if os.path.exists(filename):
+            if memmap:
+                if self.bigendian:
+                    dtype = numpy.dtype(">u2")
+                else:
+                    dtype = numpy.dtype("<u2")
+                self.movie_memmap = numpy.memmap(filename,
+                                                 dtype = dtype,
+                                                 mode = "r",
+                                                 shape = (self.number_frames, self.image_height, self.image_width))
+            else:
+                self.fileptr = open(filename, "rb")
+        else:
+            if self.verbose:
+                print("dax data not found", filename)
+
+    def loadAFrame(self, frame_number):
+        """
+        Load a frame & return it as a numpy array.
+        """
+        super(DaxReader, self).loadAFrame(frame_number)
+
+        if self.movie_memmap is not None:
+            return self.movie_memmap[frame_number]
+        
+        self.fileptr.seek(frame_number * self.image_height * self.image_width * 2)
+        image_data = numpy.fromfile(self.fileptr, dtype='uint16', count = self.image_height * self.image_width)
+        image_data = numpy.reshape(image_data, [self.image_height, self.image_width])
+        if self.bigendian:
+            image_data.byteswap(True)
+        return image_data
+
+    def loadFrames(self, start, stop):
+        if self.movie_memmap is not None:
+            self.checkFramesRange(start, stop)
+            return self.movie_memmap[start:stop]
+        return super(DaxReader, self).loadFrames(start, stop)
+
+    def readInfFile(self):
+        """
+        Extract the movie information from the associated inf file.
+        """
         size_re = re.compile(r'frame dimensions = ([\d]+) x ([\d]+)')
         length_re = re.compile(r'number of frames = ([\d]+)')
         endian_re = re.compile(r' (big|little) endian')
@@ -215,33 +329,71 @@ class DaxReader(Reader):
 
         inf_file.close()
 
-        # set defaults, probably correct, but warn the user 
-        # that they couldn't be determined from the inf file.
-        if not self.image_height:
-            print("Could not determine image size, assuming 256x256.")
-            self.image_height = 256
-            self.image_width = 256
 
-        # open the dax file
-        if os.path.exists(filename):
-            self.fileptr = open(filename, "rb")
+class DaxFollowReader(DaxReader):
+    """
+    Reads a .dax movie that is still being acquired. The acquisition
+    software writes the .inf file when the movie is finished, until then
+    the number of frames is determined from the size of the .dax file and
+    the frame size has to be specified.
+    """
+    def __init__(self, filename, frame_size = None, bigendian = False, verbose = False):
+        """
+        frame_size - The [x, y] size of the frames, this is only used if
+                     the .inf file does not exist yet.
+        bigendian - The byte order of the .dax file, this is only used if
+                    the .inf file does not exist yet.
+        """
+        # Skip DaxReader.__init__() as the .inf file may not exist yet.
+        super(DaxReader, self).__init__(filename, verbose = verbose)
+
+        dirname = os.path.dirname(filename)
+        if (len(dirname) > 0):
+            dirname = dirname + "/"
+        self.inf_filename = dirname + os.path.splitext(os.path.basename(filename))[0] + ".inf"
+
+        self.bigendian = bigendian
+        self.finished = False
+        self.number_frames = 0
+
+        if os.path.exists(self.inf_filename):
+            self.update()
+        elif frame_size is None:
+            raise IOError("The frame size of " + filename + " must be specified as there is no .inf file.")
         else:
-            if self.verbose:
-                print("dax data not found", filename)
+            [self.image_width, self.image_height] = frame_size
+            self.update()
 
-    def loadAFrame(self, frame_number):
+    def isFinished(self):
         """
-        Load a frame & return it as a numpy array.
+        Returns True if the acquisition of the movie has finished.
         """
-        super(DaxReader, self).loadAFrame(frame_number)
+        return self.finished
 
-        self.fileptr.seek(frame_number * self.image_height * self.image_width * 2)
-        image_data = numpy.fromfile(self.fileptr, dtype='uint16', count = self.image_height * self.image_width)
-        image_data = numpy.reshape(image_data, [self.image_height, self.image_width])
-        if self.bigendian:
-            image_data.byteswap(True)
-        return image_data
+    def update(self):
+        """
+        Check for new frames, this updates the number of frames. Returns
+        True if the acquisition of the movie has finished.
+        """
+        if self.finished:
+            return True
 
+        # Check the .inf file first so that we don't miss the last frames.
+        if os.path.exists(self.inf_filename):
+            self.readInfFile()
+            self.finished = True
+            
+        if (self.fileptr is None) and os.path.exists(self.filename):
+            self.fileptr = open(self.filename, "rb")
+
+        # Don't count the last frame if it is only partially written.
+        if not self.finished:
+            if (self.fileptr is not None):
+                frame_bytes = self.image_height * self.image_width * 2
+                self.number_frames = os.path.getsize(self.filename)//frame_bytes
+        
+        return self.finished
+    
 
 class FITSReader(Reader):
     """
@@ -305,7 +457,7 @@ class SpeReader(Reader):
     SPE (Roper Scientific) reader class.
     """
     
-    def __init__(self, filename, verbose = False):
+    def __init__(self, filename, verbose = False, memmap = False):
         super(SpeReader, self).__init__(filename, verbose = verbose)
 
         # open the file & read the header
@@ -336,11 +488,26 @@ class SpeReader(Reader):
         else:
             print("unrecognized spe image format: ", image_mode)
 
+        if memmap:
+            self.fileptr.close()
+            self.fileptr = None
+            self.movie_memmap = numpy.memmap(filename,
+                                             dtype = self.image_mode,
+                                             mode = "r",
+                                             offset = self.header_size,
+                                             shape = (self.number_frames, self.image_height, self.image_width))
+
     def loadAFrame(self, frame_number, cast_to_int16 = True):
         """
         Load a frame & return it as a numpy array.
         """
         super(SpeReader, self).loadAFrame(frame_number)
+
+        if self.movie_memmap is not None:
+            image_data = self.movie_memmap[frame_number]
+            if cast_to_int16 and (self.image_mode != numpy.uint16):
+                image_data = image_data.astype(numpy.uint16)
+            return image_data
         
         self.fileptr.seek(self.header_size + frame_number * self.image_size)
         image_data = numpy.fromfile(self.fileptr, dtype=self.image_mode, count = self.image_height * self.image_width)
@@ -349,6 +516,22 @@ class SpeReader(Reader):
         image_data = numpy.reshape(image_data, [self.image_height, self.image_width])
         return image_data
 
+    def loadFrames(self, start, stop, cast_to_int16 = True):
+        if self.movie_memmap is not None:
+            self.checkFramesRange(start, stop)
+            frames = self.movie_memmap[start:stop]
+            if cast_to_int16 and (self.image_mode != numpy.uint16):
+                frames = frames.astype(numpy.uint16)
+            return frames
+
+        if cast_to_int16:
+            return super(SpeReader, self).loadFrames(start, stop)
+
+        frames = numpy.zeros((stop - start, self.image_height, self.image_width), dtype = self.image_mode)
+        for i in range(start, stop):
+            frames[i-start,:,:] = self.loadAFrame(i, cast_to_int16 = False)
+        return frames
+
 
 class TifReader(Reader):
     """
@@ -367,6 +550,9 @@ class TifReader(Reader):
         self.page_data = None
         self.page_number = -1
 
+        # tifffile is slow to import, so only import it if we need it.
+        import tifffile
+        
         # Save the filename
         self.fileptr = tifffile.TiffFile(filename)
         number_pages = len(self.fileptr.pages)
@@ -77,15 +77,16 @@ class SAH5DriftCorrection(saH5Py.SAH5Py):
         return image
 
     def locsInFrameRangeIterator(self, start, stop, fields):
-        for i in range(start, stop):
-            locs = self.getLocalizationsInFrame(i,
-                                                drift_corrected = False,
-                                                fields = fields)
+        """
+        This loads all of the localizations in the frame range at once.
+        """
+        locs = self.getLocalizationsInFrameRange(start,
+                                                 stop,
+                                                 drift_corrected = False,
+                                                 fields = fields)
 
-            # Skip empty frames.
-            if not bool(locs):
-                continue
-            
+        # Skip empty frame ranges.
+        if bool(locs):
             yield locs
 
     def saveDriftData(self, all_dx, all_dy, all_dz):
@@ -95,14 +96,10 @@ class SAH5DriftCorrection(saH5Py.SAH5Py):
         units of pixels (X,Y) or microns (Z).
         """
         assert(len(all_dx) == self.getMovieLength())
-        for i in range(self.getMovieLength()):
-            try:
-                self.setDriftCorrection(i,
-                                        dx = all_dx[i],
-                                        dy = all_dy[i],
-                                        dz = all_dz[i])
-            except saH5Py.SAH5PyException:
-                pass
+        self.setDriftCorrections(numpy.arange(self.getMovieLength()),
+                                 all_dx,
+                                 all_dy,
+                                 all_dz)
         
     def setDriftCorrectionXY(self, dx, dy):
         self.dx = dx
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Persistent FFTW wisdom.
+
+Creating FFTW_MEASURE quality plans for large images can take several
+seconds per plan. FFTW can save what it learned while planning (its
+'wisdom') so that the same plans can be re-created almost instantly.
+This module can keep this wisdom in a file so that it is shared between
+analysis runs on the same computer.
+
+FFTW wisdom is global to the FFTW library, and already includes the
+size and the planner flags of each plan, so all the C libraries can
+share a single wisdom file.
+
+The wisdom file is not used unless the STORM_ANALYSIS_FFTW_WISDOM
+environment variable is set to the name of the file. As FFTW wisdom
+is specific to a computer, on a cluster with a shared file system this
+should be a different file for each type of node.
+
+agent 10/26
+"""
+
+import ctypes
+import os
+import threading
+
+import storm_analysis.sa_library.loadclib as loadclib
+
+ft_math = loadclib.loadCLibrary("matched_filter")
+
+ft_math.ftmExportWisdom.argtypes = [ctypes.c_char_p]
+ft_math.ftmExportWisdom.restype = ctypes.c_int
+
+ft_math.ftmExportWisdomString.argtypes = [ctypes.c_char_p, ctypes.c_int]
+ft_math.ftmExportWisdomString.restype = ctypes.c_int
+
+ft_math.ftmImportWisdom.argtypes = [ctypes.c_char_p]
+ft_math.ftmImportWisdom.restype = ctypes.c_int
+
+# The FFTW wisdom as of the last time that we loaded or saved each
+# wisdom file.
+known = {}
+
+# FFTW's planner is not thread-safe, neither are these functions.
+lock = threading.Lock()
+
+
+def currentWisdom():
+    """
+    Return the current FFTW wisdom as a string.
+    """
+    size = ft_math.ftmExportWisdomString(None, 0)
+    if (size < 0):
+        return None
+    buffer = ctypes.create_string_buffer(size)
+    ft_math.ftmExportWisdomString(buffer, size)
+    return buffer.value
+
+
+def exportWisdom(filename = None):
+    """
+    Save the current FFTW wisdom, call this after creating FFTW plans.
+    The file is only written if planning added to the wisdom.
+
+    Another process may have updated the wisdom file since we loaded
+    it, so we merge in the current contents of the file first. The file
+    is replaced atomically so readers never see a partially written file.
+    Two processes writing at the same time may lose some of each others
+    wisdom, but this only means that the plan will be measured again.
+    """
+    if filename is None:
+        filename = wisdomFilename()
+    if not filename:
+        return
+
+    with lock:
+        wisdom = currentWisdom()
+        if (wisdom is not None) and (known.get(filename) == wisdom):
+            return
+
+        if os.path.exists(filename):
+            ft_math.ftmImportWisdom(filename.encode())
+        else:
+            dirname = os.path.dirname(filename)
+            if dirname and not os.path.exists(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError:
+                    # Another process may have just created it.
+                    if not os.path.isdir(dirname):
+                        return
+
+        tmp_filename = filename + "." + str(os.getpid()) + ".tmp"
+        try:
+            if ft_math.ftmExportWisdom(tmp_filename.encode()):
+                os.replace(tmp_filename, filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        known[filename] = currentWisdom()
+
+
+def importWisdom(filename = None):
+    """
+    Load FFTW wisdom, call this before creating FFTW plans. The file
+    is only loaded once per process.
+    """
+    if filename is None:
+        filename = wisdomFilename()
+    if not filename:
+        return
+
+    with lock:
+        if (filename in known) or not os.path.exists(filename):
+            return
+        ft_math.ftmImportWisdom(filename.encode())
+        known[filename] = currentWisdom()
+
+
+def wisdomFilename():
+    """
+    Return the name of the wisdom file, or None if there isn't one.
+    """
+    return os.environ.get("STORM_ANALYSIS_FFTW_WISDOM")
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
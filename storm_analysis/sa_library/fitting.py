@@ -20,9 +20,10 @@ at least in a statistical sense.
 
 Hazen 06/19
 """
+import multiprocessing.pool
 import numpy
 import os
-import tifffile
+import time
 
 import storm_analysis.sa_library.i3dtype as i3dtype
 import storm_analysis.sa_library.ia_utilities_c as iaUtilsC
@@ -109,28 +110,48 @@ def getPeakLocations(peak_filename, margin, pixel_size, sigma):
     #
     return [peak_locations, peak_locations_type]
 
-def padArray(ori_array, pad_size):
+def padArray(ori_array, pad_size, out = None):
     """
     Pads out an array to a large size.
 
     ori_array - A 2D numpy array.
     pad_size - The number of elements to add to each of the "sides" of the array.
+    out - (Optional) A 2D numpy float64 array of the padded size to store the 
+          result in. Re-using the same array avoids a memory allocation for
+          every call.
     
     The padded 2D numpy array.
     """
     if (pad_size > 0):
         [x_size, y_size] = ori_array.shape
-        lg_array = numpy.ones((x_size+2*pad_size,y_size+2*pad_size))
-        lg_array[pad_size:(x_size+pad_size),pad_size:(y_size+pad_size)] = ori_array.astype(numpy.float64)
-        lg_array[0:pad_size,:] = numpy.flipud(lg_array[pad_size:2*pad_size,:])
-        lg_array[(x_size+pad_size):(x_size+2*pad_size),:] = numpy.flipud(lg_array[x_size:(x_size+pad_size),:])
-        lg_array[:,0:pad_size] = numpy.fliplr(lg_array[:,pad_size:2*pad_size])
-        lg_array[:,(y_size+pad_size):(y_size+2*pad_size)] = numpy.fliplr(lg_array[:,y_size:(y_size+pad_size)])
+        if out is None:
+            lg_array = numpy.empty((x_size+2*pad_size,y_size+2*pad_size))
+        else:
+            assert (out.shape == (x_size+2*pad_size,y_size+2*pad_size)), "Output array has the wrong shape."
+            lg_array = out
+        lg_array[pad_size:(x_size+pad_size),pad_size:(y_size+pad_size)] = ori_array
+        padArrayEdges(lg_array, pad_size)
         return lg_array
     
     else:
         return ori_array
 
+def padArrayEdges(lg_array, pad_size):
+    """
+    Fill in the edges of an array (in place) by reflecting the interior
+    of the array. Reversed views are used instead of numpy.flipud() or
+    numpy.fliplr() to avoid creating temporary arrays.
+
+    lg_array - A 2D numpy array with the data in lg_array[pad_size:-pad_size,pad_size:-pad_size].
+    pad_size - The number of elements on each of the "sides" of the array.
+    """
+    x_size = lg_array.shape[0] - 2*pad_size
+    y_size = lg_array.shape[1] - 2*pad_size
+    lg_array[0:pad_size,:] = lg_array[(2*pad_size-1):(pad_size-1):-1,:]
+    lg_array[(x_size+pad_size):(x_size+2*pad_size),:] = lg_array[(x_size+pad_size-1):(x_size-1):-1,:]
+    lg_array[:,0:pad_size] = lg_array[:,(2*pad_size-1):(pad_size-1):-1]
+    lg_array[:,(y_size+pad_size):(y_size+2*pad_size)] = lg_array[:,(y_size+pad_size-1):(y_size-1):-1]
+
 def peakMask(shape, parameters, margin):
     """
     Return the array that is used to mask the image to reduce the ROI
@@ -148,7 +169,7 @@ def peakMask(shape, parameters, margin):
         yc = parameters.getAttr("y_center") + margin
 
         rr = rr*rr
-        xr = numpy.arange(peak_mask.shape[0]) - xc
+        xr = numpy.arange(peak_mask.shape[1]) - xc
         yr = numpy.arange(peak_mask.shape[0]) - yc
         xv, yv = numpy.meshgrid(xr, yr)
         peak_mask[((xv*xv + yv*yv) > rr)] = 0
@@ -175,6 +196,18 @@ def peakMask(shape, parameters, margin):
     return peak_mask
 
 
+def tileRanges(size, tile_size):
+    """
+    Divide the range [0, size) into (nearly) equal sized ranges that are
+    no larger than tile_size.
+
+    Returns a list of [start, stop] pairs.
+    """
+    n_tiles = (size - 1)//tile_size + 1
+    edges = [(i*size)//n_tiles for i in range(n_tiles + 1)]
+    return [[edges[i], edges[i+1]] for i in range(n_tiles)]
+
+
 #
 # Classes.
 #
@@ -182,6 +215,54 @@ def FittingException(Exception):
     pass
 
 
+class FrameStats(object):
+    """
+    Per-frame wall time of each stage of PeakFinderFitter.analyzeImage()
+    and the per-frame change in the fitting counters. This is only used
+    if the 'frame_stats' parameter is set.
+    """
+    # The analysis stages that are timed.
+    stages = ["load", "background", "find", "add", "fit", "filter", "fit_image", "properties"]
+
+    def __init__(self, **kwds):
+        super(FrameStats, self).__init__(**kwds)
+        self.counters = None
+        self.start_time = None
+        self.stats = None
+
+    def addTime(self, stage, start_time):
+        """
+        Add the time since start_time to the time for stage.
+        """
+        self.stats["time_" + stage] += time.time() - start_time
+
+    def finishFrame(self, counters, n_peaks):
+        """
+        counters - The fitting counters at the end of the frame.
+        n_peaks - The number of peaks that were found in the frame.
+        """
+        self.stats["n_peaks"] = n_peaks
+        for name in counters:
+            if self.counters is None:
+                self.stats[name] = counters[name]
+            else:
+                self.stats[name] = counters[name] - self.counters[name]
+        self.counters = counters
+        self.stats["time_total"] = time.time() - self.start_time
+
+    def getStats(self):
+        """
+        Return the statistics of the last frame as a dictionary.
+        """
+        return self.stats
+        
+    def startFrame(self):
+        self.start_time = time.time()
+        self.stats = {}
+        for stage in self.stages:
+            self.stats["time_" + stage] = 0.0
+
+
 class PeakFinder(object):
     """
     Base class for peak finding. This handles identification of peaks in an image.
@@ -266,6 +347,7 @@ class PeakFinder(object):
             self.background = self.backgroundEstimator(image)
 
         if self.check_mode:
+            import tifffile
             with tifffile.TiffWriter("bg_estimate.tif") as tf:
                 tf.save(self.background.astype(numpy.float32))
 
@@ -301,6 +383,32 @@ class PeakFinder(object):
         else:
             return [new_peaks, "finder", False]
 
+    def initTile(self, parent, tile):
+        """
+        Configure this finder to analyze one tile of the (padded) images
+        that parent analyzes. This must be called before the first image.
+
+        parent - The PeakFinder for the whole image, parent.peak_mask must be set.
+                 This can also be this finder.
+        tile - A (y slice, x slice) tuple in padded image coordinates.
+        """
+        if parent.camera_variance is not None:
+            self.camera_variance = parent.camera_variance[tile]
+        self.peak_mask = parent.peak_mask[tile]
+
+        # Only keep the pre-specified peak locations that are inside the tile.
+        if parent.peak_locations is not None:
+            px = parent.peak_locations["x"]
+            py = parent.peak_locations["y"]
+            mask = (px >= (tile[1].start + self.margin)) & (px < (tile[1].stop - self.margin)) & \
+                   (py >= (tile[0].start + self.margin)) & (py < (tile[0].stop - self.margin))
+            peak_locations = {}
+            for elt in parent.peak_locations:
+                peak_locations[elt] = parent.peak_locations[elt][mask]
+            peak_locations["x"] -= tile[1].start
+            peak_locations["y"] -= tile[0].start
+            self.peak_locations = peak_locations
+
     def newImage(self, new_image):
         """
         This is called once at the start of the analysis of a new image.
@@ -461,6 +569,7 @@ class PeakFinderGaussian(PeakFinder):
             bg_var = self.fg_vfilter.convolve(bg_var)
 
         if self.check_mode:
+            import tifffile
             with tifffile.TiffWriter("variances.tif") as tf:
                 tf.save(bg_var.astype(numpy.float32))
             
@@ -510,9 +619,10 @@ class PeakFinderArbitraryPSF(PeakFinder):
         kwds["parameters"] = parameters
         super(PeakFinderArbitraryPSF, self).__init__(**kwds)
 
-        self.fg_mfilter = []
+        self.fg_mfilter = None       # MultiMatchedFilter with the PSF at each z value.
         self.fg_mfilter_zval = []
-        self.fg_vfilter = []
+        self.fg_vfilter = None       # MultiMatchedFilter with the PSF squared at each z value.
+        self.filter_threads = parameters.getAttr("filter_threads", 1)
         self.psf_object = psf_object
         self.z_values = []
 
@@ -559,9 +669,9 @@ class PeakFinderArbitraryPSF(PeakFinder):
 
     def cleanUp(self):
         super(PeakFinderArbitraryPSF, self).cleanUp()
-        for i in range(len(self.fg_mfilter)):
-            self.fg_mfilter[i].cleanup()
-            self.fg_vfilter[i].cleanup()
+        if self.fg_mfilter is not None:
+            self.fg_mfilter.cleanup()
+            self.fg_vfilter.cleanup()
 
     def newImage(self, new_image):
         """
@@ -575,33 +685,38 @@ class PeakFinderArbitraryPSF(PeakFinder):
         # If does not already exist, create filter objects from
         # the PSF at different z values.
         #
-        if (len(self.fg_mfilter) == 0):
+        if self.fg_mfilter is None:
+            psfs = []
             for zval in self.fg_mfilter_zval:
                 psf = self.psf_object.getPSF(zval,
                                              shape = new_image.shape,
                                              normalize = False)
-                psf_norm = psf/numpy.sum(psf)
-                fg_mfilter = matchedFilterC.MatchedFilter(psf_norm,
-                                                          fftw_estimate = self.parameters.getAttr("fftw_estimate"),
-                                                          memoize = True,
-                                                          max_diff = 1.0e-3)
-                self.fg_mfilter.append(fg_mfilter)
-                self.fg_vfilter.append(matchedFilterC.MatchedFilter(psf_norm * psf_norm,
-                                                                    fftw_estimate = self.parameters.getAttr("fftw_estimate"),
-                                                                    memoize = True,
-                                                                    max_diff = 1.0e-3))
+                psfs.append(psf/numpy.sum(psf))
 
                 # Save a picture of the PSF for debugging purposes.
                 if self.check_mode:
+                    import tifffile
                     print("psf max", numpy.max(psf))
                     filename = "psf_{0:.3f}.tif".format(zval)
                     tifffile.imsave(filename, psf.astype(numpy.float32))
+
+            self.fg_mfilter = matchedFilterC.MultiMatchedFilter(psfs,
+                                                                fftw_estimate = self.parameters.getAttr("fftw_estimate"),
+                                                                memoize = True,
+                                                                max_diff = 1.0e-3,
+                                                                n_threads = self.filter_threads)
+            self.fg_vfilter = matchedFilterC.MultiMatchedFilter(list(map(lambda x: x * x, psfs)),
+                                                                fftw_estimate = self.parameters.getAttr("fftw_estimate"),
+                                                                memoize = True,
+                                                                max_diff = 1.0e-3,
+                                                                n_threads = self.filter_threads)
                         
     def peakFinder(self, fit_peaks_image):
         """
         This method does the actual peak finding.
         """
         if self.check_mode:
+            import tifffile
             tifffile.imsave("fit_peaks.tif", fit_peaks_image.astype(numpy.float32))
 
         # Calculate background variance.
@@ -629,11 +744,17 @@ class PeakFinderArbitraryPSF(PeakFinder):
             fg_tif = tifffile.TiffWriter("foreground.tif")
             fg_bg_ratio_tif = tifffile.TiffWriter("fg_bg_ratio.tif")
 
+        # Convolve with the PSF at each z value. The filters only
+        # calculate the FFT of bg_var and of the foreground once.
+        #
+        backgrounds = self.fg_vfilter.convolve(bg_var)
+        foregrounds = self.fg_mfilter.convolve(self.image - self.background - fit_peaks_image)
+
         masked_images = []
-        for i in range(len(self.fg_mfilter)):
+        for i in range(backgrounds.shape[0]):
 
             # Estimate background variance at this particular z value.
-            background = self.fg_vfilter[i].convolve(bg_var)
+            background = backgrounds[i]
 
             # Remove problematic values.
             #
@@ -646,9 +767,8 @@ class PeakFinderArbitraryPSF(PeakFinder):
             # Convert to standard deviation.
             bg_std = numpy.sqrt(background)
 
-            # Calculate foreground.
-            foreground = self.image - self.background - fit_peaks_image
-            foreground = self.fg_mfilter[i].convolve(foreground)
+            # Foreground at this particular z value.
+            foreground = foregrounds[i]
 
             # Calculate foreground in units of signal to noise.
             fg_bg_ratio = foreground/bg_std
@@ -689,12 +809,17 @@ class PeakFitter(object):
                                                               # iterations. This is useful for testing the
                                                               # finder, as well as how accurately we're
                                                               # initializing the peak parameter values.
+        self.frame_stats = None        # A FrameStats object, if we are recording per-frame statistics.
         self.image = None              # The image for peak fitting.
         self.mfitter = mfitter         # An instance of a sub-class of the MultiFitter class.
         self.minimum_significance = parameters.getAttr("threshold")         # The threshold value is also the minimum peak significance value.
         self.sigma = parameters.getAttr("sigma")                            # Peak sigma (in pixels).
         self.neighborhood = self.sigma * PeakFinderFitter.unconverged_dist  # Radius for marking neighbors as unconverged.
 
+    def addTime(self, stage, start_time):
+        if self.frame_stats is not None:
+            self.frame_stats.addTime(stage, start_time)
+            
     def cleanUp(self):
         self.mfitter.cleanup()
 
@@ -712,16 +837,16 @@ class PeakFitter(object):
         # Check if we need to do anything.
         if (new_peaks["x"].size > 0):
 
+            start_time = time.time()
+            
             # Update status of current peaks (if any) that are near
             # to the new peaks that are being added.
             #
             if (self.mfitter.getNFit() > 0):
-                c_x = self.mfitter.getPeakProperty("x")
-                c_y = self.mfitter.getPeakProperty("y")
-                status = self.mfitter.getPeakProperty("status")
-                new_status = iaUtilsC.runningIfHasNeighbors(status,
-                                                            c_x,
-                                                            c_y,
+                props = self.mfitter.getPeakProperties(["status", "x", "y"])
+                new_status = iaUtilsC.runningIfHasNeighbors(props["status"],
+                                                            props["x"],
+                                                            props["y"],
                                                             new_peaks["x"],
                                                             new_peaks["y"],
                                                             self.neighborhood)
@@ -729,6 +854,7 @@ class PeakFitter(object):
                 
             # Add new peaks.
             self.mfitter.newPeaks(new_peaks, peaks_type)
+            self.addTime("add", start_time)
 
             # Iterate fitting and remove any error peaks.
             #
@@ -736,14 +862,18 @@ class PeakFitter(object):
             # fit image we don't have to do additional iterations on the
             # remaining peaks after the error peaks have been removed.
             #
+            start_time = time.time()
             if not self.no_fitting:
                 self.mfitter.doFit()
                 self.mfitter.removeErrorPeaks()
+            self.addTime("fit", start_time)
 
             # Remove peaks that are too close to each other and/or that
             # have a low significance score.
             #
-            status = self.mfitter.getPeakProperty("status")
+            start_time = time.time()
+            props = self.mfitter.getPeakProperties(["height", "significance", "status", "x", "y"])
+            status = props["status"]
 
             # Identify peaks that are to close based on the somewhat
             # arbitrary criteria of being within 1 sigma.
@@ -751,11 +881,11 @@ class PeakFitter(object):
             # markDimmerPeaks() will update the status array, in particular
             # it will mark the dimmer of two peaks that are too close as ERROR.
             #
-            px = self.mfitter.getPeakProperty("x")
-            py = self.mfitter.getPeakProperty("y")
+            px = props["x"]
+            py = props["y"]
             n_proximity = iaUtilsC.markDimmerPeaks(px,
                                                    py,
-                                                   self.mfitter.getPeakProperty("height"),
+                                                   props["height"],
                                                    status,
                                                    self.sigma,
                                                    self.neighborhood)
@@ -767,7 +897,7 @@ class PeakFitter(object):
             #
             n_significance = iaUtilsC.markLowSignificancePeaks(px,
                                                                py,
-                                                               self.mfitter.getPeakProperty("significance"),
+                                                               props["significance"],
                                                                status,
                                                                self.minimum_significance,
                                                                self.neighborhood)
@@ -780,17 +910,45 @@ class PeakFitter(object):
                 self.mfitter.removeErrorPeaks()
                 self.mfitter.incProximityCounter(n_proximity)
                 self.mfitter.incSignificanceCounter(n_significance)
+            self.addTime("filter", start_time)
 
             # If we have unconverged peaks, iterate some more.
+            start_time = time.time()
             if (self.mfitter.getUnconverged() > 0) and (not self.no_fitting):
                 self.mfitter.doFit()
                 self.mfitter.removeErrorPeaks()
+            self.addTime("fit", start_time)
 
         # Return the current fit image.
-        return self.mfitter.getFitImage()
+        start_time = time.time()
+        fit_image = self.mfitter.getFitImage()
+        self.addTime("fit_image", start_time)
+        return fit_image
+
+    def getFitCounters(self):
+        return self.mfitter.getFitCounters()
+
+    def getNFit(self):
+        return self.mfitter.getNFit()
+        
+    def getPeakProperties(self, pnames):
+        return self.mfitter.getPeakProperties(pnames)
 
     def getPeakProperty(self, pname):
         return self.mfitter.getPeakProperty(pname)
+
+    def initTile(self, parent, tile):
+        """
+        Configure this fitter to analyze one tile of the (padded) images
+        that parent analyzes. This must be called before the first image.
+
+        parent - The PeakFitter for the whole image, this can also be this fitter.
+        tile - A (y slice, x slice) tuple in padded image coordinates.
+        """
+        if parent.mfitter.rqe is not None:
+            self.mfitter.rqe = parent.mfitter.rqe[tile]
+        if parent.mfitter.scmos_cal is not None:
+            self.mfitter.scmos_cal = parent.mfitter.scmos_cal[tile]
         
     def newBackground(self, new_background):
         """
@@ -855,6 +1013,10 @@ class PeakFinderFitter(object):
         """
         super(PeakFinderFitter, self).__init__(**kwds)
 
+        self.crop_offset = None
+        self.fit_peaks_buffer = None
+        self.frame_stats = None
+        self.image_buffer = None
         self.peak_finder = peak_finder
         self.peak_fitter = peak_fitter
         self.properties = properties
@@ -871,47 +1033,112 @@ class PeakFinderFitter(object):
 
         return - found peaks dictionary.
         """
+        if self.frame_stats is not None:
+            self.frame_stats.startFrame()
+        start_time = time.time()
+        
         # Load image (in photo-electrons).
         [image, fit_peaks_image] = self.loadImage(movie_reader)
 
         # Load background estimate (in photo-electrons).
         bg_estimate = self.loadBackgroundEstimate(movie_reader)
+        self.addTime("load", start_time)
+
+        peaks = self.findAndFitPeaks(image, fit_peaks_image, bg_estimate)
+        self.uncropPeaks(peaks)
+
+        if self.frame_stats is not None:
+            self.frame_stats.finishFrame(self.peak_fitter.getFitCounters(), self.peak_fitter.getNFit())
+            
+        return peaks
 
+    def addTime(self, stage, start_time):
+        if self.frame_stats is not None:
+            self.frame_stats.addTime(stage, start_time)
+
+    def cleanUp(self):
+        self.peak_finder.cleanUp()
+        self.peak_fitter.cleanUp()
+
+    def enableFrameStats(self):
+        """
+        Record per-frame statistics, these are available with getFrameStats()
+        after each call to analyzeImage().
+        """
+        self.frame_stats = FrameStats()
+        self.peak_fitter.frame_stats = self.frame_stats
+
+    def findAndFitPeaks(self, image, fit_peaks_image, bg_estimate):
+        """
+        Find and fit all the peaks in a (padded) image.
+
+        image - The padded image (in photo-electrons).
+        fit_peaks_image - The starting fit image, usually all zeros.
+        bg_estimate - The padded background estimate, or None.
+
+        return - found peaks dictionary.
+        """
+        start_time = time.time()
         self.peak_finder.newImage(image)
         self.peak_fitter.newImage(image)
+        self.addTime("load", start_time)
 
         for i in range(self.peak_finder.iterations):
 
             # Update background estimate.
+            start_time = time.time()
             background = self.peak_finder.estimateBackground(fit_peaks_image, bg_estimate)
+            self.peak_fitter.newBackground(background)
+            self.addTime("background", start_time)
 
             # Find new peaks.
+            start_time = time.time()
             [new_peaks, peaks_type, done] = self.peak_finder.findPeaks(fit_peaks_image)
+            self.addTime("find", start_time)
 
             # Fit new peaks.
-            self.peak_fitter.newBackground(background)
             fit_peaks_image = self.peak_fitter.fitPeaks(new_peaks, peaks_type)
                     
             if done:
                 break
 
         # Remove any peaks that have not converged.
+        start_time = time.time()
         self.peak_fitter.removeRunningPeaks()
 
         # Return a dictionary with the requested properties.
-        return self.getPeakProperties()
+        peaks = self.getPeakProperties()
+        self.addTime("properties", start_time)
 
-    def cleanUp(self):
-        self.peak_finder.cleanUp()
-        self.peak_fitter.cleanUp()
+        return peaks
 
+    def getEmptyPeaks(self):
+        """
+        Return a peaks dictionary with no peaks. This is what is saved for
+        frames that are not analyzed.
+        """
+        peaks = {}
+        for pname in self.properties:
+            if (self.peak_fitter.mfitter.peak_properties.get(pname) == "int"):
+                peaks[pname] = numpy.zeros(0, dtype = numpy.int32)
+            else:
+                peaks[pname] = numpy.zeros(0, dtype = numpy.float64)
+        return peaks
+
+    def getFrameStats(self):
+        """
+        Return the statistics of the last frame that was analyzed, or None
+        if enableFrameStats() was not called.
+        """
+        if self.frame_stats is not None:
+            return self.frame_stats.getStats()
+        
     def getPeakProperties(self):
         """
         Create a dictionary with the requested properties.
         """
-        peaks = {}
+        peaks = self.peak_fitter.getPeakProperties(self.properties)
         for pname in self.properties:
-            peaks[pname] = self.peak_fitter.getPeakProperty(pname)
 
             # x,y,z corrections.
             if (pname == "x"):
@@ -932,12 +1159,254 @@ class PeakFinderFitter(object):
             
         return bg_estimate
         
+    def initCrop(self, crop):
+        """
+        Configure the finder and the fitter for frames that the MovieReader
+        crops to crop, [x_start, x_stop, y_start, y_stop] (or None). This
+        crops the sCMOS calibration data, the peak mask and the peak locations
+        (if any), which are all in the coordinates of the full frame.
+        """
+        self.crop_offset = [0, 0]
+        if crop is None:
+            return
+
+        # Only the part of the peak mask up to the end of the crop is needed.
+        margin = self.peak_finder.margin
+        [x_start, x_stop, y_start, y_stop] = crop
+        if self.peak_finder.peak_mask is None:
+            self.peak_finder.peak_mask = peakMask((y_stop + 2*margin, x_stop + 2*margin),
+                                                  self.peak_finder.parameters,
+                                                  margin)
+
+        crop_slice = (slice(y_start, y_stop + 2*margin), slice(x_start, x_stop + 2*margin))
+        self.peak_finder.initTile(self.peak_finder, crop_slice)
+        self.peak_fitter.initTile(self.peak_fitter, crop_slice)
+        self.crop_offset = [x_start, y_start]
+        
     def loadImage(self, movie_reader):
-        image = padArray(movie_reader.getFrame(), self.peak_finder.margin)
-        fit_peaks_image = numpy.zeros(image.shape)
-        return [image, fit_peaks_image]
+        if self.crop_offset is None:
+            self.initCrop(movie_reader.getCrop())
+            
+        frame = movie_reader.getFrame()
+        margin = self.peak_finder.margin
+
+        # Re-use the same memory for the padded image and the starting fit
+        # image. This is safe as both the finder and the fitter make their
+        # own copies of the image. The starting fit image is only read, and
+        # after the first fitting iteration it is replaced by the fitter's
+        # own fit image buffer (see MultiFitter.getFitImage()).
+        shape = (frame.shape[0] + 2*margin, frame.shape[1] + 2*margin)
+        if (self.image_buffer is None) or (self.image_buffer.shape != shape):
+            self.image_buffer = numpy.empty(shape)
+            self.fit_peaks_buffer = numpy.empty(shape)
+        image = padArray(frame, margin, out = self.image_buffer)
+        self.fit_peaks_buffer.fill(0.0)
+        return [image, self.fit_peaks_buffer]
+
+    def uncropPeaks(self, peaks):
+        """
+        Convert the peak locations from the coordinates of the cropped frame
+        to the coordinates of the full frame.
+        """
+        if (self.crop_offset is not None) and (self.crop_offset != [0, 0]):
+            peaks["x"] += float(self.crop_offset[0])
+            peaks["y"] += float(self.crop_offset[1])
 
 
+class TiledPeakFinderFitter(PeakFinderFitter):
+    """
+    Analyzes (large) images as a grid of overlapping tiles. Each tile has its 
+    own PeakFinderFitter, so the tiles can be analyzed in parallel.
+
+    Each tile owns a part of the image, and the tiles do not overlap. A tile
+    is analyzed together with 'tile_overlap' pixels of the surrounding image,
+    so that the peaks near the edges of the part of the image that it owns
+    are fit together with their neighbors. The only localizations that are
+    kept are the ones that are inside the part of the image that the tile owns,
+    so each localization comes from exactly one tile.
+
+    The first image is analyzed one tile at a time as this is when the FFTW
+    plans are created, and FFTW planning is not thread safe.
+
+    The per-frame statistics are the sum over all the tiles, so the time of
+    each stage can be larger than the total time if the tiles are analyzed
+    in parallel.
+    """
+    def __init__(self, find_fit_init = None, parameters = None, **kwds):
+        """
+        find_fit_init - A function that creates (untiled) PeakFinderFitter objects
+                        from a parameters object.
+        parameters - A parameters object.
+        """
+        template = find_fit_init(parameters)
+        kwds["peak_finder"] = template.peak_finder
+        kwds["peak_fitter"] = template.peak_fitter
+        kwds["properties"] = template.properties
+        super(TiledPeakFinderFitter, self).__init__(**kwds)
+
+        self.find_fit_init = find_fit_init
+        self.parameters = parameters
+        self.pool = None
+        self.tile_overlap = parameters.getAttr("tile_overlap", 2*self.peak_finder.margin)
+        self.tile_size = parameters.getAttr("tile_size")
+        self.tile_threads = parameters.getAttr("tile_threads", 1)
+        self.tiles = None
+
+    def analyzeImage(self, movie_reader):
+        """
+        Analyze an image and return all the peaks that were found and fit.
+
+        movie_reader - analysis_io.MovieReader object.
+
+        return - found peaks dictionary.
+        """
+        if self.frame_stats is not None:
+            self.frame_stats.startFrame()
+        start_time = time.time()
+        
+        # Load image (in photo-electrons).
+        [image, fit_peaks_image] = self.loadImage(movie_reader)
+
+        # Load background estimate (in photo-electrons).
+        bg_estimate = self.loadBackgroundEstimate(movie_reader)
+        self.addTime("load", start_time)
+
+        # Analyze the tiles.
+        if self.tiles is None:
+            self.createTiles(image.shape)
+            tile_peaks = [self.analyzeTile(tile, image, bg_estimate) for tile in self.tiles]
+        elif self.pool is None:
+            tile_peaks = [self.analyzeTile(tile, image, bg_estimate) for tile in self.tiles]
+        else:
+            tile_peaks = self.pool.map(lambda tile: self.analyzeTile(tile, image, bg_estimate), self.tiles)
+
+        # Merge the peaks from each tile.
+        start_time = time.time()
+        peaks = {}
+        for pname in self.properties:
+            peaks[pname] = numpy.concatenate([elt[pname] for elt in tile_peaks])
+        self.uncropPeaks(peaks)
+        self.addTime("properties", start_time)
+
+        if self.frame_stats is not None:
+            for tile in self.tiles:
+                tile_stats = tile["finder_fitter"].getFrameStats()
+                for stage in FrameStats.stages:
+                    self.frame_stats.stats["time_" + stage] += tile_stats["time_" + stage]
+            self.frame_stats.finishFrame(self.getFitCounters(), peaks["x"].size)
+            
+        return peaks
+
+    def analyzeTile(self, tile, image, bg_estimate):
+        """
+        Analyze a single tile of the image.
+
+        tile - A tile dictionary, see createTiles().
+        image - The padded image.
+        bg_estimate - The padded background estimate, or None.
+
+        return - found peaks dictionary for the part of the image that the tile owns.
+        """
+        finder_fitter = tile["finder_fitter"]
+        if finder_fitter.frame_stats is not None:
+            finder_fitter.frame_stats.startFrame()
+        start_time = time.time()
+
+        t_image = numpy.ascontiguousarray(image[tile["slice"]])
+        t_bg_estimate = None
+        if bg_estimate is not None:
+            t_bg_estimate = numpy.ascontiguousarray(bg_estimate[tile["slice"]])
+        finder_fitter.addTime("load", start_time)
+
+        peaks = finder_fitter.findAndFitPeaks(t_image, numpy.zeros(t_image.shape), t_bg_estimate)
+
+        if finder_fitter.frame_stats is not None:
+            finder_fitter.frame_stats.finishFrame(finder_fitter.peak_fitter.getFitCounters(),
+                                                  finder_fitter.peak_fitter.getNFit())
+
+        # Convert to image coordinates and only keep the peaks that this tile owns.
+        peaks["x"] += tile["offset"][0]
+        peaks["y"] += tile["offset"][1]
+
+        [x_min, x_max, y_min, y_max] = tile["bounds"]
+        mask = (peaks["x"] >= x_min) & (peaks["x"] < x_max) & (peaks["y"] >= y_min) & (peaks["y"] < y_max)
+        for pname in peaks:
+            peaks[pname] = peaks[pname][mask]
+
+        return peaks
+
+    def cleanUp(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        if self.tiles is not None:
+            for tile in self.tiles:
+                tile["finder_fitter"].cleanUp()
+        super(TiledPeakFinderFitter, self).cleanUp()
+
+    def createTiles(self, shape):
+        """
+        Create the tiles and their PeakFinderFitter objects.
+
+        shape - The shape of the padded image.
+        """
+        margin = self.peak_finder.margin
+        if self.peak_finder.peak_mask is None:
+            self.peak_finder.peak_mask = peakMask(shape, self.parameters, margin)
+
+        y_ranges = tileRanges(shape[0] - 2*margin, self.tile_size)
+        x_ranges = tileRanges(shape[1] - 2*margin, self.tile_size)
+        
+        self.tiles = []
+        for i, [y_start, y_stop] in enumerate(y_ranges):
+            for j, [x_start, x_stop] in enumerate(x_ranges):
+
+                # The part of the image that this tile analyzes.
+                x_a_start = max(0, x_start - self.tile_overlap)
+                x_a_stop = min(shape[1] - 2*margin, x_stop + self.tile_overlap)
+                y_a_start = max(0, y_start - self.tile_overlap)
+                y_a_stop = min(shape[0] - 2*margin, y_stop + self.tile_overlap)
+                tile_slice = (slice(y_a_start, y_a_stop + 2*margin),
+                              slice(x_a_start, x_a_stop + 2*margin))
+
+                # The part of the image that this tile owns. The tiles at the
+                # edge of the image also own everything beyond the edge.
+                bounds = [x_start, x_stop, y_start, y_stop]
+                if (j == 0):
+                    bounds[0] = -numpy.inf
+                if (j == (len(x_ranges) - 1)):
+                    bounds[1] = numpy.inf
+                if (i == 0):
+                    bounds[2] = -numpy.inf
+                if (i == (len(y_ranges) - 1)):
+                    bounds[3] = numpy.inf
+
+                finder_fitter = self.find_fit_init(self.parameters)
+                finder_fitter.peak_finder.initTile(self.peak_finder, tile_slice)
+                finder_fitter.peak_fitter.initTile(self.peak_fitter, tile_slice)
+                if self.frame_stats is not None:
+                    finder_fitter.enableFrameStats()
+                
+                self.tiles.append({"bounds" : bounds,
+                                   "finder_fitter" : finder_fitter,
+                                   "offset" : [x_a_start, y_a_start],
+                                   "slice" : tile_slice})
+
+        if (self.tile_threads > 1) and (len(self.tiles) > 1):
+            self.pool = multiprocessing.pool.ThreadPool(processes = self.tile_threads)
+
+    def getFitCounters(self):
+        """
+        Return the sum of the fitting counters of all the tiles.
+        """
+        counters = {}
+        for tile in self.tiles:
+            t_counters = tile["finder_fitter"].peak_fitter.getFitCounters()
+            for name in t_counters:
+                counters[name] = counters.get(name, 0) + t_counters[name]
+        return counters
+
+        
 class PSFFunction(object):
     """
     This is the base class for handling the PSF for fitters that use
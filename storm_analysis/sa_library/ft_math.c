@@ -210,6 +210,55 @@ void ftmDoubleZero(double *v1, int size)
 }
 
 
+/*
+ * ftmExportWisdom()
+ *
+ * Save the current FFTW wisdom to a file. Note that FFTW wisdom is global
+ * so this will include the wisdom accumulated by all the C libraries.
+ *
+ * filename - The name of the file to save the wisdom in.
+ *
+ * Returns 1 on success, 0 on failure.
+ */
+int ftmExportWisdom(char *filename)
+{
+  return fftw_export_wisdom_to_filename(filename);
+}
+
+
+/*
+ * ftmExportWisdomString()
+ *
+ * Copy the current FFTW wisdom into a string. This is used to check
+ * whether planning has added anything to the wisdom.
+ *
+ * buffer - Storage for the wisdom, this can be NULL if size is 0.
+ * size - The size of buffer.
+ *
+ * Returns the size of buffer that is needed to store the wisdom (including
+ * the terminating NULL), or -1 on failure. Nothing is copied if buffer is
+ * too small.
+ */
+int ftmExportWisdomString(char *buffer, int size)
+{
+  int length;
+  char *wisdom;
+
+  wisdom = fftw_export_wisdom_to_string();
+  if(wisdom == NULL){
+    return -1;
+  }
+
+  length = strlen(wisdom) + 1;
+  if(length <= size){
+    memcpy(buffer, wisdom, length);
+  }
+  free(wisdom);
+  
+  return length;
+}
+
+
 /*
  * ftmForwardCheck2D()
  *
@@ -228,3 +277,20 @@ void ftmForwardCheck2D(fftw_complex *data_fft, double *data, int x_size, int y_s
   fftw_execute(fft_forward);  
   fftw_destroy_plan(fft_forward);
 }
+
+
+/*
+ * ftmImportWisdom()
+ *
+ * Add the FFTW wisdom in a file to the current FFTW wisdom. Plans that
+ * are created after this will be created faster if they match the
+ * wisdom in the file.
+ *
+ * filename - The name of the file to load the wisdom from.
+ *
+ * Returns 1 on success, 0 on failure.
+ */
+int ftmImportWisdom(char *filename)
+{
+  return fftw_import_wisdom_from_filename(filename);
+}
@@ -15,6 +15,9 @@ void ftmComplexZero(fftw_complex *, int);
 void ftmDoubleCopy(double *, double *, int);
 void ftmDoubleCopyNormalize(double *, double *, double, int);
 void ftmDoubleZero(double *, int);
+int ftmExportWisdom(char *);
+int ftmExportWisdomString(char *, int);
+int ftmImportWisdom(char *);
 /* void ftmDoubleNormalize(double *, double, int); */
 
 #endif
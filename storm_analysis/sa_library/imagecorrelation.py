@@ -9,6 +9,7 @@ import matplotlib
 import matplotlib.pyplot as pyplot
 import numpy
 import scipy
+import scipy.fft
 import scipy.optimize
 import scipy.signal
 
@@ -19,6 +20,125 @@ class ImageCorrelationException(Exception):
     pass
 
 
+class XYCorrelator(object):
+    """
+    FFT based XY cross-correlation of a reference image against one or
+    more other images of the same size.
+
+    The FFT of the reference image is cached so that it can be re-used
+    and the images are zero padded to sizes that are fast to transform.
+    The correlations are the same as xyCorrelate(reference, image), and
+    the offsets are the same as xyOffset(reference, image, scale).
+    """
+    def __init__(self, shape = None, scale = None, **kwds):
+        super(XYCorrelator, self).__init__(**kwds)
+        self.ref_fft = None
+        self.scale = scale
+        self.shape = tuple(shape)
+        self.fshape = [scipy.fft.next_fast_len(2*elt - 1, True) for elt in self.shape]
+
+        # These crop the (circular) correlation to the same size and
+        # origin as xyCorrelate().
+        [sx, sy] = self.shape
+        self.crop_x = ((numpy.arange(sx) - sx//2) % self.fshape[0])[:,None]
+        self.crop_y = ((numpy.arange(sy) - sy//2) % self.fshape[1])[None,:]
+
+    def correlate(self, image_ffts):
+        """
+        Returns the correlation of the reference with each image, image_ffts
+        are the FFTs of the images as returned by fft().
+        """
+        corr = scipy.fft.irfftn(self.ref_fft * numpy.conj(image_ffts), self.fshape, axes = (-2, -1))
+        return corr[..., self.crop_x, self.crop_y]
+
+    def fft(self, images):
+        """
+        Returns the FFT of an image or a stack of images (the last two axises
+        are the image axises), after subtracting the median of each image.
+        """
+        images = numpy.asarray(images)
+        images = images - numpy.median(images, axis = (-2, -1), keepdims = True)
+        return scipy.fft.rfftn(images, self.fshape, axes = (-2, -1))
+
+    def offset(self, image, center = None):
+        """
+        Returns [corr, dx, dy, success] for a single image.
+        """
+        return self.offsetsFromFFTs(self.fft(image)[None,...], centers = [center])[0]
+
+    def offsets(self, images, centers = None):
+        """
+        Returns a list of [corr, dx, dy, success], one for each image.
+        """
+        return self.offsetsFromFFTs(self.fft(images), centers = centers)
+
+    def offsetsFromFFTs(self, image_ffts, centers = None):
+        """
+        Returns a list of [corr, dx, dy, success], one for each image FFT.
+        """
+        if centers is None:
+            centers = [None] * image_ffts.shape[0]
+
+        results = []
+        corr = self.correlate(image_ffts)
+        for i in range(corr.shape[0]):
+            results.append(xyOffsetFromCorrelation(corr[i], self.scale, center = centers[i]))
+        return results
+
+    def setReference(self, image):
+        self.ref_fft = self.fft(image)
+
+    def setReferenceFFT(self, ref_fft):
+        self.ref_fft = ref_fft
+
+
+class ZCorrelator(object):
+    """
+    FFT based Z cross-correlation of a reference 3D image against other
+    3D images of the same size. The FFT (in z) of the reference is cached.
+
+    The offsets are the same as zOffset(reference, image).
+    """
+    def __init__(self, shape = None, **kwds):
+        super(ZCorrelator, self).__init__(**kwds)
+        self.ref_fft = None
+        self.size_z = shape[2]
+        self.fsize = scipy.fft.next_fast_len(2*self.size_z - 1, True)
+
+        # The number of z planes that overlap at each offset, and the indices
+        # of each offset in the (circular) correlation.
+        lags = numpy.arange(2*self.size_z - 1) - (self.size_z - 1)
+        self.overlap = (self.size_z - numpy.abs(lags)).astype(numpy.float64)
+        self.lags = lags % self.fsize
+
+    def correlate(self, image_fft):
+        """
+        Returns the (overlap normalized) z correlation of the reference with
+        an image, image_fft is the FFT of the image as returned by fft().
+        """
+        # The sum over x/y is done before the inverse transform.
+        corr_fft = numpy.sum(numpy.conj(self.ref_fft) * image_fft, axis = (0, 1))
+        corr = scipy.fft.irfft(corr_fft, self.fsize)[self.lags]
+
+        # Remove round-off noise so that exactly zero correlations (for example
+        # from data that is actually 2D) are still zero.
+        corr[(numpy.abs(corr) < 1.0e-9 * numpy.max(numpy.abs(corr)))] = 0.0
+        return corr/self.overlap
+
+    def fft(self, image):
+        image = image - numpy.median(image)
+        return scipy.fft.rfft(image, self.fsize, axis = 2)
+
+    def offset(self, image):
+        """
+        Returns [corr, fit, dz, success].
+        """
+        return zOffsetFromCorrelation(self.correlate(self.fft(image)))
+
+    def setReference(self, image):
+        self.ref_fft = self.fft(image)
+        
+
 class Align3D(object):
     """
     This class is used to aligns two 3D image stacks (translation
@@ -464,6 +584,12 @@ def xyOffset(image1, image2, scale, center = None):
         tifffile.imsave("corr_image2.tif", image2.astype(numpy.float32))
         tifffile.imsave("corr_result.tif", result.astype(numpy.float32))
 
+    return xyOffsetFromCorrelation(result, scale, center = center)
+
+def xyOffsetFromCorrelation(result, scale, center = None):
+    """
+    Find the offset from the correlation image (as returned by xyCorrelate()).
+    """
     # These are the coordinates of the image center.
     mx = int(round(0.5 * result.shape[0]))
     my = int(round(0.5 * result.shape[1]))
@@ -544,6 +670,14 @@ def zOffset(image1, image2):
         corr[i] = numpy.sum(image1[:,:,size_z-1-i:size_z] * image2[:,:,:i+1])/float(i+1)
     for i in range(size_z):
         corr[size_z-1+i] = numpy.sum(image1[:,:,:size_z-i] * image2[:,:,i:size_z])/float(size_z-i)
+
+    return zOffsetFromCorrelation(corr)
+
+def zOffsetFromCorrelation(corr):
+    """
+    Find the offset from the z correlation (as calculated by zOffset()).
+    """
+    size_z = (corr.size + 1)//2
     
     # This handles data that is actually 2D
     number_non_zero = 0
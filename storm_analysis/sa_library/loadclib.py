@@ -2,6 +2,12 @@
 """
 Handle loading the correct C library.
 
+By default the libraries are loaded lazily, loadCLibrary() returns a
+LazyCLibrary object and the library is only loaded, and the argument
+and return types of its functions set, when one of its functions is
+first called. This way importing a module that wraps a C library (and
+most modules import several) is fast.
+
 Hazen 11/14
 """
 
@@ -9,10 +15,106 @@ import ctypes
 import sys
 import os
 import re
+import threading
 
 import storm_analysis
 
-def loadCLibrary(library_filename):
+
+class LazyCFunction(object):
+    """
+    Stands in for a function of a C library that has not been loaded
+    yet. This records the function's argtypes, restype and errcheck.
+    """
+    def __init__(self, c_library, name):
+        object.__setattr__(self, "c_library", c_library)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "properties", {})
+
+    def __call__(self, *args):
+        self.c_library.load()
+        return getattr(self.c_library, self.name)(*args)
+
+    def __getattr__(self, name):
+        if name in self.properties:
+            return self.properties[name]
+        raise AttributeError(name)
+        
+    def __setattr__(self, name, value):
+        if not (name in ["argtypes", "errcheck", "restype"]):
+            raise AttributeError("Cannot set '" + name + "' of a C function.")
+
+        # The library may already have been loaded.
+        if self.c_library.isLoaded():
+            setattr(getattr(self.c_library, self.name), name, value)
+        else:
+            self.properties[name] = value
+
+
+class LazyCLibrary(object):
+    """
+    A C library that is loaded when one of its functions is first called.
+
+    Once the library is loaded the (ctypes) functions are stored as
+    attributes of this object, so calling them has no extra overhead.
+    """
+    def __init__(self, library_filename):
+        object.__setattr__(self, "_c_lib", None)
+        object.__setattr__(self, "_functions", {})
+        object.__setattr__(self, "_library_filename", library_filename)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def __getattr__(self, name):
+        # Only called for the functions that we have not bound yet.
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        if self.isLoaded():
+            c_func = getattr(self._c_lib, name)
+            object.__setattr__(self, name, c_func)
+            return c_func
+
+        if not name in self._functions:
+            self._functions[name] = LazyCFunction(self, name)
+        return self._functions[name]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Cannot set '" + name + "' of a C library.")
+
+    def isLoaded(self):
+        return (self._c_lib is not None)
+    
+    def load(self):
+        """
+        Load the library and set the argument and return types of the
+        functions that were specified before it was loaded.
+        """
+        with self._lock:
+            if self.isLoaded():
+                return
+            
+            c_lib = openCLibrary(self._library_filename)
+            for name in self._functions:
+                c_func = getattr(c_lib, name)
+                for prop, value in self._functions[name].properties.items():
+                    setattr(c_func, prop, value)
+                object.__setattr__(self, name, c_func)
+            object.__setattr__(self, "_c_lib", c_lib)
+
+            
+def loadCLibrary(library_filename, lazy = True):
+    """
+    Returns a LazyCLibrary object, or if lazy is False the ctypes
+    library.
+    """
+    if lazy:
+        return LazyCLibrary(library_filename)
+    else:
+        return openCLibrary(library_filename)
+
+def openCLibrary(library_filename):
+    """
+    Load a C library.
+    """
 
     #
     # This assumes that all the code that will call C modules is one level
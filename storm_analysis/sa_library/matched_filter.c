@@ -24,6 +24,10 @@
 #include <stdio.h>
 #include <math.h>
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
 #include <fftw3.h>
 
 #include "ft_math.h"
@@ -49,11 +53,43 @@ struct filter_struct {
 };
 typedef struct filter_struct filter;
 
+/*
+ * Multiple filters that are applied to the same image. The FFT of the
+ * image is only calculated once.
+ */
+struct multi_filter_struct {
+  int fft_size;
+  int image_size;
+  int n_filters;
+  int n_threads;
+  int x_size;
+  int y_size;
+
+  double max_diff;
+
+  double *fft_vector;
+  double *old_image;
+  double *old_results;
+  double **work_vector;         /* One per thread. */
+  
+  fftw_plan fft_backward;
+  fftw_plan fft_forward;
+
+  fftw_complex *fft_vector_fft;
+  fftw_complex **psf_fft;       /* One per filter. */
+  fftw_complex **work_fft;      /* One per thread. */
+};
+typedef struct multi_filter_struct multiFilter;
+
 /* Function Declarations */
 void cleanup(filter *);
+void cleanupMulti(multiFilter *);
 void convolve(filter *, double *, double *);
 void convolveMemo(filter *, double *, double *);
+void convolveMulti(multiFilter *, double *, double *);
+void convolveMultiMemo(multiFilter *, double *, double *);
 filter *initialize(double *, double, int, int, int);
+multiFilter *initializeMulti(double *, double, int, int, int, int, int);
 
 /* Functions */
 
@@ -81,6 +117,109 @@ void cleanup(filter *flt)
 }
 
 
+/*
+ * convolveMulti()
+ *
+ * Convolve image with each of the psfs.
+ *
+ * mflt - A pointer to a multiFilter structure.
+ * image - The image (must be the same size as the original psf images).
+ * results - Pre-allocated storage for the results of the convolutions,
+ *           (n_filters, x_size, y_size).
+ */
+void convolveMulti(multiFilter *mflt, double *image, double *results)
+{
+  int i,t;
+
+  /* Compute FFT of the image. */
+  ftmDoubleCopy(image, mflt->fft_vector, mflt->image_size);
+  fftw_execute(mflt->fft_forward);
+
+  /* Multiply by the FFT of each PSF and compute inverse FFT. */
+  #pragma omp parallel for private(t) num_threads(mflt->n_threads)
+  for(i=0;i<mflt->n_filters;i++){
+    t = 0;
+#ifdef _OPENMP
+    t = omp_get_thread_num();
+#endif
+    ftmComplexMultiply(mflt->work_fft[t], mflt->fft_vector_fft, mflt->psf_fft[i], mflt->fft_size, 0);
+    fftw_execute_dft_c2r(mflt->fft_backward, mflt->work_fft[t], mflt->work_vector[t]);
+    ftmDoubleCopy(mflt->work_vector[t], &results[i*mflt->image_size], mflt->image_size);
+  }
+}
+
+
+/*
+ * convolveMultiMemo()
+ *
+ * Convolve image with each of the psfs, but only if image is different
+ * enough from the previous image, otherwise just return the previous
+ * results.
+ *
+ * mflt - A pointer to a multiFilter structure.
+ * image - The image (must be the same size as the original psf images).
+ * results - Pre-allocated storage for the results of the convolutions,
+ *           (n_filters, x_size, y_size).
+ */
+void convolveMultiMemo(multiFilter *mflt, double *image, double *results)
+{
+  int i,different;
+
+  different = 0;
+  
+  /* This is written so that NaN values in old_image count as different. */
+  for(i=0;i<mflt->image_size;i++){
+    if(!(fabs(image[i] - mflt->old_image[i]) <= mflt->max_diff)){
+      different = 1;
+      break;
+    }
+  }
+
+  if (different){
+    ftmDoubleCopy(image, mflt->old_image, mflt->image_size);
+    convolveMulti(mflt, image, mflt->old_results);
+  }
+
+  ftmDoubleCopy(mflt->old_results, results, mflt->n_filters*mflt->image_size);
+}
+
+
+/*
+ * cleanupMulti()
+ *
+ * mflt - A pointer to a multiFilter structure.
+ */
+void cleanupMulti(multiFilter *mflt)
+{
+  int i;
+  
+  if (mflt->old_image != NULL){
+    free(mflt->old_image);
+    free(mflt->old_results);
+  }
+
+  fftw_destroy_plan(mflt->fft_backward);
+  fftw_destroy_plan(mflt->fft_forward);
+
+  for(i=0;i<mflt->n_filters;i++){
+    fftw_free(mflt->psf_fft[i]);
+  }
+  free(mflt->psf_fft);
+
+  for(i=0;i<mflt->n_threads;i++){
+    fftw_free(mflt->work_fft[i]);
+    fftw_free(mflt->work_vector[i]);
+  }
+  free(mflt->work_fft);
+  free(mflt->work_vector);
+  
+  fftw_free(mflt->fft_vector);
+  fftw_free(mflt->fft_vector_fft);
+
+  free(mflt);
+}
+
+
 /*
  * convolve()
  *
@@ -214,6 +353,100 @@ filter *initialize(double *psf, double max_diff, int x_size, int y_size, int est
   return flt;
 }
 
+
+/*
+ * initializeMulti()
+ *
+ * Set things up for FFT convolution with multiple psfs.
+ *
+ * psfs - the psfs (n_filters, x_size, y_size).
+ * max_diff - if this it not zero configure for memoization of results.
+ * n_filters - the number of psfs.
+ * x_size - the size of the psfs in x (slow dimension).
+ * y_size - the size of the psfs in y (fast dimension).
+ * estimate - 0/1 to just use an estimated FFT plan.
+ * n_threads - the number of threads to use for the inverse FFTs. This is
+ *             always 1 if the library was not compiled with OpenMP.
+ */
+multiFilter *initializeMulti(double *psfs, double max_diff, int n_filters, int x_size, int y_size, int estimate, int n_threads)
+{
+  int i,flags;
+  double normalization;
+  multiFilter *mflt;
+
+#ifndef _OPENMP
+  n_threads = 1;
+#endif
+  if(n_threads < 1){
+    n_threads = 1;
+  }
+  if(n_threads > n_filters){
+    n_threads = n_filters;
+  }
+
+  mflt = (multiFilter *)malloc(sizeof(multiFilter));
+
+  /* Initialize some variables. */
+  mflt->fft_size = x_size * (y_size/2 + 1);
+  mflt->image_size = x_size * y_size;
+  mflt->n_filters = n_filters;
+  mflt->n_threads = n_threads;
+  
+  mflt->x_size = x_size;
+  mflt->y_size = y_size;
+  normalization = 1.0/((double)(x_size * y_size));
+
+  /* Check whether we are memoizing. */
+  if(max_diff > 0.0){
+    mflt->max_diff = max_diff;
+    mflt->old_image = (double *)malloc(sizeof(double)*mflt->image_size);
+    mflt->old_results = (double *)malloc(sizeof(double)*n_filters*mflt->image_size);
+
+    /* NaN so that the first image is always different. */
+    for(i=0;i<mflt->image_size;i++){
+      mflt->old_image[i] = NAN;
+    }
+  }
+  else{
+    mflt->max_diff = 0.0;
+    mflt->old_image = NULL;
+    mflt->old_results = NULL;
+  }
+
+  /* Allocate storage. */
+  mflt->fft_vector = (double *)fftw_malloc(sizeof(double)*mflt->image_size);
+  mflt->fft_vector_fft = (fftw_complex *)fftw_malloc(sizeof(fftw_complex)*mflt->fft_size);
+
+  mflt->psf_fft = (fftw_complex **)malloc(sizeof(fftw_complex *)*n_filters);
+  for(i=0;i<n_filters;i++){
+    mflt->psf_fft[i] = (fftw_complex *)fftw_malloc(sizeof(fftw_complex)*mflt->fft_size);
+  }
+
+  mflt->work_fft = (fftw_complex **)malloc(sizeof(fftw_complex *)*n_threads);
+  mflt->work_vector = (double **)malloc(sizeof(double *)*n_threads);
+  for(i=0;i<n_threads;i++){
+    mflt->work_fft[i] = (fftw_complex *)fftw_malloc(sizeof(fftw_complex)*mflt->fft_size);
+    mflt->work_vector[i] = (double *)fftw_malloc(sizeof(double)*mflt->image_size);
+  }
+
+  /* Create FFT plans. */
+  flags = FFTW_MEASURE;
+  if (estimate){
+    flags = FFTW_ESTIMATE;
+  }
+  mflt->fft_forward = fftw_plan_dft_r2c_2d(x_size, y_size, mflt->fft_vector, mflt->fft_vector_fft, flags);
+  mflt->fft_backward = fftw_plan_dft_c2r_2d(x_size, y_size, mflt->work_fft[0], mflt->work_vector[0], flags);
+
+  /* Compute FFTs of the psfs and save. */
+  for(i=0;i<n_filters;i++){
+    ftmDoubleCopy(&psfs[i*mflt->image_size], mflt->fft_vector, mflt->image_size);
+    fftw_execute(mflt->fft_forward);
+    ftmComplexCopyNormalize(mflt->fft_vector_fft, mflt->psf_fft[i], normalization, mflt->fft_size);
+  }
+
+  return mflt;
+}
+
 /*
  * The MIT License
  *
@@ -10,6 +10,7 @@ import numpy
 from numpy.ctypeslib import ndpointer
 import os
 
+import storm_analysis.sa_library.fftw_wisdom as fftwWisdom
 import storm_analysis.sa_library.loadclib as loadclib
 import storm_analysis.sa_library.recenter_psf as recenterPSF
 
@@ -17,6 +18,8 @@ m_filter = loadclib.loadCLibrary("matched_filter")
 
 m_filter.cleanup.argtypes = [ctypes.c_void_p]
 
+m_filter.cleanupMulti.argtypes = [ctypes.c_void_p]
+
 m_filter.convolve.argtypes = [ctypes.c_void_p,
                               ndpointer(dtype = numpy.float64),
                               ndpointer(dtype = numpy.float64)]
@@ -25,6 +28,14 @@ m_filter.convolveMemo.argtypes = [ctypes.c_void_p,
                                   ndpointer(dtype = numpy.float64),
                                   ndpointer(dtype = numpy.float64)]
 
+m_filter.convolveMulti.argtypes = [ctypes.c_void_p,
+                                   ndpointer(dtype = numpy.float64),
+                                   ndpointer(dtype = numpy.float64)]
+
+m_filter.convolveMultiMemo.argtypes = [ctypes.c_void_p,
+                                       ndpointer(dtype = numpy.float64),
+                                       ndpointer(dtype = numpy.float64)]
+
 m_filter.initialize.argtypes = [ndpointer(dtype = numpy.float64),
                                 ctypes.c_double,
                                 ctypes.c_int,
@@ -33,6 +44,16 @@ m_filter.initialize.argtypes = [ndpointer(dtype = numpy.float64),
 
 m_filter.initialize.restype = ctypes.c_void_p
 
+m_filter.initializeMulti.argtypes = [ndpointer(dtype = numpy.float64),
+                                     ctypes.c_double,
+                                     ctypes.c_int,
+                                     ctypes.c_int,
+                                     ctypes.c_int,
+                                     ctypes.c_int,
+                                     ctypes.c_int]
+
+m_filter.initializeMulti.restype = ctypes.c_void_p
+
 
 class MatchedFilterException(Exception):
 
@@ -57,6 +78,7 @@ class MatchedFilter(object):
 
         rc_psf = recenterPSF.recenterPSF(psf)
 
+        fftwWisdom.importWisdom()
         if self.memoize:
             self.mfilter = m_filter.initialize(rc_psf,
                                                max_diff,
@@ -70,6 +92,9 @@ class MatchedFilter(object):
                                                rc_psf.shape[1],
                                                int(fftw_estimate))
 
+        if not fftw_estimate:
+            fftwWisdom.exportWisdom()
+
     def cleanup(self):
         m_filter.cleanup(self.mfilter)
         self.mfilter = None
@@ -88,6 +113,65 @@ class MatchedFilter(object):
         return result
 
 
+class MultiMatchedFilter(object):
+    """
+    Convolve the same image with several PSFs, for example the PSF
+    at different z values. This is faster than using a MatchedFilter
+    for each PSF as the FFT of the image is only calculated once.
+    """
+    def __init__(self, psfs, fftw_estimate = False, memoize = False, max_diff = 0.1, n_threads = 1):
+        """
+        psfs - A list of PSFs, these must all be the same shape.
+        n_threads - The number of threads to use for the inverse FFTs.
+        """
+        self.memoize = memoize
+        self.n_filters = len(psfs)
+
+        self.psf_shape = psfs[0].shape
+        for psf in psfs:
+            if (psf.shape[0] != self.psf_shape[0]) or (psf.shape[1] != self.psf_shape[1]):
+                raise MatchedFilterException("All PSFs must be the same shape! " + str(psf.shape) + " != " + str(self.psf_shape))
+
+        rc_psfs = numpy.zeros((self.n_filters, self.psf_shape[0], self.psf_shape[1]))
+        for i, psf in enumerate(psfs):
+            rc_psfs[i,:,:] = recenterPSF.recenterPSF(psf)
+
+        if not self.memoize:
+            max_diff = 0.0
+
+        fftwWisdom.importWisdom()
+        self.mfilter = m_filter.initializeMulti(numpy.ascontiguousarray(rc_psfs),
+                                                max_diff,
+                                                self.n_filters,
+                                                self.psf_shape[0],
+                                                self.psf_shape[1],
+                                                int(fftw_estimate),
+                                                n_threads)
+
+        if not fftw_estimate:
+            fftwWisdom.exportWisdom()
+
+    def cleanup(self):
+        m_filter.cleanupMulti(self.mfilter)
+        self.mfilter = None
+
+    def convolve(self, image):
+        """
+        Returns a (n_filters, image.shape[0], image.shape[1]) array.
+        """
+        if (image.shape[0] != self.psf_shape[0]) or (image.shape[1] != self.psf_shape[1]):
+            raise MatchedFilterException("Image shape must match psf shape! " + str(image.shape) + " != " + str(self.psf_shape))
+        
+        image = numpy.ascontiguousarray(image, dtype = numpy.float64)
+        result = numpy.zeros((self.n_filters, self.psf_shape[0], self.psf_shape[1]), dtype = numpy.float64)
+        if self.memoize:
+            m_filter.convolveMultiMemo(self.mfilter, image, result)
+        else:
+            m_filter.convolveMulti(self.mfilter, image, result)
+
+        return result
+
+        
 if (__name__ == "__main__"):
     
     import tifffile
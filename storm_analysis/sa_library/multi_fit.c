@@ -11,6 +11,10 @@
 #include <string.h>
 #include <math.h>
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
 #include "multi_fit.h"
 
 /* LAPACK Functions */
@@ -54,6 +58,7 @@ void mFitAddPeak(fitData *fit_data)
     fit_data->bg_data[k] += bg * rqe + fit_data->scmos_term[k];
     fit_data->stale[k] = 1;      
   }
+  mFitMarkDirty(fit_data, peak->xi, peak->xi + fit_data->fit_size_x, peak->yi, peak->yi + fit_data->fit_size_y);
 }
 
 /*
@@ -512,6 +517,9 @@ int mFitCheck(fitData *fit_data)
 void mFitCleanup(fitData *fit_data)
 {
   int i;
+
+  /* Free multi-threaded fitting storage. */
+  mFitCleanupMT(fit_data);
   
   /* 
    * Free individual peaks. Freeing of the fitter specialized parts
@@ -545,6 +553,53 @@ void mFitCleanup(fitData *fit_data)
 }
 
 
+/*
+ * mFitCleanupMT()
+ *
+ * Frees the multi-threaded fitting storage (if any).
+ *
+ * fit_data - pointer to a fitData structure.
+ */
+void mFitCleanupMT(fitData *fit_data)
+{
+  int i;
+  mtData *mt_data;
+
+  mt_data = fit_data->mt_data;
+  if(mt_data == NULL){
+    return;
+  }
+
+  if(mt_data->peaks != NULL){
+    fit_data->fn_free_peaks(mt_data->peaks, mt_data->max_level);
+    for(i=0;i<mt_data->max_level;i++){
+      free(mt_data->peaks[i].psf);
+    }
+    free(mt_data->peaks);
+  }
+
+  fit_data->fn_free_peaks(mt_data->working_peaks, fit_data->n_threads);
+  for(i=0;i<fit_data->n_threads;i++){
+    free(mt_data->working_peaks[i].psf);
+  }
+  free(mt_data->working_peaks);
+
+  free(mt_data->bounds);
+  free(mt_data->counters);
+  free(mt_data->escaped);
+  free(mt_data->level_map);
+  free(mt_data->levels);
+  free(mt_data->order);
+  free(mt_data->save_i);
+  free(mt_data->start);
+  free(mt_data->save_d);
+  free(mt_data->threads);
+  free(mt_data);
+
+  fit_data->mt_data = NULL;
+}
+
+
 /*
  * mFitCopyPeak()
  *
@@ -742,6 +797,78 @@ int mFitGetNError(fitData *fit_data)
 }
 
 
+/*
+ * mFitGetPeakProperties()
+ *
+ * Return several peak properties at once, this only walks through the
+ * peaks once. All the properties are returned as doubles.
+ *
+ * fit_data - Pointer to a fitData structure.
+ * values - Pre-allocated storage for the results, n_props x nfit. The
+ *          values for property j of peak i are at j*nfit + i.
+ * props - The codes of the properties to get (PROP_BACKGROUND, etc.).
+ * n_props - The number of properties.
+ */
+void mFitGetPeakProperties(fitData *fit_data, double *values, int32_t *props, int n_props)
+{
+  int i,j,k;
+  peakData *peak;
+
+  for(i=0;i<fit_data->nfit;i++){
+    peak = &fit_data->fit[i];
+    for(j=0;j<n_props;j++){
+      k = j*fit_data->nfit + i;
+      switch(props[j]){
+      case PROP_BACKGROUND:
+	values[k] = peak->params[BACKGROUND];
+	break;
+      case PROP_BG_SUM:
+	values[k] = mFitPeakBgSum(fit_data, peak);
+	break;
+      case PROP_ERROR:
+	values[k] = peak->error;
+	break;
+      case PROP_FG_SUM:
+	values[k] = mFitPeakFgSum(fit_data, peak);
+	break;
+      case PROP_HEIGHT:
+	values[k] = peak->params[HEIGHT];
+	break;
+      case PROP_ITERATIONS:
+	values[k] = (double)peak->iterations;
+	break;
+      case PROP_SIGNIFICANCE:
+	values[k] = mFitPeakFgSum(fit_data, peak)/sqrt(mFitPeakBgSum(fit_data, peak));
+	break;
+      case PROP_STATUS:
+	values[k] = (double)peak->status;
+	break;
+      case PROP_SUM:
+	values[k] = mFitPeakSum(fit_data, peak);
+	break;
+      case PROP_X:
+	values[k] = peak->params[XCENTER] + fit_data->xoff;
+	break;
+      case PROP_XSIGMA:
+	values[k] = sqrt(1.0/(2.0*peak->params[XWIDTH]));
+	break;
+      case PROP_Y:
+	values[k] = peak->params[YCENTER] + fit_data->yoff;
+	break;
+      case PROP_YSIGMA:
+	values[k] = sqrt(1.0/(2.0*peak->params[YWIDTH]));
+	break;
+      case PROP_Z:
+	values[k] = peak->params[ZCENTER] + fit_data->zoff;
+	break;
+      default:
+	printf("Unrecognized property code %d!\n", props[j]);
+      }
+    }
+  }
+}
+
+
 /*
  * mFitGetPeakPropertyDouble()
  *
@@ -1008,6 +1135,16 @@ fitData* mFitInitialize(double *rqe, double *scmos_calibration, double tol, int
   fit_data->fn_error_fn = mFitCalcErr;
   fit_data->fn_free_peaks = NULL;
   fit_data->fn_update = NULL;
+
+  /* The default is single-threaded fitting. */
+  fit_data->n_threads = 1;
+  fit_data->mt_data = NULL;
+
+  /* The whole fit image is initially dirty. */
+  fit_data->dirty_x_min = 0;
+  fit_data->dirty_x_max = im_size_x;
+  fit_data->dirty_y_min = 0;
+  fit_data->dirty_y_max = im_size_y;
   
   return fit_data;
 }
@@ -1071,7 +1208,55 @@ void mFitInitializeROIIndexing(fitData *fit_data, int roi_size)
  */
 void mFitIterateLM(fitData *fit_data)
 {
-  int i,j,k,l,m;
+  int i;
+
+  if(VERBOSE){
+    printf("mFILM\n");
+  }
+
+  if(fit_data->n_threads > 1){
+    mFitIterateLMThreaded(fit_data);
+  }
+  else{
+    for(i=0;i<fit_data->nfit;i++){
+
+      if(VERBOSE){
+	printf("\nmFILM peak - %d\n", i);
+      }
+
+      /* Skip ahead if this peak is not RUNNING. */
+      if(fit_data->fit[i].status != RUNNING){
+	continue;
+      }
+
+      mFitIterateLMPeak(fit_data, i, NULL);
+
+      /* Copy updated working peak back into current peak. */
+      fit_data->fn_copy_peak(fit_data, fit_data->working_peak, &fit_data->fit[i]);
+    }
+  }
+
+  /* Recenter peaks as necessary. */
+  mFitRecenterPeaks(fit_data);
+}
+
+
+/*
+ * mFitIterateLMPeak
+ *
+ * Perform a single iteration of fitting update for a single peak. The
+ * updated peak is left in fit_data->working_peak.
+ *
+ * fit_data - Pointer to a fitData structure.
+ * index - The index of the peak in fit_data->fit.
+ * bounds - The peak ROI must stay inside these bounds [x0, x1, y0, y1], 
+ *          use NULL for no bounds.
+ *
+ * Returns 1 if the peak tried to move outside of it's bounds, 0 otherwise.
+ */
+int mFitIterateLMPeak(fitData *fit_data, int index, int *bounds)
+{
+  int j,k,l,m;
   int info;
   int n_add;
 
@@ -1082,270 +1267,627 @@ void mFitIterateLM(fitData *fit_data)
   double hessian[NFITTING*NFITTING];   /* 'A' matrix */
   double w_hessian[NFITTING*NFITTING]; /* Working copy of the 'A' matrix. */
 
-  if(VERBOSE){
-    printf("mFILM\n");
-  }
+  /* 
+   * This is for debugging, to make sure that we not adding more times than
+   * we are subtracting. 
+   */
+  n_add = 1;
 
-  for(i=0;i<fit_data->nfit;i++){
+  /* Copy current peak into working peak. */
+  fit_data->fn_copy_peak(fit_data, &fit_data->fit[index], fit_data->working_peak);
+
+  /* 
+   * Calculate initial error.
+   *
+   * Why? This might have changed from the previous cycle because the peak
+   * background value could be shifted by neighboring peaks, creating a 
+   * situation where it is impossible to improve on the old error value.
+   */
+  /* 
+   * FIXME: We're ignoring the return value here and just assuming that
+   *        the error function will work. Maybe okay because when we 
+   *        calculate the updated error we check the return value? Not
+   *        sure what would be the correct thing to do anyway.
+   */
+  fit_data->fn_error_fn(fit_data);
+  starting_error = fit_data->working_peak->error;
+
+  /* Calculate 'b' vector and 'A' matrix. This is expected to use 'working_peak'. */
+  /* 
+   * The names 'jacobian' and 'hessian' come from the Newton method.
+   *
+   * https://en.wikipedia.org/wiki/Newton%27s_method_in_optimization
+   *
+   * Given the error model we calculate the first derivatives of the error model with 
+   * respect to the fitting parameters, this is the b vector. We also calculate an 
+   * approximation of the matrix of second derivatives of the error model with respect 
+   * to the fitting parameters, this the A matrix. Then we solve for the update vector 
+   * by solving Ax = b using Cholesky decomposition. In the LM approach the diagonal 
+   * of the A matrix is scaled by the lambda parameter.
+   */
+  fit_data->fn_calc_JH(fit_data, jacobian, hessian);
+  
+  /* Subtract working peak out of image. */
+  mFitSubtractPeak(fit_data);
+  n_add--;
+
+  j = 0;
+  while(1){
+    j++;
 
     if(VERBOSE){
-      printf("\nmFILM peak - %d\n", i);
+      printf("  cycle %d %d\n", j, n_add);
+    }
+
+    /* Check if we are stuck on this peak, error it out if we are. */
+    if(fit_data->working_peak->lambda > LAMBDAMAX){
+      fit_data->n_lost++;
+      fit_data->working_peak->status = ERROR;
+      break;
+    }
+	
+    /* Update peak iterations counter. */
+    fit_data->working_peak->iterations++;
+    
+    /* Update total fitting iterations counter. */
+    fit_data->n_iterations++;
+
+    /*
+     * Reset status flag. We only started this loop if the peak was RUNNING.
+     * However the status might have been changed to error due to a Cholesky
+     * solver issue or invalid peak parameters in a previous iteration of
+     * this loop.
+     */
+    fit_data->working_peak->status = RUNNING;
+
+    /* Copy Jacobian and Hessian. */
+    for(k=0;k<fit_data->jac_size;k++){
+      w_jacobian[k] = jacobian[k];
+      m = k*fit_data->jac_size;
+      for(l=0;l<fit_data->jac_size;l++){
+	if (k == l){
+	  w_hessian[m+l] = (1.0 + fit_data->working_peak->lambda) * hessian[m+l];
+	}
+	else{
+	  w_hessian[m+l] = hessian[m+l];
+	}
+      }
     }
     
     /* 
-     * This is for debugging, to make sure that we not adding more times than
-     * we are subtracting. 
+     * Solve for update. Note that this also changes w_jacobian
+     * which is one of the reasons why we made a copy.
      */
-    n_add = 1;
-
-    /* Skip ahead if this peak is not RUNNING. */
-    if(fit_data->fit[i].status != RUNNING){
+    info = mFitSolve(w_hessian, w_jacobian, fit_data->jac_size);
+  
+    if(info!=0){
+      if(VERBOSE){
+	printf(" mFitSolve() failed %d\n", info);
+      }
+      fit_data->n_dposv++;
+      fit_data->working_peak->status = ERROR;
+	
+      /* If the solver failed, try again with a larger lambda. */
+      fit_data->working_peak->lambda = fit_data->working_peak->lambda * LAMBDAUP;
       continue;
     }
+    
+    /* Update 'working_peak'. mFitSolve returns the update in w_jacobian. */
+    fit_data->fn_update(fit_data, w_jacobian);
 
-    /* Copy current peak into working peak. */
-    fit_data->fn_copy_peak(fit_data, &fit_data->fit[i], fit_data->working_peak);
-
-    /* 
-     * Calculate initial error.
-     *
-     * Why? This might have changed from the previous cycle because the peak
-     * background value could be shifted by neighboring peaks, creating a 
-     * situation where it is impossible to improve on the old error value.
-     */
     /* 
-     * FIXME: We're ignoring the return value here and just assuming that
-     *        the error function will work. Maybe okay because when we 
-     *        calculate the updated error we check the return value? Not
-     *        sure what would be the correct thing to do anyway.
+     * Check that it is still in the image, etc.. The fn_check function
+     * should return 0 if everything is okay.
      */
-    fit_data->fn_error_fn(fit_data);
-    starting_error = fit_data->working_peak->error;
+    if(fit_data->fn_check(fit_data)){
+      if(VERBOSE){
+	printf(" fn_check() failed\n");
+      }
+      /* 
+       * Try again with a larger lambda. We need to reset the 
+       * peak state because fn_update() changed it.
+       */
+      mFitResetPeak(fit_data, index);
 
-    /* Calculate 'b' vector and 'A' matrix. This is expected to use 'working_peak'. */
+      /* Set status to ERROR in case this is the last iteration. */
+      fit_data->working_peak->status = ERROR;
+	
+      continue;	
+    }
+    
     /* 
-     * The names 'jacobian' and 'hessian' come from the Newton method.
-     *
-     * https://en.wikipedia.org/wiki/Newton%27s_method_in_optimization
-     *
-     * Given the error model we calculate the first derivatives of the error model with 
-     * respect to the fitting parameters, this is the b vector. We also calculate an 
-     * approximation of the matrix of second derivatives of the error model with respect 
-     * to the fitting parameters, this the A matrix. Then we solve for the update vector 
-     * by solving Ax = b using Cholesky decomposition. In the LM approach the diagonal 
-     * of the A matrix is scaled by the lambda parameter.
+     * Check that the peak is still inside it's bounds. This is only
+     * relevant for multi-threaded fitting.
      */
-    fit_data->fn_calc_JH(fit_data, jacobian, hessian);
-    
-    /* Subtract working peak out of image. */
-    mFitSubtractPeak(fit_data);
-    n_add--;
+    if(bounds != NULL){
+      if((fit_data->working_peak->xi < bounds[0])||((fit_data->working_peak->xi + fit_data->fit_size_x) > bounds[1])||
+	 (fit_data->working_peak->yi < bounds[2])||((fit_data->working_peak->yi + fit_data->fit_size_y) > bounds[3])){
+	return 1;
+      }
+    }
 
-    j = 0;
-    while(1){
-      j++;
+    /* Add peak 'working_peak' back to fit image. */
+    fit_data->fn_calc_peak_shape(fit_data);
+    mFitAddPeak(fit_data);
+    n_add++;
 
+    /* 
+     * Calculate error for 'working_peak' with the new parameters. This
+     * will also check if the fit has converged. It will return 0 if
+     * everything is okay (the fit image has no negative values).
+     */
+    if(fit_data->fn_error_fn(fit_data)){
       if(VERBOSE){
-	printf("  cycle %d %d\n", j, n_add);
+	printf(" Error calculation failed\n");
       }
+      /* Subtract 'working_peak' from the fit image. */
+      mFitSubtractPeak(fit_data);
+      n_add--;
+	 
+      /* 
+       * Try again with a larger lambda. We need to reset the peak 
+       * state because fn_update() and fn_add_peak() changed it.
+       */
+      mFitResetPeak(fit_data, index);
 
-      /* Check if we are stuck on this peak, error it out if we are. */
-      if(fit_data->working_peak->lambda > LAMBDAMAX){
-	fit_data->n_lost++;
-	fit_data->working_peak->status = ERROR;
-	break;
-      }
+      /* Set status to ERROR in case this is the last iteration. */
+      fit_data->working_peak->status = ERROR;
 	
-      /* Update peak iterations counter. */
-      fit_data->working_peak->iterations++;
-      
-      /* Update total fitting iterations counter. */
-      fit_data->n_iterations++;
+      continue;	
+    }
+    
+    /* Check whether the error improved. */
+    if(fit_data->working_peak->error > starting_error){
+      if(VERBOSE){
+	printf("    increasing error %.6e %.6e %.6e\n", fit_data->working_peak->error, starting_error, fit_data->working_peak->lambda);
+      }
 
-      /*
-       * Reset status flag. We only started this loop if the peak was RUNNING.
-       * However the status might have been changed to error due to a Cholesky
-       * solver issue or invalid peak parameters in a previous iteration of
-       * this loop.
+      /* 
+       * Check for error convergence. 
+       *
+       * Usually this will happen because the lambda term has gotten so 
+       * large that the peak will barely move in the update.
+       *
+       * FIXME: Why is this CONVERGED and not say ERROR?
        */
-      fit_data->working_peak->status = RUNNING;
-
-      /* Copy Jacobian and Hessian. */
-      for(k=0;k<fit_data->jac_size;k++){
-	w_jacobian[k] = jacobian[k];
-	m = k*fit_data->jac_size;
-	for(l=0;l<fit_data->jac_size;l++){
-	  if (k == l){
-	    w_hessian[m+l] = (1.0 + fit_data->working_peak->lambda) * hessian[m+l];
-	  }
-	  else{
-	    w_hessian[m+l] = hessian[m+l];
-	  }
+      if(DELTA_CONVERGENCE){
+	if (mFitDeltaConvergence(fit_data, index)){
+	  fit_data->working_peak->status = CONVERGED;
+	  break;
 	}
       }
-      
-      /* 
-       * Solve for update. Note that this also changes w_jacobian
-       * which is one of the reasons why we made a copy.
-       */
-      info = mFitSolve(w_hessian, w_jacobian, fit_data->jac_size);
-    
-      if(info!=0){
-	if(VERBOSE){
-	  printf(" mFitSolve() failed %d\n", info);
+      else{
+	if (((fit_data->working_peak->error - starting_error)/starting_error) < fit_data->tolerance){
+	  fit_data->working_peak->status = CONVERGED;
+	  break;
 	}
-	fit_data->n_dposv++;
-	fit_data->working_peak->status = ERROR;
-	
-	/* If the solver failed, try again with a larger lambda. */
-        fit_data->working_peak->lambda = fit_data->working_peak->lambda * LAMBDAUP;
-	continue;
       }
-      
-      /* Update 'working_peak'. mFitSolve returns the update in w_jacobian. */
-      fit_data->fn_update(fit_data, w_jacobian);
 
+      fit_data->n_non_decr++;
+	
+      /* Subtract 'working_peak' from the fit image. */
+      mFitSubtractPeak(fit_data);
+      n_add--;
+	
       /* 
-       * Check that it is still in the image, etc.. The fn_check function
-       * should return 0 if everything is okay.
+       * Try again with a larger lambda. We need to reset the 
+       * peak state because fn_update() changed it.
        */
-      if(fit_data->fn_check(fit_data)){
-	if(VERBOSE){
-	  printf(" fn_check() failed\n");
-	}
-	/* 
-	 * Try again with a larger lambda. We need to reset the 
-	 * peak state because fn_update() changed it.
-	 */
-	mFitResetPeak(fit_data, i);
-
-	/* Set status to ERROR in case this is the last iteration. */
-	fit_data->working_peak->status = ERROR;
+      mFitResetPeak(fit_data, index);
+    }
+    else{
 	
-	continue;	
+      if(VERBOSE){
+	printf("    decreasing error %.6e %.6e %.6e\n", fit_data->working_peak->error, starting_error, fit_data->working_peak->lambda);
       }
-      
-      /* Add peak 'working_peak' back to fit image. */
-      fit_data->fn_calc_peak_shape(fit_data);
-      mFitAddPeak(fit_data);
-      n_add++;
 
-      /* 
-       * Calculate error for 'working_peak' with the new parameters. This
-       * will also check if the fit has converged. It will return 0 if
-       * everything is okay (the fit image has no negative values).
-       */
-      if(fit_data->fn_error_fn(fit_data)){
-	if(VERBOSE){
-	  printf(" Error calculation failed\n");
+      /* Check for error convergence. */
+      if(DELTA_CONVERGENCE){
+	if (mFitDeltaConvergence(fit_data, index)){
+	  fit_data->working_peak->status = CONVERGED;
+	  break;
+	}	  
+      }
+      else{
+	if (((starting_error - fit_data->working_peak->error)/starting_error) < fit_data->tolerance){
+	  fit_data->working_peak->status = CONVERGED;
+	  break;
 	}
-	/* Subtract 'working_peak' from the fit image. */
-	mFitSubtractPeak(fit_data);
-	n_add--;
-	 
-	/* 
-	 * Try again with a larger lambda. We need to reset the peak 
-	 * state because fn_update() and fn_add_peak() changed it.
-	 */
-	mFitResetPeak(fit_data, i);
-
-	/* Set status to ERROR in case this is the last iteration. */
-	fit_data->working_peak->status = ERROR;
+      }
 	
-	continue;	
+      /* Decrease lambda. */
+      if(fit_data->working_peak->lambda > LAMBDAMIN){
+	fit_data->working_peak->lambda = LAMBDADOWN * fit_data->working_peak->lambda;
       }
-      
-      /* Check whether the error improved. */
-      if(fit_data->working_peak->error > starting_error){
-	if(VERBOSE){
-	  printf("    increasing error %.6e %.6e %.6e\n", fit_data->working_peak->error, starting_error, fit_data->working_peak->lambda);
-	}
 
-	/* 
-	 * Check for error convergence. 
-	 *
-	 * Usually this will happen because the lambda term has gotten so 
-	 * large that the peak will barely move in the update.
-	 *
-	 * FIXME: Why is this CONVERGED and not say ERROR?
-	 */
-	if(DELTA_CONVERGENCE){
-	  if (mFitDeltaConvergence(fit_data, i)){
-	    fit_data->working_peak->status = CONVERGED;
-	    break;
-	  }
-	}
-	else{
-	  if (((fit_data->working_peak->error - starting_error)/starting_error) < fit_data->tolerance){
-	    fit_data->working_peak->status = CONVERGED;
-	    break;
-	  }
-	}
+      /* Update successful, so exit while loop. */
+      break;
+    }
+  }
 
-	fit_data->n_non_decr++;
-	
-	/* Subtract 'working_peak' from the fit image. */
-	mFitSubtractPeak(fit_data);
-	n_add--;
-	
-	/* 
-	 * Try again with a larger lambda. We need to reset the 
-	 * peak state because fn_update() changed it.
-	 */
-	mFitResetPeak(fit_data, i);
+  /* We expect n_add to be 1 if there were no errors, 0 otherwise. */
+  if(TESTING){
+    if(fit_data->working_peak->status == ERROR){
+      if(n_add != 0){
+	printf("Problem detected in peak addition / subtraction logic, status == ERROR, counts = %d\n", n_add);
+	exit(EXIT_FAILURE);
       }
-      else{
-	
-	if(VERBOSE){
-	  printf("    decreasing error %.6e %.6e %.6e\n", fit_data->working_peak->error, starting_error, fit_data->working_peak->lambda);
-	}
+    }
+    else{
+      if(n_add != 1){
+	printf("Problem detected in peak addition / subtraction logic, status != ERROR, counts = %d\n", n_add);
+	exit(EXIT_FAILURE);
+      }
+    }
+  }
+  
+  return 0;
+}
 
-	/* Check for error convergence. */
-	if(DELTA_CONVERGENCE){
-	  if (mFitDeltaConvergence(fit_data, i)){
-	    fit_data->working_peak->status = CONVERGED;
-	    break;
-	  }	  
-	}
-	else{
-	  if (((starting_error - fit_data->working_peak->error)/starting_error) < fit_data->tolerance){
-	    fit_data->working_peak->status = CONVERGED;
-	    break;
-	  }
+
+/*
+ * mFitIterateLMThreaded
+ *
+ * Multi-threaded version of mFitIterateLM(). The results are identical
+ * to those of the single-threaded version.
+ *
+ * In the single-threaded version the peaks are updated one at a time in
+ * index order, and peaks whose ROIs overlap affect each other through the
+ * foreground and background arrays. Here the running peaks are assigned
+ * to levels so that the peaks in a level don't overlap each other, and a
+ * peak is always in a higher level than the lower index peaks that it
+ * overlaps. The levels are then fit in order, with the peaks in each level
+ * fit in parallel.
+ *
+ * Overlap is tested using the peak ROI expanded by MTMARGIN pixels, as the
+ * peak ROI can move during fitting. If a peak moves further than this, the
+ * state of the pixels of this peak, and of the higher index peaks in the
+ * same level, is restored and the remaining peaks are fit one at a time.
+ *
+ * fit_data - Pointer to a fitData structure.
+ */
+void mFitIterateLMThreaded(fitData *fit_data)
+{
+  int i,j,k,l,m,n,x,y;
+  int first_escaped,level,max_level,n_alloc,n_levels,n_running;
+  int *bounds;
+  mtData *mt_data;
+  peakData *peak;
+
+  mt_data = fit_data->mt_data;
+
+  /* Check if we need more storage for the running peaks. */
+  if(mt_data->max_running < fit_data->max_nfit){
+    n_alloc = fit_data->max_nfit;
+    
+    free(mt_data->bounds);
+    free(mt_data->levels);
+    free(mt_data->order);
+    free(mt_data->start);
+
+    mt_data->bounds = (int *)malloc(sizeof(int)*4*n_alloc);
+    mt_data->levels = (int *)malloc(sizeof(int)*n_alloc);
+    mt_data->order = (int *)malloc(sizeof(int)*n_alloc);
+    mt_data->start = (int *)malloc(sizeof(int)*(n_alloc+1));
+    mt_data->max_running = n_alloc;
+  }
+
+  /*
+   * Assign the running peaks to levels. level_map is the level + 1 of
+   * the highest level peak covering each pixel.
+   */
+  n_levels = 0;
+  n_running = 0;
+  for(i=0;i<fit_data->nfit;i++){
+    mt_data->levels[i] = -1;
+    peak = &fit_data->fit[i];
+    if(peak->status != RUNNING){
+      continue;
+    }
+    n_running++;
+
+    bounds = &mt_data->bounds[4*i];
+    bounds[0] = (peak->xi > MTMARGIN) ? (peak->xi - MTMARGIN) : 0;
+    bounds[1] = peak->xi + fit_data->fit_size_x + MTMARGIN;
+    if(bounds[1] > fit_data->image_size_x){
+      bounds[1] = fit_data->image_size_x;
+    }
+    bounds[2] = (peak->yi > MTMARGIN) ? (peak->yi - MTMARGIN) : 0;
+    bounds[3] = peak->yi + fit_data->fit_size_y + MTMARGIN;
+    if(bounds[3] > fit_data->image_size_y){
+      bounds[3] = fit_data->image_size_y;
+    }
+    
+    level = 0;
+    for(y=bounds[2];y<bounds[3];y++){
+      for(x=bounds[0];x<bounds[1];x++){
+	if(mt_data->level_map[y*fit_data->image_size_x+x] > level){
+	  level = mt_data->level_map[y*fit_data->image_size_x+x];
 	}
-	
-	/* Decrease lambda. */
-	if(fit_data->working_peak->lambda > LAMBDAMIN){
-	  fit_data->working_peak->lambda = LAMBDADOWN * fit_data->working_peak->lambda;
+      }
+    }
+    for(y=bounds[2];y<bounds[3];y++){
+      for(x=bounds[0];x<bounds[1];x++){
+	mt_data->level_map[y*fit_data->image_size_x+x] = level + 1;
+      }
+    }
+    mt_data->levels[i] = level;
+    if(level >= n_levels){
+      n_levels = level + 1;
+    }
+  }
+
+  if(n_running == 0){
+    return;
+  }
+  
+  /* Reset level_map. */
+  for(i=0;i<fit_data->nfit;i++){
+    if(mt_data->levels[i] >= 0){
+      bounds = &mt_data->bounds[4*i];
+      for(y=bounds[2];y<bounds[3];y++){
+	for(x=bounds[0];x<bounds[1];x++){
+	  mt_data->level_map[y*fit_data->image_size_x+x] = 0;
 	}
+      }
+    }
+  }
+
+  /* Sort the running peaks by level, then by index. */
+  for(l=0;l<=n_levels;l++){
+    mt_data->start[l] = 0;
+  }
+  for(i=0;i<fit_data->nfit;i++){
+    if(mt_data->levels[i] >= 0){
+      mt_data->start[mt_data->levels[i]+1]++;
+    }
+  }
+  max_level = 0;
+  for(l=0;l<n_levels;l++){
+    if(mt_data->start[l+1] > max_level){
+      max_level = mt_data->start[l+1];
+    }
+    mt_data->start[l+1] += mt_data->start[l];
+  }
+  for(i=0;i<fit_data->nfit;i++){
+    if(mt_data->levels[i] >= 0){
+      mt_data->order[mt_data->start[mt_data->levels[i]]] = i;
+      mt_data->start[mt_data->levels[i]]++;
+    }
+  }
+  for(l=n_levels;l>0;l--){
+    mt_data->start[l] = mt_data->start[l-1];
+  }
+  mt_data->start[0] = 0;
+  
+  /* Check if we need more storage for the peaks in a level. */
+  if(mt_data->max_level < max_level){
+    n_alloc = INCNPEAKS*(max_level/INCNPEAKS + 1);
+
+    if(mt_data->peaks != NULL){
+      fit_data->fn_free_peaks(mt_data->peaks, mt_data->max_level);
+      for(i=0;i<mt_data->max_level;i++){
+	free(mt_data->peaks[i].psf);
+      }
+      free(mt_data->peaks);
+    }
+    free(mt_data->counters);
+    free(mt_data->escaped);
+    free(mt_data->save_i);
+    free(mt_data->save_d);
+
+    mt_data->peaks = (peakData *)malloc(sizeof(peakData)*n_alloc);
+    for(i=0;i<n_alloc;i++){
+      mt_data->peaks[i].psf = NULL;
+    }
+    fit_data->fn_alloc_peaks(mt_data->peaks, n_alloc);
+
+    mt_data->counters = (int *)malloc(sizeof(int)*MTNCOUNTERS*n_alloc);
+    mt_data->escaped = (int *)malloc(sizeof(int)*n_alloc);
+    mt_data->save_i = (int *)malloc(sizeof(int)*2*mt_data->save_size*n_alloc);
+    mt_data->save_d = (double *)malloc(sizeof(double)*4*mt_data->save_size*n_alloc);
+    mt_data->max_level = n_alloc;
+  }
+
+  /* Update the copies of fit_data for each thread. */
+  for(i=0;i<fit_data->n_threads;i++){
+    mt_data->threads[i] = *fit_data;
+    mt_data->threads[i].working_peak = &mt_data->working_peaks[i];
+  }
+
+  /* Fit the peaks, one level at a time. */
+  for(l=0;l<n_levels;l++){
+    n = mt_data->start[l+1] - mt_data->start[l];
+
+    #pragma omp parallel for private(j,k,m) schedule(dynamic) num_threads(fit_data->n_threads)
+    for(j=0;j<n;j++){
+      int *counters;
+      fitData *thread_data;
+
+      m = 0;
+#ifdef _OPENMP
+      m = omp_get_thread_num();
+#endif
+      thread_data = &mt_data->threads[m];
+      counters = &mt_data->counters[j*MTNCOUNTERS];
+      k = mt_data->order[mt_data->start[l]+j];
+
+      mFitMTSaveState(fit_data, &mt_data->bounds[4*k], j);
+      
+      thread_data->n_dposv = 0;
+      thread_data->n_iterations = 0;
+      thread_data->n_lost = 0;
+      thread_data->n_margin = 0;
+      thread_data->n_neg_fi = 0;
+      thread_data->n_neg_height = 0;
+      thread_data->n_non_converged = 0;
+      thread_data->n_non_decr = 0;
+
+      mt_data->escaped[j] = mFitIterateLMPeak(thread_data, k, &mt_data->bounds[4*k]);
+      if(!mt_data->escaped[j]){
+	thread_data->fn_copy_peak(thread_data, thread_data->working_peak, &mt_data->peaks[j]);
+      }
+      
+      counters[0] = thread_data->n_dposv;
+      counters[1] = thread_data->n_iterations;
+      counters[2] = thread_data->n_lost;
+      counters[3] = thread_data->n_margin;
+      counters[4] = thread_data->n_neg_fi;
+      counters[5] = thread_data->n_neg_height;
+      counters[6] = thread_data->n_non_converged;
+      counters[7] = thread_data->n_non_decr;
+    }
 
-	/* Update successful, so exit while loop. */
+    first_escaped = n;
+    for(j=0;j<n;j++){
+      if(mt_data->escaped[j]){
+	first_escaped = j;
 	break;
       }
     }
 
-    /* We expect n_add to be 1 if there were no errors, 0 otherwise. */
-    if(TESTING){
-      if(fit_data->working_peak->status == ERROR){
-	if(n_add != 0){
-	  printf("Problem detected in peak addition / subtraction logic, status == ERROR, counts = %d\n", n_add);
-	  exit(EXIT_FAILURE);
-	}
+    /* Update the peaks and the counters. */
+    for(j=0;j<first_escaped;j++){
+      k = mt_data->order[mt_data->start[l]+j];
+      fit_data->fn_copy_peak(fit_data, &mt_data->peaks[j], &fit_data->fit[k]);
+      mt_data->levels[k] = -1;
+      
+      fit_data->n_dposv += mt_data->counters[j*MTNCOUNTERS];
+      fit_data->n_iterations += mt_data->counters[j*MTNCOUNTERS+1];
+      fit_data->n_lost += mt_data->counters[j*MTNCOUNTERS+2];
+      fit_data->n_margin += mt_data->counters[j*MTNCOUNTERS+3];
+      fit_data->n_neg_fi += mt_data->counters[j*MTNCOUNTERS+4];
+      fit_data->n_neg_height += mt_data->counters[j*MTNCOUNTERS+5];
+      fit_data->n_non_converged += mt_data->counters[j*MTNCOUNTERS+6];
+      fit_data->n_non_decr += mt_data->counters[j*MTNCOUNTERS+7];
+    }
+
+    /* 
+     * A peak moved outside of it's bounds. Undo this peak and all the 
+     * higher index peaks in this level, then fit all of the remaining
+     * peaks one at a time in index order.
+     */
+    if(first_escaped < n){
+      if(VERBOSE){
+	printf("mFILMT peak %d moved out of bounds.\n", mt_data->order[mt_data->start[l]+first_escaped]);
       }
-      else{
-	if(n_add != 1){
-	  printf("Problem detected in peak addition / subtraction logic, status != ERROR, counts = %d\n", n_add);
-	  exit(EXIT_FAILURE);
+      for(j=first_escaped;j<n;j++){
+	k = mt_data->order[mt_data->start[l]+j];
+	mFitMTRestoreState(fit_data, &mt_data->bounds[4*k], j);
+      }
+
+      for(i=0;i<fit_data->nfit;i++){
+	if(mt_data->levels[i] >= 0){
+	  mFitIterateLMPeak(fit_data, i, NULL);
+	  fit_data->fn_copy_peak(fit_data, fit_data->working_peak, &fit_data->fit[i]);
 	}
       }
+      break;
     }
-    
-    /* Copy updated working peak back into current peak. */
-    fit_data->fn_copy_peak(fit_data, fit_data->working_peak, &fit_data->fit[i]);
   }
+  /* Update the dirty region with the changes made by each thread. */
+  for(i=0;i<fit_data->n_threads;i++){
+    mFitMarkDirty(fit_data,
+		  mt_data->threads[i].dirty_x_min,
+		  mt_data->threads[i].dirty_x_max,
+		  mt_data->threads[i].dirty_y_min,
+		  mt_data->threads[i].dirty_y_max);
+  }
+}
 
-  /* Recenter peaks as necessary. */
-  mFitRecenterPeaks(fit_data);
+
+/*
+ * mFitMTRestoreState
+ *
+ * Restore the state of the pixels inside bounds that was saved by mFitMTSaveState().
+ *
+ * fit_data - Pointer to a fitData structure.
+ * bounds - The bounds [x0, x1, y0, y1] of a peak.
+ * slot - The storage slot that was used by mFitMTSaveState().
+ */
+void mFitMTRestoreState(fitData *fit_data, int *bounds, int slot)
+{
+  int i,j,k,n;
+  int *save_i;
+  double *save_d;
+
+  n = fit_data->mt_data->save_size;
+  save_i = &fit_data->mt_data->save_i[2*n*slot];
+  save_d = &fit_data->mt_data->save_d[4*n*slot];
+
+  i = 0;
+  for(j=bounds[2];j<bounds[3];j++){
+    for(k=bounds[0];k<bounds[1];k++){
+      fit_data->bg_counts[j*fit_data->image_size_x+k] = save_i[i];
+      fit_data->stale[j*fit_data->image_size_x+k] = save_i[n+i];
+      fit_data->bg_data[j*fit_data->image_size_x+k] = save_d[i];
+      fit_data->err_i[j*fit_data->image_size_x+k] = save_d[n+i];
+      fit_data->f_data[j*fit_data->image_size_x+k] = save_d[2*n+i];
+      fit_data->t_fi[j*fit_data->image_size_x+k] = save_d[3*n+i];
+      i++;
+    }
+  }
+}
+
+
+/*
+ * mFitMTSaveState
+ *
+ * Save the state of the pixels inside bounds, so that we can undo the 
+ * fitting of a peak in mFitIterateLMThreaded().
+ *
+ * fit_data - Pointer to a fitData structure.
+ * bounds - The bounds [x0, x1, y0, y1] of a peak.
+ * slot - The storage slot to use.
+ */
+void mFitMTSaveState(fitData *fit_data, int *bounds, int slot)
+{
+  int i,j,k,n;
+  int *save_i;
+  double *save_d;
+
+  n = fit_data->mt_data->save_size;
+  save_i = &fit_data->mt_data->save_i[2*n*slot];
+  save_d = &fit_data->mt_data->save_d[4*n*slot];
+
+  i = 0;
+  for(j=bounds[2];j<bounds[3];j++){
+    for(k=bounds[0];k<bounds[1];k++){
+      save_i[i] = fit_data->bg_counts[j*fit_data->image_size_x+k];
+      save_i[n+i] = fit_data->stale[j*fit_data->image_size_x+k];
+      save_d[i] = fit_data->bg_data[j*fit_data->image_size_x+k];
+      save_d[n+i] = fit_data->err_i[j*fit_data->image_size_x+k];
+      save_d[2*n+i] = fit_data->f_data[j*fit_data->image_size_x+k];
+      save_d[3*n+i] = fit_data->t_fi[j*fit_data->image_size_x+k];
+      i++;
+    }
+  }
+}
+
+
+/*
+ * mFitMarkDirty
+ *
+ * Add a rectangle to the region of the fit image that has changed.
+ *
+ * fit_data - Pointer to a fitData structure.
+ * x_min, x_max - The x range of the rectangle, x_min <= x < x_max.
+ * y_min, y_max - The y range of the rectangle, y_min <= y < y_max.
+ */
+void mFitMarkDirty(fitData *fit_data, int x_min, int x_max, int y_min, int y_max)
+{
+  if(x_min < fit_data->dirty_x_min){
+    fit_data->dirty_x_min = x_min;
+  }
+  if(x_max > fit_data->dirty_x_max){
+    fit_data->dirty_x_max = x_max;
+  }
+  if(y_min < fit_data->dirty_y_min){
+    fit_data->dirty_y_min = y_min;
+  }
+  if(y_max > fit_data->dirty_y_max){
+    fit_data->dirty_y_max = y_max;
+  }
 }
 
 
@@ -1403,6 +1945,7 @@ void mFitNewImage(fitData *fit_data, double *new_image)
     fit_data->f_data[i] = 0.0;
     fit_data->stale[i] = 1;
   }
+  mFitMarkDirty(fit_data, 0, fit_data->image_size_x, 0, fit_data->image_size_y);
 
   fit_data->nfit = 0;
 }
@@ -1798,6 +2341,65 @@ void mFitResetPeak(fitData *fit_data, int index)
 }
 
 
+/*
+ * mFitSetNThreads()
+ *
+ * Set the number of threads to use in mFitIterateLM(). This must be called
+ * after the fitter has been initialized. It is only safe to use more than one
+ * thread for fitters that don't modify fit_data->fit_model during fitting
+ * (3D-DAOSTORM and sCMOS).
+ *
+ * If the library was not compiled with OpenMP this is always 1.
+ *
+ * fit_data - Pointer to a fitData structure.
+ * n_threads - The number of threads to use.
+ */
+void mFitSetNThreads(fitData *fit_data, int n_threads)
+{
+  int i;
+  mtData *mt_data;
+
+#ifndef _OPENMP
+  n_threads = 1;
+#endif
+  
+  mFitCleanupMT(fit_data);
+
+  if(n_threads < 2){
+    fit_data->n_threads = 1;
+    return;
+  }
+
+  fit_data->n_threads = n_threads;
+  
+  mt_data = (mtData *)malloc(sizeof(mtData));
+  mt_data->max_level = 0;
+  mt_data->max_running = 0;
+  mt_data->save_size = (fit_data->fit_size_x + 2*MTMARGIN)*(fit_data->fit_size_y + 2*MTMARGIN);
+
+  mt_data->bounds = NULL;
+  mt_data->counters = NULL;
+  mt_data->escaped = NULL;
+  mt_data->level_map = (int *)calloc(fit_data->image_size_x*fit_data->image_size_y, sizeof(int));
+  mt_data->levels = NULL;
+  mt_data->order = NULL;
+  mt_data->save_i = NULL;
+  mt_data->start = NULL;
+  mt_data->save_d = NULL;
+
+  mt_data->peaks = NULL;
+  mt_data->threads = (fitData *)malloc(sizeof(fitData)*n_threads);
+
+  mt_data->working_peaks = (peakData *)malloc(sizeof(peakData)*n_threads);
+  for(i=0;i<n_threads;i++){
+    mt_data->working_peaks[i].psf = NULL;
+  }
+  fit_data->fn_alloc_peaks(mt_data->working_peaks, n_threads);
+
+  fit_data->mt_data = mt_data;
+}
+
+
 /*
  * mFitSetPeakStatus()
  *
@@ -1919,6 +2521,7 @@ void mFitSubtractPeak(fitData *fit_data)
     fit_data->bg_data[k] -= (bg * rqe + fit_data->scmos_term[k]);
     fit_data->stale[k] = 1;
   }
+  mFitMarkDirty(fit_data, peak->xi, peak->xi + fit_data->fit_size_x, peak->yi, peak->yi + fit_data->fit_size_y);
 }
 
 
@@ -1946,6 +2549,51 @@ void mFitUpdate(peakData *peak)
 }
 
 
+/*
+ * mFitUpdateFitImage()
+ *
+ * Update the parts of fit_image that have changed since the last call
+ * to this function. This is a faster alternative to mFitGetFitImage()
+ * when only a few peaks have changed.
+ *
+ * fit_data - Pointer to a fitData structure.
+ * fit_image - The fit image from the previous call to this function (or
+ *             mFitGetFitImage()).
+ * bounds - Storage for the region that was updated, [x_min, x_max, y_min, y_max].
+ *
+ * Returns 1 if anything was updated, 0 otherwise.
+ */
+int mFitUpdateFitImage(fitData *fit_data, double *fit_image, int32_t *bounds)
+{
+  int i,j,k;
+
+  /* Clip to the image. */
+  bounds[0] = (fit_data->dirty_x_min > 0) ? fit_data->dirty_x_min : 0;
+  bounds[1] = (fit_data->dirty_x_max < fit_data->image_size_x) ? fit_data->dirty_x_max : fit_data->image_size_x;
+  bounds[2] = (fit_data->dirty_y_min > 0) ? fit_data->dirty_y_min : 0;
+  bounds[3] = (fit_data->dirty_y_max < fit_data->image_size_y) ? fit_data->dirty_y_max : fit_data->image_size_y;
+
+  /* Reset dirty region. */
+  fit_data->dirty_x_min = fit_data->image_size_x;
+  fit_data->dirty_x_max = 0;
+  fit_data->dirty_y_min = fit_data->image_size_y;
+  fit_data->dirty_y_max = 0;
+
+  if((bounds[0] >= bounds[1])||(bounds[2] >= bounds[3])){
+    return 0;
+  }
+
+  for(i=bounds[2];i<bounds[3];i++){
+    for(j=bounds[0];j<bounds[1];j++){
+      k = i*fit_data->image_size_x + j;
+      fit_image[k] = fit_data->f_data[k] / fit_data->rqe[k];
+    }
+  }
+
+  return 1;
+}
+
+
 /*
  * mFitUpdateParam
  *
@@ -29,6 +29,22 @@
 #define STATUS 7        /* Status flag, see below */
 #define IERROR 8        /* Error in the fit (integrated over the AOI) */
 
+/* peak property codes for mFitGetPeakProperties(). */
+#define PROP_BACKGROUND 0
+#define PROP_BG_SUM 1
+#define PROP_ERROR 2
+#define PROP_FG_SUM 3
+#define PROP_HEIGHT 4
+#define PROP_ITERATIONS 5
+#define PROP_SIGNIFICANCE 6
+#define PROP_STATUS 7
+#define PROP_SUM 8
+#define PROP_X 9
+#define PROP_XSIGMA 10
+#define PROP_Y 11
+#define PROP_YSIGMA 12
+#define PROP_Z 13
+
 /* peak status flags */
 #define RUNNING 0
 #define CONVERGED 1
@@ -48,6 +64,11 @@
 /* peak storage. */
 #define INCNPEAKS 500       /* Storage grows in units of 500 peaks. */
 
+/* multi-threaded fitting. */
+#define MTMARGIN 2          /* Peaks can move this many pixels in a fitting iteration before
+                               they conflict with peaks that are being fit by other threads. */
+#define MTNCOUNTERS 8       /* The number of fitData diagnostic counters. */
+
 /* convergence metric */
 #define DELTA_CONVERGENCE 0 /* The default is check for fitting error convergence. Set this
                                to 1 for convergence based on peak fit deltas. */
@@ -74,6 +95,32 @@ typedef struct peakData
 } peakData;
 
 
+/*
+ * Storage for multi-threaded fitting, see mFitIterateLMThreaded().
+ */
+typedef struct mtData
+{
+  int max_level;                /* The (current) maximum number of peaks in a level that we have storage for. */
+  int max_running;              /* The (current) maximum number of running peaks that we have storage for. */
+  int save_size;                /* The number of pixels in the bounds of a peak. */
+  
+  int *bounds;                  /* The bounds [x0, x1, y0, y1] of each running peak. */
+  int *counters;                /* The diagnostic counters of each peak in the current level. */
+  int *escaped;                 /* Flag for peaks in the current level that moved outside of their bounds. */
+  int *level_map;               /* Used for assigning peaks to levels, one element per image pixel. */
+  int *levels;                  /* The level of each running peak. */
+  int *order;                   /* Running peaks, sorted by level and then peak index. */
+  int *save_i;                  /* Saved (integer) state of the pixels in the bounds of each peak in the current level. */
+  int *start;                   /* The start of each level in order. */
+
+  double *save_d;               /* Saved (double) state of the pixels in the bounds of each peak in the current level. */
+
+  struct peakData *peaks;       /* Fitting results for each peak in the current level. */
+  struct fitData *threads;      /* A copy of fitData for each thread. */
+  struct peakData *working_peaks; /* The working peak of each thread. */
+} mtData;
+
+
 /*
  * This structure contains everything necessary to fit an array of peaks on an image.
  */
@@ -139,6 +186,14 @@ typedef struct fitData
   int (*fn_error_fn)(struct fitData *);                       /* Function for calculating the fitting error. */
   void (*fn_free_peaks)(struct peakData *, int);              /* Function for freeing storage for peaks. */
   void (*fn_update)(struct fitData *, double *);              /* Function for updating the working peak parameters. */
+
+  int n_threads;                /* Number of threads to use in mFitIterateLM(). */
+  mtData *mt_data;              /* Storage for multi-threaded fitting. */
+
+  int dirty_x_min;              /* The region of f_data that has changed since the last call */
+  int dirty_x_max;              /* to mFitUpdateFitImage(), x_min <= x < x_max and */
+  int dirty_y_min;              /* y_min <= y < y_max. */
+  int dirty_y_max;
   
 } fitData;
 
@@ -159,6 +214,7 @@ int mFitCalcErrDWLS(fitData *);
 int mFitCalcErrFWLS(fitData *);
 int mFitCheck(fitData *);
 void mFitCleanup(fitData *);
+void mFitCleanupMT(fitData *);
 void mFitCopyPeak(fitData *, peakData *, peakData *);
 int mFitDeltaConvergence(fitData *, int);
 void mFitEstimatePeakBackground(fitData *);
@@ -166,6 +222,7 @@ void mFitEstimatePeakHeight(fitData *);
 void mFitGetFitImage(fitData *, double *);
 int mFitGetNError(fitData *);
 void mFitGetPeakPropertyDouble(fitData *, double *, char *);
+void mFitGetPeakProperties(fitData *, double *, int32_t *, int);
 void mFitGetPeakPropertyInt(fitData *, int32_t *, char *);
 void mFitGetResidual(fitData *, double *);
 int mFitGetUnconverged(fitData *);
@@ -173,6 +230,11 @@ fitData *mFitInitialize(double *, double *, double, int, int);
 void mFitInitializeROIIndexing(fitData *, int);
 void mFitIterateOriginal(fitData *);
 void mFitIterateLM(fitData *);
+int mFitIterateLMPeak(fitData *, int, int *);
+void mFitIterateLMThreaded(fitData *);
+void mFitMTRestoreState(fitData *, int *, int);
+void mFitMTSaveState(fitData *, int *, int);
+void mFitMarkDirty(fitData *, int, int, int, int);
 void mFitNewBackground(fitData *, double *);
 void mFitNewImage(fitData *, double *);
 void mFitNewPeaks(fitData *, int);
@@ -183,10 +245,12 @@ double mFitPeakSum(fitData *, peakData *);
 void mFitRecenterPeaks(fitData *);
 void mFitRemoveErrorPeaks(fitData *);
 void mFitResetPeak(fitData *, int);
+void mFitSetNThreads(fitData *, int);
 void mFitSetPeakStatus(fitData *, int32_t *);
 int mFitSolve(double *, double *, int);
 void mFitSubtractPeak(fitData *);
 void mFitUpdate(peakData *);
+int mFitUpdateFitImage(fitData *, double *, int32_t *);
 void mFitUpdateParam(peakData *, double, int);
 
 #endif
@@ -245,10 +245,65 @@ class ParametersCommon(Parameters):
             ##
             # Analysis parameters.
             ##
+            "aoi_crop" : ["int", None,
+                          """If this is set, and set to a number greater than or equal to 0, then the frames
+                          are cropped when they are loaded to the bounding box of the analysis AOI plus this
+                          number of pixels. The localizations are still in the coordinates of the full frame.
+                          This makes the analysis of a small AOI of a large camera much faster. The number
+                          of pixels should be large enough to include the neighbors of the peaks at the edge
+                          of the AOI. This is not used by multi-plane analysis."""],
+
             "aoi_radius" : ["int", None,
                             """Radius in pixels for a circular analysis AOI.
                             'x_center' and 'y_center' are also required."""],
 
+            "follow" : ["int", None,
+                        """If this is set to 1 then the movie is analyzed while it is still being acquired.
+                        The analysis waits for new frames until the .inf file is written, or until there
+                        have been no new frames for 'follow_timeout' seconds. The localizations are saved
+                        whenever the analysis catches up with the acquisition. This is only possible for
+                        .dax movies, and not for multi-plane analysis."""],
+
+            "follow_bigendian" : ["int", None,
+                                  """Set this to 1 if a movie that is still being acquired is big endian. This
+                                  is only used if the movie does not have an .inf file yet. The default is 0
+                                  (little endian)."""],
+
+            "follow_frame_size" : ["int-array", None,
+                                   """The [x, y] size of the frames of a movie that is still being acquired,
+                                   this is only required if the movie does not have an .inf file yet."""],
+
+            "follow_timeout" : ["float", None,
+                                """How long to wait (in seconds) for new frames of a movie that is still
+                                being acquired. The default is 60 seconds."""],
+            
+            "hdf5_chunk_size" : ["int", None,
+                                 """The HDF5 chunk size of the localization datasets. The default is the HDF5
+                                 default for the 'frames' layout and 10000 for the 'columnar' layout."""],
+
+            "hdf5_compression" : ["string", None,
+                                  """How to compress the localization datasets in the HDF5 file, 'none' (the
+                                  default), 'gzip' or 'lzf'. 'lzf' is faster, but the file can only be read
+                                  with h5py."""],
+
+            "hdf5_compression_level" : ["int", None,
+                                        """The 'gzip' compression level of the localization datasets, 0 - 9. The
+                                        default is 4."""],
+            
+            "hdf5_layout" : ["string", None,
+                             """How to store the localizations in the HDF5 file, either 'frames' (the default),
+                             one group per frame, or 'columnar', one dataset per localization property for
+                             all of the frames. 'columnar' is faster for movies with lots of frames."""],
+
+            "hdf5_shuffle" : ["int", None,
+                              """Use the HDF5 shuffle filter with compression, this usually makes the localization
+                              file smaller. The default is 0 (no)."""],
+
+            "hdf5_single_precision" : ["string", None,
+                                       """A comma separated list of the localization properties to store as 32 bit
+                                       floats, for example 'background,height,sum'. The default is to store
+                                       all floating point properties as 64 bit floats."""],
+
             "max_frame" : ["int", None,
                            "The frame to stop analysis on, -1 = analyze to the end of the film."],
             
@@ -261,6 +316,12 @@ class ParametersCommon(Parameters):
             "pixel_size" : ["float", None,
                             "CCD pixel size (in nm)."],
             
+            "prefetch_frames" : ["int", None,
+                                 """If this is set, and set to a number greater than 0, then up to this number
+                                 of frames (and their background estimates) will be loaded in a background
+                                 thread ahead of the analysis. This can help when reading the movie is slow,
+                                 for example if it is on network storage."""],
+
             "start_frame" : ["int", None,
                              "The frame to start analysis on, -1 = start at the beginning of the film."],
 
@@ -316,6 +377,11 @@ class ParametersCommon(Parameters):
                         this value (in pixels) in adjacent frames (ignoring activation frames) are assumed
                         to come from the same emitter and are averaged together to create a (hopefully) 
                         more accurately localized emitter. If this is zero then no matching will be done."""],
+
+            "skip_descriptors" : ["string", None,
+                                  """Frames whose descriptor (see 'descriptor') is in this string are not
+                                  analyzed, they are saved with no localizations. For example '0' will skip
+                                  the activation frames."""],
             
             ##
             # Drift correction parameters.
@@ -423,6 +489,11 @@ class ParametersFitters(ParametersCommon):
                                can help speed the analysis of short movies that are very large in XY. 0 = (default) 
                                FFTW will measure the best FFT plan. 1 = FFTW will estimate the best FFT plan."""],
 
+            "filter_threads" : ["int", None,
+                                """The number of threads to use when convolving the image with the PSF at
+                                each z value during peak finding (Spliner, Pupil function and PSF FFT).
+                                The default is 1."""],
+
             "fit_error_model" : ["string", "MLE",
                                  """Specify which fitting error model to use.
 
@@ -435,9 +506,21 @@ class ParametersFitters(ParametersCommon):
             "find_max_radius" : [("int", "float"), None,
                                  "To be a peak it must be the maximum value within this radius (in pixels)."],
 
+            "frame_stats" : ["int", None,
+                             """If this is non-zero then the time spent in each stage of the analysis of
+                             each frame, the number of fitting iterations and the fitting failure counters
+                             are saved in the 'frame_stats' group of the HDF5 file. This is useful for
+                             finding slow frames and slow stages of the analysis."""],
+
             "iterations" : ["int", None,
                             "Maximum number of iterations for new peak finding."],
 
+            "n_processes" : ["int", None,
+                             """The number of processes to use for peak finding and fitting. If this is set
+                             to a number greater than 1 then each process will analyze a different frame of
+                             the movie, and the results are saved in frame order. The default is to analyze
+                             the movie in a single process."""],
+
             "no_fitting" : ["int", None,
                             """If this is non-zero then we won't do any fitting iterations. This is useful for
                             testing the finder, as well as how accurately we're initializing the peak
@@ -495,6 +578,11 @@ class ParametersDAOsCMOS(ParametersFitters):
             "do_zfit" : ["int", None,
                          """Do z fitting (or not), only relevant for "3d" fitting (see "model" parameter)."""],
 
+            "fit_threads" : ["int", None,
+                             """The number of threads to use for peak fitting. The default is 1. This
+                             has no effect if the C library was not compiled with OpenMP support. The
+                             results are the same for any number of threads."""],
+
             "foreground_sigma" : ["float", None,
                                   """Foreground filter sigma, this is the sigma of a 2D gaussian to convolve the data with
                                   prior to peak identification. When your data has a low SNR this can help for peak
@@ -523,6 +611,17 @@ class ParametersDAOsCMOS(ParametersFitters):
                              allow when fitting for the peak width. If this is not specified the default
                              is [0.5 * sigma, 5.0 * sigma]."""],
 
+            "tile_overlap" : ["int", None,
+                              """The number of pixels of the surrounding image that are analyzed together
+                              with each tile. The default is twice the fitting margin."""],
+
+            "tile_size" : ["int", None,
+                           """Analyze the images as a grid of tiles of (at most) this size in pixels. This
+                           is useful for very large images. The default is 0 (no tiles)."""],
+
+            "tile_threads" : ["int", None,
+                              """The number of threads to use for analyzing the tiles. The default is 1."""],
+
             "wx_wo" : ["float", None, ww_doc_string],
             "wx_c" : ["float", None, ww_doc_string],
             "wx_d" : ["float", None, ww_doc_string],
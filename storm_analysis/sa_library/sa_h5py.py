@@ -15,11 +15,73 @@ import storm_analysis.sa_library.grid_c as gridC
 # This is the maximum size of a dataset in a group of tracks.
 track_block_size = 10000
 
+# This is the chunk size of the localization datasets in 'columnar' files.
+columnar_chunk_size = 10000
+
+# The number of frames that localizationsIterator() loads at once from
+# 'columnar' files.
+columnar_iterator_frames = 1000
+
+# The names of the datasets in the frame index of 'columnar' files.
+frame_index_fields = ["frame_number", "offset", "n_locs", "dx", "dy", "dz"]
+
+# The default storage options of the localization, track and cluster
+# datasets. See SAH5Py.
+storage_defaults = {"chunk_size" : 0,
+                    "compression" : "none",
+                    "compression_level" : 4,
+                    "shuffle" : False,
+                    "single_precision" : ""}
+
 
 class SAH5PyException(Exception):
     pass
 
 
+def compactFile(filename):
+    """
+    Copy the localizations that a file created by linkFiles() links to
+    into the file itself. After this the input files of linkFiles() are
+    no longer needed.
+    """
+    with SAH5Reader(filename) as h5:
+        layout = "columnar" if h5.isColumnar() else "frames"
+
+    tmp_name = filename + ".tmp"
+    convertLayout(filename, tmp_name, layout)
+    os.replace(tmp_name, filename)
+    
+def convertLayout(input_name, output_name, layout):
+    """
+    Convert a HDF5 file from one localization layout to another, 'frames'
+    or 'columnar'. Everything other than the localizations (metadata, tracks,
+    clusters, etc.) is copied as is.
+    """
+    with SAH5Reader(input_name) as h5_in:
+        with SAH5Py(output_name,
+                    is_existing = False,
+                    overwrite = True,
+                    layout = layout,
+                    storage = h5_in.getStorage()) as h5_out:
+            for attr in h5_in.hdf5.attrs:
+                if (attr != 'layout'):
+                    h5_out.hdf5.attrs[attr] = h5_in.hdf5.attrs[attr]
+
+            for name in h5_in.hdf5:
+                if not h5_in.isLocalizationsObject(name):
+                    h5_in.hdf5.copy(name, h5_out.hdf5)
+
+            for fnum in h5_in.getAnalyzedFrames():
+                locs = h5_in.getLocalizationsInFrame(fnum)
+
+                # Frames that were analyzed but have no localizations.
+                if not bool(locs):
+                    locs = {"x" : numpy.zeros(0)}
+                h5_out.addLocalizations(locs, fnum)
+                
+                [dx, dy, dz] = h5_in.getDriftCorrection(fnum)
+                h5_out.setDriftCorrection(fnum, dx = dx, dy = dy, dz = dz)
+    
 def isSAHDF5(filename):
     """
     Queries if 'filename' is a storm-analysis HDF5 file.
@@ -41,6 +103,124 @@ def isSAHDF5(filename):
 
     return False
 
+def linkFiles(input_names, output_name, sa_type = None):
+    """
+    Merge files that have the localizations of different frames of the same
+    movie into a single file, without copying the localizations. In 'frames'
+    layout files each frame is an external link to the frame in the input
+    file. In 'columnar' layout files each localization dataset is a virtual
+    dataset that maps to the datasets in the input files, only the (small)
+    frame index is copied. This is much faster than copying the localizations.
+
+    The input files must all have the same layout, and they must be in frame
+    order. Tracks and frame statistics are not merged. The metadata, movie
+    information and pixel size (if available) are taken from the first file,
+    as is the file type if sa_type is not specified.
+
+    The links use the path of each input file relative to the output file,
+    so the input files must stay in the same place relative to the output
+    file. Changes to the localizations, by tracking for example, are made in
+    the input files. Use compactFile() to copy the localizations into the
+    output file.
+    """
+    out_dir = os.path.dirname(os.path.abspath(output_name))
+    rel_names = [os.path.relpath(os.path.abspath(name), out_dir) for name in input_names]
+
+    with SAH5Reader(input_names[0]) as h5_in:
+        columnar = h5_in.isColumnar()
+        movie_info = h5_in.getMovieInformation()
+        storage = h5_in.getStorage()
+        if sa_type is None:
+            sa_type = h5_in.getFileType()
+
+    layout = "columnar" if columnar else "frames"
+    with SAH5Py(output_name,
+                is_existing = False,
+                overwrite = True,
+                sa_type = sa_type,
+                layout = layout,
+                storage = storage) as h5_out:
+        h5_out.setMovieInformation(*movie_info)
+        with SAH5Reader(input_names[0]) as h5_in:
+            if 'pixel_size' in h5_in.hdf5.attrs:
+                h5_out.setPixelSize(h5_in.getPixelSize())
+            if "metadata.xml" in h5_in.hdf5:
+                h5_in.hdf5.copy("metadata.xml", h5_out.hdf5)
+
+        finished = True
+        n_channels = 1
+        index = {field : [] for field in frame_index_fields}
+        sources = []
+        n_rows = 0
+        for i, input_name in enumerate(input_names):
+            with SAH5Reader(input_name) as h5_in:
+                if (h5_in.isColumnar() != columnar):
+                    raise SAH5PyException("All the files must have the same layout.")
+                finished = finished and h5_in.isAnalysisFinished()
+                n_channels = max(n_channels, h5_in.getNChannels())
+
+                # Record the datasets to map and the frame index.
+                if columnar:
+                    index_grp = h5_in.hdf5["frame_index"]
+                    for field in frame_index_fields:
+                        values = index_grp[field][()]
+                        if (field == "offset"):
+                            values = values + n_rows
+                        index[field].append(values)
+                    dtypes = {}
+                    for field in h5_in.hdf5["locs"]:
+                        dtypes[field] = h5_in.hdf5["locs"][field].dtype
+                    sources.append([rel_names[i], n_rows, h5_in.n_rows, dtypes])
+                    n_rows += h5_in.n_rows
+
+                # Link to each frame.
+                else:
+                    for fnum in h5_in.getAnalyzedFrames():
+                        grp_name = h5_in.getGroupName(fnum)
+                        if grp_name in h5_out.hdf5:
+                            raise SAH5PyException("Frame " + str(fnum) + " is in more than one file.")
+                        h5_out.hdf5[grp_name] = h5py.ExternalLink(rel_names[i], grp_name)
+
+        if columnar:
+            
+            # Frame index.
+            index_grp = h5_out.hdf5["frame_index"]
+            for field in frame_index_fields:
+                values = numpy.concatenate(index[field])
+                index_grp[field].resize((values.size,))
+                index_grp[field][:] = values
+            if numpy.any(numpy.diff(index_grp["frame_number"][()]) <= 0):
+                raise SAH5PyException("The files must be in frame order, and the frames must not overlap.")
+
+            # Localizations. Fields that are missing from some of the files
+            # are copied (and are 0 for the missing localizations) as it is
+            # not possible to write to the unmapped parts of a virtual dataset.
+            fields = {}
+            for source in sources:
+                fields.update(source[3])
+
+            locs_grp = h5_out.hdf5["locs"]
+            for field in sorted(fields):
+                if all(map(lambda x: (x[2] == 0) or (field in x[3]), sources)):
+                    v_layout = h5py.VirtualLayout(shape = (n_rows,), dtype = fields[field])
+                    for [rel_name, start, size, dtypes] in sources:
+                        if (size > 0):
+                            v_layout[start:(start + size)] = h5py.VirtualSource(rel_name,
+                                                                                "locs/" + field,
+                                                                                shape = (size,))
+                    locs_grp.create_virtual_dataset(field, v_layout, fillvalue = 0)
+                else:
+                    dset = h5_out.createColumnarDataset(field, n_rows, fields[field])
+                    for i, [rel_name, start, size, dtypes] in enumerate(sources):
+                        if (size > 0) and (field in dtypes):
+                            with SAH5Reader(input_names[i]) as h5_in:
+                                dset[start:(start + size)] = h5_in.hdf5["locs"][field][:size]
+
+            h5_out.loadFrameIndex()
+
+        h5_out.hdf5.attrs['n_channels'] = n_channels
+        h5_out.setAnalysisFinished(finished)
+
 def loadLocalizations(filename, fields = None):
     """
     This is convenience function for loading all the localizations in a
@@ -87,8 +267,21 @@ class SAH5Py(object):
     6. Metadata (XML string) is required.
     7. Movie width, height, length are required.
 
-    The internal structure is one group per frame analyzed, with
-    each localization property saved as a separate dataset.
+    There are two different ways of storing the localizations, this is
+    choosen when the file is created with the 'layout' keyword argument:
+
+    'frames' - The default, one group per frame analyzed, with each
+               localization property saved as a separate dataset.
+
+    'columnar' - One resizable dataset per localization property in the
+                 'locs' group, with the localizations from all the frames
+                 one after the other. The 'frame_index' group records the
+                 frame number, the offset into the 'locs' datasets, the
+                 number of localizations and the drift correction of each
+                 frame analyzed. This is much faster for files with lots
+                 of frames.
+
+    Reading works the same way for both layouts.
 
     Localizations that have been tracked and averaged together are
     stored as tracks in groups with a maximum dataset size of 
@@ -97,11 +290,38 @@ class SAH5Py(object):
     The metadata is stored in the 'metadata.xml' root dataset as a 
     variable length unicode string.
 
+    How the localization, track and cluster datasets are stored is
+    choosen when the file is created with the 'storage' keyword argument,
+    a dictionary with some or all of these options (see storage_defaults).
+    The options are recorded in the 'storage_*' attributes of the file
+    so that they also apply to datasets that are added later.
+
+    'chunk_size' - The HDF5 chunk size, 0 is the HDF5 default (or
+                   columnar_chunk_size for 'columnar' files).
+
+    'compression' - 'none', 'gzip' or 'lzf'. 'lzf' is fast but only
+                    available in h5py, 'gzip' files can be read by
+                    any HDF5 library.
+
+    'compression_level' - The 'gzip' compression level, 0 - 9.
+
+    'shuffle' - Use the HDF5 shuffle filter, this usually improves
+                the compression of floating point values.
+
+    'single_precision' - A comma separated list of the (floating point)
+                         fields to store as 32 bit floats, for example
+                         "background,height,sum". Other channels must
+                         be listed separately, "c1_x" for example.
+
     The 'sa_type' attribute records what generated this file, one
     of the SMLM analysis programs for example, or another program
     that for example was used to merge one or more of these files.
     """
-    def __init__(self, filename = None, is_existing = True, overwrite = False, sa_type = 'unknown', **kwds):
+    def __init__(self, filename = None, is_existing = True, overwrite = False, sa_type = 'unknown', layout = 'frames', storage = None, **kwds):
+        """
+        layout - How to store the localizations in a new file, 'frames' or 'columnar'.
+        storage - The storage options of a new file, the default is storage_defaults.
+        """
         super(SAH5Py, self).__init__(**kwds)
 
         self.last_write_time = time.time()
@@ -116,6 +336,13 @@ class SAH5Py(object):
                 raise SAH5PyException("file '" + filename + "' not found.")
 
         else:
+            if storage is not None:
+                for key in storage:
+                    if not key in storage_defaults:
+                        raise SAH5PyException("Unknown storage option '" + str(key) + "'.")
+                if not (storage.get("compression", "none") in ["gzip", "lzf", "none"]):
+                    raise SAH5PyException("Unknown compression '" + str(storage["compression"]) + "'.")
+                
             if os.path.exists(filename):
                 if overwrite:
                     os.remove(filename)
@@ -127,6 +354,30 @@ class SAH5Py(object):
             self.hdf5.attrs['sa_type'] = sa_type
             self.hdf5.attrs['version'] = 0.1
             self.existing = False
+
+            if storage is not None:
+                for key in storage:
+                    self.hdf5.attrs['storage_' + key] = storage[key]
+
+            if (layout == 'columnar'):
+                self.hdf5.attrs['layout'] = layout
+                self.hdf5.create_group("locs")
+                index_grp = self.hdf5.create_group("frame_index")
+                for field in frame_index_fields:
+                    if field in ["dx", "dy", "dz"]:
+                        dtype = numpy.float64
+                    else:
+                        dtype = numpy.int64
+                    index_grp.create_dataset(field,
+                                             (0,),
+                                             dtype = dtype,
+                                             maxshape = (None,),
+                                             chunks = (columnar_chunk_size,))
+            elif (layout != 'frames'):
+                raise SAH5PyException("Unknown layout '" + str(layout) + "'.")
+
+        self.storage = self.getStorage()
+        self.loadFrameIndex()
             
     def __enter__(self):
         return self
@@ -145,19 +396,49 @@ class SAH5Py(object):
         Add/set the category field of each localization.
         """
         assert isinstance(category, int)
-        grp = self.getGroup(frame_number)
-        cat = category * numpy.ones(grp.attrs['n_locs'], dtype = numpy.int32)
+        cat = category * numpy.ones(self.getNLocalizationsInFrame(frame_number), dtype = numpy.int32)
         self.addLocalizationData(cat, frame_number, "category")
 
+    def addFrameStats(self, frame_stats):
+        """
+        Append per-frame analysis statistics to the 'frame_stats' group.
+        frame_stats is a dictionary of numpy arrays, one dataset per key
+        with one element per frame. This should include a 'frame' array
+        with the frame numbers.
+        """
+        if not "frame_stats" in self.hdf5:
+            self.hdf5.create_group("frame_stats")
+        stats_grp = self.hdf5["frame_stats"]
+
+        n_old = 0
+        if "frame" in stats_grp:
+            n_old = stats_grp["frame"].size
+        n_new = frame_stats["frame"].size
+
+        for field in frame_stats:
+            if not field in stats_grp:
+                stats_grp.create_dataset(field,
+                                         (n_old,),
+                                         dtype = frame_stats[field].dtype,
+                                         maxshape = (None,))
+            stats_grp[field].resize((n_old + n_new,))
+            stats_grp[field][n_old:] = frame_stats[field]
+
     def addLocalizationData(self, np_data, frame_number, field_name):
         """
         Add/set localization data in an existing group.
         """
+        if self.isColumnar():
+            [start, stop] = self.getFrameRange(frame_number)
+            assert(np_data.size == (stop - start))
+            self.getColumnarDataset(field_name, np_data.dtype)[start:stop] = np_data
+            return
+        
         grp = self.getGroup(frame_number)
         assert(np_data.size == grp.attrs['n_locs'])
         
         if not field_name in grp:
-            grp.create_dataset(field_name, data = np_data)
+            self.createDataset(grp, field_name, np_data)
         else:
             grp[field_name][()] = np_data
             
@@ -174,7 +455,60 @@ class SAH5Py(object):
 
             if (channel >= self.hdf5.attrs['n_channels']):
                 self.hdf5.attrs['n_channels'] = channel + 1
+
+        if self.isColumnar():
+            self.addLocalizationsColumnar(localizations, frame_number, channel)
+        else:
+            self.addLocalizationsFrames(localizations, frame_number, channel)
+
+        # Flush the file once a minute.
+        #
+        # FIXME: Not sure if this a bad idea, as for example this might
+        #        already be handled in some way by HDF5.
+        # 
+        if (time.time() > (self.last_write_time + 60.0)):
+            self.flush()
+
+    def addLocalizationsColumnar(self, localizations, frame_number, channel):
+        """
+        addLocalizations() for the 'columnar' layout.
+
+        The localizations are kept in memory and written in blocks, resizing
+        the datasets for every frame is slow.
+        """
+        if (channel is None) or (channel == 0):
+            if frame_number in self.frame_rows:
+                raise SAH5PyException("Frame " + str(frame_number) + " already exists.")
+
+            # Add the frame to the index.
+            n_locs = localizations["x"].size
+            self.frame_rows[frame_number] = len(self.frame_index)
+            self.frame_index.append([frame_number, self.n_rows, n_locs])
+            self.frame_index_arrays = None
+            self.n_rows += n_locs
+            self.total_added += n_locs
+
+            # Copy as the caller may re-use the arrays.
+            self.pending.append([frame_number, {key : numpy.array(localizations[key]) for key in localizations}])
             
+        # Other channels of a frame that has not been written yet.
+        elif (len(self.pending) > 0) and (self.pending[-1][0] == frame_number):
+            for key in localizations:
+                self.pending[-1][1][self.getChannelPrefix(channel) + key] = numpy.array(localizations[key])
+
+        else:
+            [start, stop] = self.getFrameRange(frame_number)
+            for key in localizations:
+                dset = self.getColumnarDataset(self.getChannelPrefix(channel) + key, localizations[key].dtype)
+                dset[start:(start + localizations[key].size)] = localizations[key]
+
+        if (len(self.pending) >= columnar_iterator_frames) or ((self.n_rows - self.n_written) >= columnar_chunk_size):
+            self.writePending()
+
+    def addLocalizationsFrames(self, localizations, frame_number, channel):
+        """
+        addLocalizations() for the 'frames' layout.
+        """
         grp_name = self.getGroupName(frame_number)
         if (channel is None) or (channel == 0):
             grp = self.hdf5.create_group(grp_name)
@@ -201,17 +535,7 @@ class SAH5Py(object):
             d_name = key
             if (channel is not None) and (channel > 0):
                 d_name = self.getChannelPrefix(channel) + key
-            grp.create_dataset(d_name, data = localizations[key])
-
-        # Flush the file once a minute.
-        #
-        # FIXME: Not sure if this a bad idea, as for example this might
-        #        already be handled in some way by HDF5.
-        # 
-        current_time = time.time()
-        if (current_time > (self.last_write_time + 60.0)):
-            self.last_write_time = current_time
-            self.hdf5.flush()
+            self.createDataset(grp, d_name, localizations[key])
             
     def addMetadata(self, metadata):
         """
@@ -266,7 +590,7 @@ class SAH5Py(object):
 
         # Add the tracks.
         for field in tracks:
-            grp.create_dataset(field, data = tracks[field])
+            self.createDataset(grp, field, tracks[field])
         grp.attrs['n_tracks'] = tracks["x"].size
 
         self.n_track_groups += 1
@@ -282,7 +606,7 @@ class SAH5Py(object):
         assert(np_data.size == grp.attrs['n_tracks'])
 
         if not field_name in grp:
-            grp.create_dataset(field_name, data = np_data)
+            self.createDataset(grp, field_name, np_data)
         else:
             grp[field_name][()] = np_data
         
@@ -293,12 +617,89 @@ class SAH5Py(object):
         self.addLocalizationData(z_vals, frame_number, "z")
 
     def close(self, verbose = False):
+        if self.isColumnar():
+            self.writePending()
         if verbose:
             print("Added", self.total_added)
         self.hdf5.close()
 
+    def createColumnarDataset(self, field_name, size, dtype):
+        """
+        Create the resizable 'locs' dataset 'field_name' of a 'columnar' file.
+        """
+        chunk_size = self.storage["chunk_size"]
+        if (chunk_size <= 0):
+            chunk_size = columnar_chunk_size
+        return self.hdf5["locs"].create_dataset(field_name,
+                                                (size,),
+                                                dtype = self.getStorageDtype(field_name, dtype),
+                                                maxshape = (None,),
+                                                chunks = (chunk_size,),
+                                                **self.getStorageFilters())
+
+    def createDataset(self, grp, name, data):
+        """
+        Create a (fixed size) localization, track or cluster dataset
+        in grp using the storage options of this file.
+        """
+        data = numpy.asarray(data)
+        data = data.astype(self.getStorageDtype(name, data.dtype), copy = False)
+
+        # Empty datasets can't be chunked.
+        if (data.size == 0):
+            return grp.create_dataset(name, data = data)
+
+        chunks = None
+        if (self.storage["chunk_size"] > 0) and (data.ndim == 1):
+            chunks = (min(self.storage["chunk_size"], data.size),)
+        return grp.create_dataset(name, data = data, chunks = chunks, **self.getStorageFilters())
+        
+    def flush(self):
+        """
+        Write everything to the HDF5 file, so that other programs can read
+        the localizations that have been added so far.
+        """
+        self.last_write_time = time.time()
+        if self.isColumnar():
+            self.writePending()
+        self.hdf5.flush()
+        
+    def getAnalyzedFrames(self):
+        """
+        Return a sorted list of the frames that have been analyzed.
+        """
+        if self.isColumnar():
+            return sorted(self.frame_rows.keys())
+        else:
+            return sorted(map(lambda x: int(x[3:]), filter(lambda x: x.startswith("fr_"), self.hdf5)))
+        
     def getChannelPrefix(self, channel_number):
         return "c" + str(channel_number) + "_"
+
+    def getColumnarData(self, start, stop, fields):
+        """
+        Return localizations start to stop from the 'locs' datasets of a
+        'columnar' file.
+        """
+        self.writePending()
+        datasets = {}
+        locs_grp = self.hdf5["locs"]
+        if fields is None:
+            fields = list(locs_grp)
+        for field in fields:
+            datasets[field] = locs_grp[field][start:stop]
+        return datasets
+
+    def getColumnarDataset(self, field_name, dtype):
+        """
+        Return the 'locs' dataset 'field_name' of a 'columnar' file, creating
+        it if necessary.
+        """
+        self.writePending()
+        locs_grp = self.hdf5["locs"]
+        if not field_name in locs_grp:
+            self.createColumnarDataset(field_name, self.n_rows, dtype)
+        return locs_grp[field_name]
         
     def getDatasets(self, group, fields):
         datasets = {}
@@ -316,6 +717,15 @@ class SAH5Py(object):
         return datasets
         
     def getDriftCorrection(self, frame_number):
+        if self.isColumnar():
+            if frame_number in self.frame_rows:
+                self.writePending()
+                row = self.frame_rows[frame_number]
+                index_grp = self.hdf5["frame_index"]
+                return [index_grp["dx"][row], index_grp["dy"][row], index_grp["dz"][row]]
+            else:
+                raise SAH5PyException("getDriftCorrection(), no such frame " + str(frame_number))
+            
         grp = self.getGroup(frame_number)
         if grp is not None:
             return [grp.attrs['dx'], grp.attrs['dy'], grp.attrs['dz']]
@@ -328,6 +738,33 @@ class SAH5Py(object):
     def getFileVersion(self):
         return self.hdf5.attrs['version']
 
+    def getFrameStats(self, fields = None):
+        """
+        Return the per-frame analysis statistics as a dictionary of numpy
+        arrays, or None if they were not recorded.
+        """
+        if "frame_stats" in self.hdf5:
+            return self.getDatasets(self.hdf5["frame_stats"], fields)
+        
+    def getFrameRange(self, frame_number):
+        """
+        Return [start, stop] of the localizations of a frame in a 'columnar' file.
+        """
+        if not frame_number in self.frame_rows:
+            raise SAH5PyException("No such frame " + str(frame_number))
+        [fnum, start, n_locs] = self.frame_index[self.frame_rows[frame_number]]
+        return [start, start + n_locs]
+
+    def getFrameIndexArrays(self):
+        """
+        Return the frame index of a 'columnar' file as numpy arrays,
+        [frame numbers, offsets, number of localizations].
+        """
+        if self.frame_index_arrays is None:
+            index = numpy.array(self.frame_index, dtype = numpy.int64).reshape(-1, 3)
+            self.frame_index_arrays = [index[:,0], index[:,1], index[:,2]]
+        return self.frame_index_arrays
+        
     def getGroup(self, frame_number):
         grp_name = self.getGroupName(frame_number)
         if grp_name in self.hdf5:
@@ -346,6 +783,23 @@ class SAH5Py(object):
     def getLocalizationsInFrame(self, frame_number, drift_corrected = False, fields = None):
 
         locs = {}
+        if self.isColumnar():
+            if (frame_number in self.frame_rows):
+                [start, stop] = self.getFrameRange(frame_number)
+                if (stop > start):
+                    locs = self.getColumnarData(start, stop, fields)
+                    
+            if drift_corrected and bool(locs):
+                [dx, dy, dz] = self.getDriftCorrection(frame_number)
+                if "x" in locs:
+                    locs["x"] += dx
+                if "y" in locs:
+                    locs["y"] += dy
+                if "z" in locs:
+                    locs["z"] += dz
+                    
+            return locs
+        
         grp = self.getGroup(frame_number)
         
         if (grp is not None) and (grp.attrs['n_locs'] > 0):
@@ -361,26 +815,105 @@ class SAH5Py(object):
 
         return locs
 
-    def getLocalizationsInFrameRange(self, start, stop, drift_corrected = False, fields = None):
+    def getLocalizationsInFrameRange(self, start, stop, drift_corrected = False, fields = None, frame_column = False):
         """
         Return the localizations in the range start <= frame number < stop.
+
+        If frame_column is True the localizations will also have a 'frame'
+        field with the frame number of each localization.
         """
         assert(stop > start)
-        locs = {}
+        if self.isColumnar():
+            [locs, fnums, n_locs] = self.getLocalizationsInFrameRangeColumnar(start, stop, drift_corrected, fields)
+            if frame_column and bool(locs):
+                locs["frame"] = numpy.repeat(fnums, n_locs).astype(numpy.int32)
+            return locs
+
+        # Find the frames with localizations and the total number of localizations.
+        groups = []
+        n_locs = 0
         for i in range(start, stop):
-            temp = self.getLocalizationsInFrame(i,
-                                                fields = fields,
-                                                drift_corrected = drift_corrected)
-            if(not bool(temp)):
-                continue
-            
-            for field in temp:
-                if field in locs:
-                    locs[field] = numpy.concatenate((locs[field], temp[field]))
-                else:
-                    locs[field] = temp[field]
+            grp = self.getGroup(i)
+            if (grp is not None) and (grp.attrs['n_locs'] > 0):
+                groups.append([i, grp])
+                n_locs += grp.attrs['n_locs']
+
+        locs = {}
+        if (len(groups) == 0):
+            return locs
+
+        # Create the arrays to store the localizations. If a field is
+        # only present in some of the frames it will be zero in the others.
+        if fields is None:
+            for [fnum, grp] in groups:
+                for field in grp:
+                    if not field in locs:
+                        locs[field] = numpy.zeros(n_locs, dtype = grp[field].dtype)
+        else:
+            for field in fields:
+                locs[field] = numpy.empty(n_locs, dtype = groups[0][1][field].dtype)
+        if frame_column:
+            locs["frame"] = numpy.empty(n_locs, dtype = numpy.int32)
+
+        # Load the localizations.
+        offset = 0
+        for [fnum, grp] in groups:
+            end = offset + grp.attrs['n_locs']
+            for field in grp if fields is None else fields:
+                grp[field].read_direct(locs[field], dest_sel = numpy.s_[offset:end])
+
+            if drift_corrected:
+                for field, dfield in [["x", "dx"], ["y", "dy"], ["z", "dz"]]:
+                    if field in locs:
+                        locs[field][offset:end] += grp.attrs[dfield]
+
+            if frame_column:
+                locs["frame"][offset:end] = fnum
+                
+            offset = end
 
         return locs
+
+    def getLocalizationsInFrameRangeColumnar(self, start, stop, drift_corrected, fields):
+        """
+        getLocalizationsInFrameRange() for the 'columnar' layout.
+
+        Returns [localizations, frame numbers, number of localizations in each frame].
+        """
+        [frame_numbers, frame_offsets, frame_n_locs] = self.getFrameIndexArrays()
+        mask = (frame_numbers >= start) & (frame_numbers < stop) & (frame_n_locs > 0)
+        rows = numpy.nonzero(mask)[0]
+        rows = rows[numpy.argsort(frame_numbers[rows], kind = "mergesort")]
+        if (rows.size == 0):
+            return [{}, rows, rows]
+
+        offsets = frame_offsets[rows]
+        n_locs = frame_n_locs[rows]
+
+        # Normally the frames were added in order so this is a single read.
+        if numpy.all(offsets[1:] == (offsets[:-1] + n_locs[:-1])):
+            locs = self.getColumnarData(offsets[0], offsets[-1] + n_locs[-1], fields)
+        else:
+            locs = {}
+            for i in range(rows.size):
+                temp = self.getColumnarData(offsets[i], offsets[i] + n_locs[i], fields)
+                for field in temp:
+                    if field in locs:
+                        locs[field].append(temp[field])
+                    else:
+                        locs[field] = [temp[field]]
+            for field in locs:
+                locs[field] = numpy.concatenate(locs[field])
+
+        if drift_corrected:
+            self.writePending()
+            index_grp = self.hdf5["frame_index"]
+            for field, dfield in [["x", "dx"], ["y", "dy"], ["z", "dz"]]:
+                if field in locs:
+                    drift = index_grp[dfield][()][rows]
+                    locs[field] += numpy.repeat(drift, n_locs)
+
+        return [locs, frame_numbers[rows], n_locs]
         
     def getMetadata(self):
         if "metadata.xml" in self.hdf5:
@@ -415,6 +948,11 @@ class SAH5Py(object):
         return(int(self.hdf5.attrs['n_channels']))
         
     def getNLocalizations(self):
+        if self.isColumnar():
+            [frame_numbers, frame_offsets, frame_n_locs] = self.getFrameIndexArrays()
+            mask = (frame_numbers < self.getMovieLength())
+            return int(numpy.sum(frame_n_locs[mask]))
+        
         n_locs = 0
         for i in range(self.getMovieLength()):
             grp = self.getGroup(i)
@@ -422,6 +960,15 @@ class SAH5Py(object):
                 n_locs += grp.attrs['n_locs']
         return n_locs
 
+    def getNLocalizationsInFrame(self, frame_number):
+        """
+        Return the number of localizations in a frame that has been analyzed.
+        """
+        if self.isColumnar():
+            [start, stop] = self.getFrameRange(frame_number)
+            return stop - start
+        return self.getGroup(frame_number).attrs['n_locs']
+        
     def getNTracks(self):
         if(not self.hasTracks()):
             return 0
@@ -455,6 +1002,44 @@ class SAH5Py(object):
         # Return the tracks.
         return self.getDatasets(track_grp[t_grp_name], fields)
     
+    def getStorage(self):
+        """
+        Return the storage options of this file as a dictionary, files
+        that don't have them use storage_defaults.
+        """
+        storage = dict(storage_defaults)
+        for key in storage:
+            attr = 'storage_' + key
+            if attr in self.hdf5.attrs:
+                value = self.hdf5.attrs[attr]
+                if isinstance(value, bytes):
+                    value = value.decode()
+                storage[key] = type(storage_defaults[key])(value)
+        return storage
+
+    def getStorageDtype(self, field_name, dtype):
+        """
+        Return the type to store the field 'field_name' with.
+        """
+        single = self.storage["single_precision"].split(",")
+        if (numpy.dtype(dtype) == numpy.float64) and (field_name in single):
+            return numpy.float32
+        return dtype
+
+    def getStorageFilters(self):
+        """
+        Return the HDF5 filter keyword arguments of create_dataset().
+        """
+        filters = {}
+        if (self.storage["compression"] == "gzip"):
+            filters["compression"] = "gzip"
+            filters["compression_opts"] = self.storage["compression_level"]
+        elif (self.storage["compression"] == "lzf"):
+            filters["compression"] = "lzf"
+        if self.storage["shuffle"]:
+            filters["shuffle"] = True
+        return filters
+    
     def getTrackGroup(self):
         return self.hdf5["tracks"]
         
@@ -506,7 +1091,15 @@ class SAH5Py(object):
         return (self.hdf5.attrs['analysis_finished'] != 0)
             
     def isAnalyzed(self, frame_number):
+        if self.isColumnar():
+            return frame_number in self.frame_rows
         return self.getGroup(frame_number) is not None
+
+    def isColumnar(self):
+        """
+        Return True if the localizations are stored using the 'columnar' layout.
+        """
+        return self.columnar
         
     def isExisting(self):
         """
@@ -515,6 +1108,42 @@ class SAH5Py(object):
         """
         return self.existing
 
+    def isLocalizationsObject(self, name):
+        """
+        Return True if the root level object 'name' is used to store localizations.
+        """
+        if self.isColumnar():
+            return (name in ["frame_index", "locs"])
+        else:
+            return name.startswith("fr_")
+
+    def loadFrameIndex(self):
+        """
+        Figure out the layout and load the frame index of 'columnar' files.
+        """
+        layout = self.hdf5.attrs.get('layout', 'frames')
+        if isinstance(layout, bytes):
+            layout = layout.decode()
+        self.columnar = (layout == 'columnar')
+
+        self.frame_index = []
+        self.frame_index_arrays = None
+        self.frame_rows = {}
+        self.n_rows = 0
+        self.n_written = 0
+        self.pending = []
+        if self.columnar:
+            index_grp = self.hdf5["frame_index"]
+            frame_numbers = index_grp["frame_number"][()]
+            frame_offsets = index_grp["offset"][()]
+            frame_n_locs = index_grp["n_locs"][()]
+            for i in range(frame_numbers.size):
+                self.frame_index.append([int(frame_numbers[i]), int(frame_offsets[i]), int(frame_n_locs[i])])
+                self.frame_rows[int(frame_numbers[i])] = i
+            if (frame_numbers.size > 0):
+                self.n_rows = int(numpy.max(frame_offsets + frame_n_locs))
+                self.n_written = self.n_rows
+        
     def localizationsIterator(self, drift_corrected = True, fields = None, skip_empty = True):
         """
         An iterator for getting all the localizations in a for loop. This is
@@ -529,6 +1158,11 @@ class SAH5Py(object):
         If skip_empty is false you will get empty locs dictionaries for frames
         that have no localizations.
         """
+        if self.isColumnar():
+            for elt in self.localizationsIteratorColumnar(drift_corrected, fields, skip_empty):
+                yield elt
+            return
+        
         # This should be a zero length generator if there are no localizations.
         for i in range(self.getMovieLength()):
             locs = self.getLocalizationsInFrame(i,
@@ -541,6 +1175,73 @@ class SAH5Py(object):
             else:
                 yield [i, locs]
 
+    def localizationsIteratorColumnar(self, drift_corrected, fields, skip_empty):
+        """
+        localizationsIterator() for the 'columnar' layout. This loads the
+        localizations in blocks of frames, rather than frame by frame.
+        """
+        movie_l = self.getMovieLength()
+        for start in range(0, movie_l, columnar_iterator_frames):
+            stop = min(start + columnar_iterator_frames, movie_l)
+            [locs, fnums, n_locs] = self.getLocalizationsInFrameRangeColumnar(start,
+                                                                              stop,
+                                                                              drift_corrected,
+                                                                              fields)
+            ends = numpy.cumsum(n_locs)
+            j = 0
+            for i in range(start, stop):
+                if (j < fnums.size) and (fnums[j] == i):
+                    frame_locs = {}
+                    for field in locs:
+                        frame_locs[field] = locs[field][(ends[j] - n_locs[j]):ends[j]]
+                    j += 1
+                    yield [i, frame_locs]
+                elif not skip_empty:
+                    yield [i, {}]
+
+    def writePending(self):
+        """
+        Write the localizations that addLocalizationsColumnar() is holding
+        in memory to the HDF5 file.
+        """
+        if (len(self.pending) == 0):
+            return
+
+        pending = self.pending
+        self.pending = []
+        
+        # Update the frame index.
+        index_grp = self.hdf5["frame_index"]
+        i_start = len(self.frame_index) - len(pending)
+        i_stop = len(self.frame_index)
+        new_index = numpy.array(self.frame_index[i_start:i_stop], dtype = numpy.int64)
+        for field in frame_index_fields:
+            index_grp[field].resize((i_stop,))
+        index_grp["frame_number"][i_start:i_stop] = new_index[:,0]
+        index_grp["offset"][i_start:i_stop] = new_index[:,1]
+        index_grp["n_locs"][i_start:i_stop] = new_index[:,2]
+
+        # Gather the localizations of each field into a single array.
+        start = self.n_written
+        block = {}
+        for i, [fnum, locs] in enumerate(pending):
+            offset = new_index[i,1] - start
+            for field in locs:
+                if not field in block:
+                    block[field] = numpy.zeros(self.n_rows - start, dtype = locs[field].dtype)
+                block[field][offset:(offset + locs[field].size)] = locs[field]
+
+        # Write, this also keeps all the datasets the same length.
+        locs_grp = self.hdf5["locs"]
+        for field in block:
+            if not field in locs_grp:
+                self.createColumnarDataset(field, start, block[field].dtype)
+        for field in locs_grp:
+            locs_grp[field].resize((self.n_rows,))
+            if field in block:
+                locs_grp[field][start:self.n_rows] = block[field]
+        self.n_written = self.n_rows
+            
     def setAnalysisFinished(self, finished):
         if finished:
             self.hdf5.attrs['analysis_finished'] = 1
@@ -548,6 +1249,18 @@ class SAH5Py(object):
             self.hdf5.attrs['analysis_finished'] = 0            
     
     def setDriftCorrection(self, frame_number, dx = 0.0, dy = 0.0, dz = 0.0):
+        if self.isColumnar():
+            if frame_number in self.frame_rows:
+                self.writePending()
+                row = self.frame_rows[frame_number]
+                index_grp = self.hdf5["frame_index"]
+                index_grp["dx"][row] = dx
+                index_grp["dy"][row] = dy
+                index_grp["dz"][row] = dz
+                return
+            else:
+                raise SAH5PyException("setDriftCorrection(), no such frame " + str(frame_number))
+            
         grp = self.getGroup(frame_number)
         if grp is not None:
             grp.attrs['dx'] = dx
@@ -556,6 +1269,44 @@ class SAH5Py(object):
         else:
             raise SAH5PyException("setDriftCorrection(), no such frame " + str(frame_number))
 
+    def setDriftCorrections(self, frame_numbers, dx, dy, dz):
+        """
+        Set the drift corrections of multiple frames at once. For 'columnar'
+        files this only writes each of the drift correction columns once
+        instead of doing three writes per frame as setDriftCorrection() does.
+
+        frame_numbers - The frame numbers.
+        dx, dy, dz - The drift corrections for these frames.
+
+        Frames that are not in the file are ignored.
+        """
+        if self.isColumnar():
+            self.writePending()
+            rows = []
+            indices = []
+            for i, fnum in enumerate(frame_numbers):
+                fnum = int(fnum)
+                if fnum in self.frame_rows:
+                    rows.append(self.frame_rows[fnum])
+                    indices.append(i)
+
+            if (len(rows) == 0):
+                return
+
+            index_grp = self.hdf5["frame_index"]
+            for [field, values] in [["dx", dx], ["dy", dy], ["dz", dz]]:
+                column = index_grp[field][()]
+                column[rows] = numpy.asarray(values)[indices]
+                index_grp[field][:] = column
+            return
+
+        for i, fnum in enumerate(frame_numbers):
+            grp = self.getGroup(int(fnum))
+            if grp is not None:
+                grp.attrs['dx'] = dx[i]
+                grp.attrs['dy'] = dy[i]
+                grp.attrs['dz'] = dz[i]
+
     def setMovieInformation(self, movie_x, movie_y, movie_l, hash_value):
         """
         Store some properties of the movie as attributes.
@@ -693,6 +1444,9 @@ class SAH5Reader(SAH5Py):
             self.existing = True
         else:
             raise SAH5PyException("file '" + filename + "' not found.")        
+
+        self.storage = self.getStorage()
+        self.loadFrameIndex()
         
 
         
@@ -120,7 +120,7 @@ if (__name__ == "__main__"):
     args = parser.parse_args()
 
     # Load movies and parameters.
-    input_movie = datareader.inferReader(args.in_movie)
+    input_movie = datareader.inferReader(args.in_movie, memmap = True)
     [w, h, l] = input_movie.filmSize()
     
     output_movie = datawriter.DaxWriter(args.out_movie)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Convert a HDF5 storm-analysis format file from one localization
+layout to another, 'frames' (one group per frame) or 'columnar'
+(one dataset per localization property).
+
+agent 10/26
+"""
+import storm_analysis.sa_library.sa_h5py as saH5Py
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'HDF5 localization layout converter.')
+
+    parser.add_argument('--input', dest='input', type=str, required=True,
+                        help = "The hdf5 file to convert.")
+    parser.add_argument('--output', dest='output', type=str, required=True,
+                        help = "The name of the converted hdf5 file.")
+    parser.add_argument('--layout', dest='layout', type=str, required=False, default='columnar',
+                        help = "The layout to convert to, 'frames' or 'columnar'. The default is 'columnar'.")
+
+    args = parser.parse_args()
+    
+    saH5Py.convertLayout(args.input, args.output, args.layout)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
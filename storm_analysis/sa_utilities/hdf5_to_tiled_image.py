@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+"""
+Out of core rendering of images from a HDF5 localization file, for
+images that are too large to fit in memory, for example images of
+stitched fields of view or images with a large scale.
+
+This works in two passes. The first pass sorts the localizations into
+the tiles of the output image, saving them in a temporary HDF5 'bucket'
+file. The second pass renders each tile independently (using several
+threads) and writes the tiles directly to the output file as they are
+rendered. The amount of memory used depends on the tile size and the
+number of threads, not the size of the final image.
+
+The output is either a tiled BigTIFF file, or if the output file name
+ends with '.hdf5' or '.h5' a multi-resolution pyramid in a HDF5 file,
+with one dataset per resolution level, 'level_0', 'level_1', etc. The
+image size is halved at each level. TIFF files can also include the
+lower resolution levels (as SubIFDs).
+
+The images are the same as those of hdf5_to_image.render2DImage(),
+except that they are saved as 32 bit floats.
+
+Note that writing tiled BigTIFF files requires a recent version of tifffile.
+
+agent 10/26
+"""
+import collections
+import h5py
+import multiprocessing.pool
+import numpy
+import os
+import shutil
+import sys
+import tempfile
+
+import storm_analysis.sa_library.sa_h5py as saH5Py
+import storm_analysis.sa_utilities.hdf5_to_image as hdf5ToImage
+
+
+class TiledRendererException(Exception):
+    pass
+
+
+class TileRenderer(object):
+    """
+    Renders the tiles of an image using the localizations in a bucket file.
+    """
+    def __init__(self, bucket_name = None, **kwds):
+        super(TileRenderer, self).__init__(**kwds)
+
+        self.bucket = h5py.File(bucket_name, "r")
+        for attr in ["image_x", "image_y", "margin", "tile_size"]:
+            setattr(self, attr, int(self.bucket.attrs[attr]))
+        self.sigma = self.bucket.attrs["sigma"]
+        if (self.sigma <= 0.0):
+            self.sigma = None
+
+    def cleanUp(self):
+        self.bucket.close()
+
+    def getTileSize(self, tile):
+        """
+        Returns [x start, y start, width, height] of a tile.
+        """
+        [ty, tx] = tile
+        x0 = tx * self.tile_size
+        y0 = ty * self.tile_size
+        return [x0, y0, min(self.tile_size, self.image_x - x0), min(self.tile_size, self.image_y - y0)]
+
+    def renderTile(self, tile):
+        """
+        Returns the image of a tile as a 32 bit float numpy array.
+        """
+        [x0, y0, w, h] = self.getTileSize(tile)
+        m = self.margin
+
+        # The localizations are only read in the threads. h5py serializes
+        # access to the file.
+        x = numpy.zeros(0)
+        y = numpy.zeros(0)
+        grp_name = tileName(tile)
+        if grp_name in self.bucket:
+            x = self.bucket[grp_name]["x"][()]
+            y = self.bucket[grp_name]["y"][()]
+
+        # Histogram, the localizations are already rounded to the
+        # nearest pixel.
+        if self.sigma is None:
+            image = numpy.zeros((h, w), dtype = numpy.int32)
+            hdf5ToImage.renderImage(image, x - x0, y - y0, None)
+            return image.astype(numpy.float32)
+
+        # Gaussians, draw these on a larger image so that Gaussians from
+        # localizations in the neighboring tiles are included.
+        else:
+            image = numpy.zeros((h + 2*m, w + 2*m), dtype = numpy.float64)
+            hdf5ToImage.renderImage(image, x - x0 + m, y - y0 + m, self.sigma)
+            return image[m:(m+h), m:(m+w)].astype(numpy.float32)
+
+    def tiles(self):
+        """
+        Returns a list of all the tiles in row major order.
+        """
+        tiles = []
+        for ty in range(nTiles(self.image_y, self.tile_size)):
+            for tx in range(nTiles(self.image_x, self.tile_size)):
+                tiles.append([ty, tx])
+        return tiles
+
+
+def bucketLocalizations(h5_name, bucket_name, tile_size, category = None, offsets = None, scale = 2, sigma = None, max_buffered = 1000000):
+    """
+    Sort the localizations (or the tracks, if available) into the tiles
+    of the image. Each tile also gets the localizations that are close
+    enough to its edge to contribute to it when rendering Gaussians.
+
+    max_buffered is the maximum number of localizations to keep in
+    memory before writing them to the bucket file.
+    """
+    margin = 0
+    if sigma is not None:
+        margin = int(5.0 * sigma) + 2
+    if (margin >= tile_size):
+        raise TiledRendererException("Tile size must be larger than " + str(margin) + " for this sigma.")
+
+    with saH5Py.SAH5Reader(h5_name) as h5:
+        [movie_x, movie_y, movie_l, hash_value] = h5.getMovieInformation()
+        image_x = movie_x * scale
+        image_y = movie_y * scale
+        n_tx = nTiles(image_x, tile_size)
+        n_ty = nTiles(image_y, tile_size)
+
+        with h5py.File(bucket_name, "w") as bucket:
+            bucket.attrs["image_x"] = image_x
+            bucket.attrs["image_y"] = image_y
+            bucket.attrs["margin"] = margin
+            bucket.attrs["sigma"] = 0.0 if sigma is None else sigma
+            bucket.attrs["tile_size"] = tile_size
+
+            buffered = {}
+            n_buffered = 0
+            for locs in localizationsIterator(h5, category):
+                locs = hdf5ToImage.filterOffsetScale(locs, category, offsets, scale)
+                if locs is None:
+                    continue
+
+                x = locs["x"]
+                y = locs["y"]
+
+                # Round to the nearest pixel now, as numpy rounds halves to
+                # even so rounding after shifting to the tile origin could
+                # change the pixel.
+                if sigma is None:
+                    x = numpy.round(x)
+                    y = numpy.round(y)
+
+                # The range of tiles of each localization. As the margin is
+                # smaller than the tile size this is at most 2 tiles in x & y.
+                tx0 = numpy.floor((x - margin)/tile_size).astype(numpy.int64)
+                tx1 = numpy.floor((x + margin)/tile_size).astype(numpy.int64)
+                ty0 = numpy.floor((y - margin)/tile_size).astype(numpy.int64)
+                ty1 = numpy.floor((y + margin)/tile_size).astype(numpy.int64)
+                for dy in [0, 1]:
+                    for dx in [0, 1]:
+                        tx = tx0 + dx
+                        ty = ty0 + dy
+                        mask = (tx <= tx1) & (ty <= ty1) & (tx >= 0) & (tx < n_tx) & (ty >= 0) & (ty < n_ty)
+                        if not numpy.any(mask):
+                            continue
+
+                        # Split by tile.
+                        tile_id = ty[mask] * n_tx + tx[mask]
+                        order = numpy.argsort(tile_id, kind = "stable")
+                        tile_id = tile_id[order]
+                        t_x = x[mask][order]
+                        t_y = y[mask][order]
+                        [ids, starts] = numpy.unique(tile_id, return_index = True)
+                        stops = numpy.append(starts[1:], tile_id.size)
+                        for i in range(ids.size):
+                            tile = (int(ids[i]//n_tx), int(ids[i]%n_tx))
+                            if not tile in buffered:
+                                buffered[tile] = []
+                            buffered[tile].append([t_x[starts[i]:stops[i]], t_y[starts[i]:stops[i]]])
+                        n_buffered += tile_id.size
+
+                if (n_buffered >= max_buffered):
+                    writeBuffered(bucket, buffered)
+                    buffered = {}
+                    n_buffered = 0
+                    sys.stdout.write(".")
+                    sys.stdout.flush()
+
+            writeBuffered(bucket, buffered)
+    print()
+
+def downsampleTile(dset, tile, tile_size):
+    """
+    Returns a tile of the next (lower) resolution level, the mean
+    of each 2x2 block of pixels of dset.
+    """
+    [ty, tx] = tile
+    y0 = 2 * ty * tile_size
+    x0 = 2 * tx * tile_size
+    block = dset[y0:(y0 + 2*tile_size), x0:(x0 + 2*tile_size)]
+
+    # Pad odd sizes with zeros.
+    [h, w] = block.shape
+    if ((h%2) != 0) or ((w%2) != 0):
+        temp = numpy.zeros((h + h%2, w + w%2), dtype = block.dtype)
+        temp[:h,:w] = block
+        block = temp
+    [h, w] = block.shape
+    return block.reshape(h//2, 2, w//2, 2).mean(axis = (1,3)).astype(numpy.float32)
+
+def localizationsIterator(h5, category):
+    """
+    Iterate over the tracks, if available, otherwise the localizations.
+    """
+    fields = ["x", "y"]
+    if category is not None:
+        fields.append("category")
+
+    if h5.hasTracks():
+        for locs in h5.tracksIterator(fields = fields):
+            yield locs
+
+    else:
+        print("Tracks not found, using localizations.")
+        for fnum, locs in h5.localizationsIterator(fields = fields):
+            yield locs
+
+def nTiles(size, tile_size):
+    return (size + tile_size - 1)//tile_size
+
+def pyramidTiles(dset, tile_size):
+    """
+    Iterate over the tiles of a pyramid level dataset in row major order.
+    """
+    [h, w] = dset.shape
+    for ty in range(nTiles(h, tile_size)):
+        for tx in range(nTiles(w, tile_size)):
+            yield dset[(ty*tile_size):((ty+1)*tile_size), (tx*tile_size):((tx+1)*tile_size)]
+
+def renderTiled(h5_name, output_name, category = None, offsets = None, scale = 2, sigma = None, tile_size = 1024, levels = 1, n_threads = 4, work_dir = None):
+    """
+    Create a grayscale image from a HDF5 format localizations file. This will use
+    the tracks if available, otherwise it will use the localizations.
+
+    h5_name - The name of the HDF5 file.
+    output_name - The name of the output file, a TIFF file or a HDF5 file.
+    category - Filter for localizations of this category. The default is all categories.
+    offsets - List containing [X,Y] offset of the image origin.  The default is no offset.
+    scale - The 'zoom' level of the output image, i.e. if the original STORM movie was
+            256x256 and scale = 2 then the output image will be 512x512.
+    sigma - The sigma to use when rendering gaussians (pixels). If this is None then
+            the image will be a histogram.
+    tile_size - The size of the tiles in pixels, a multiple of 16 for TIFF files.
+    levels - The number of resolution levels.
+    n_threads - The number of threads to use for rendering.
+    work_dir - Where to save the temporary files, the default is the system temporary
+            directory. This needs enough space for (up to 4 copies of) the x,y
+            localizations, and for the image if levels > 1 and the output is a TIFF file.
+    """
+    is_tiff = not os.path.splitext(output_name)[1].lower() in [".h5", ".hdf5"]
+    if is_tiff and ((tile_size % 16) != 0):
+        raise TiledRendererException("The tile size of TIFF files must be a multiple of 16.")
+
+    pixel_size = None
+    with saH5Py.SAH5Reader(h5_name) as h5:
+        try:
+            pixel_size = h5.getPixelSize()/scale
+        except saH5Py.SAH5PyException:
+            print("No pixel size information available.")
+
+    tmp_dir = tempfile.mkdtemp(dir = work_dir)
+    try:
+        bucket_name = os.path.join(tmp_dir, "bucket.hdf5")
+        bucketLocalizations(h5_name,
+                            bucket_name,
+                            tile_size,
+                            category = category,
+                            offsets = offsets,
+                            scale = scale,
+                            sigma = sigma)
+
+        renderer = TileRenderer(bucket_name = bucket_name)
+        try:
+            shape = (renderer.image_y, renderer.image_x)
+            tiles = renderTiles(renderer, n_threads)
+            if is_tiff and (levels == 1):
+                writeTiff(output_name, [[shape, tiles]], tile_size, pixel_size)
+            elif is_tiff:
+                pyramid_name = os.path.join(tmp_dir, "pyramid.hdf5")
+                writePyramid(pyramid_name, shape, tiles, tile_size, levels, pixel_size)
+                with h5py.File(pyramid_name, "r") as pyramid:
+                    level_tiles = []
+                    for i in range(levels):
+                        dset = pyramid["level_" + str(i)]
+                        level_tiles.append([dset.shape, pyramidTiles(dset, tile_size)])
+                    writeTiff(output_name, level_tiles, tile_size, pixel_size)
+            else:
+                writePyramid(output_name, shape, tiles, tile_size, levels, pixel_size)
+        finally:
+            renderer.cleanUp()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def renderTiles(renderer, n_threads):
+    """
+    Render the tiles in parallel, returning them in row major order. Only
+    a few more tiles than there are threads are rendered ahead of the
+    tile that is being written.
+    """
+    if (n_threads <= 1):
+        for tile in renderer.tiles():
+            yield renderer.renderTile(tile)
+        return
+
+    pool = multiprocessing.pool.ThreadPool(processes = n_threads)
+    try:
+        pending = collections.deque()
+        for tile in renderer.tiles():
+            pending.append(pool.apply_async(renderer.renderTile, (tile,)))
+            if (len(pending) >= 2*n_threads):
+                yield pending.popleft().get()
+        while (len(pending) > 0):
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+def tileName(tile):
+    return "t_" + str(tile[0]) + "_" + str(tile[1])
+
+def writeBuffered(bucket, buffered):
+    """
+    Add buffered localizations to the tiles in the bucket file.
+    """
+    for tile in buffered:
+        grp_name = tileName(tile)
+        if not grp_name in bucket:
+            grp = bucket.create_group(grp_name)
+            for field in ["x", "y"]:
+                grp.create_dataset(field, (0,), dtype = numpy.float64, maxshape = (None,), chunks = (10000,))
+        grp = bucket[grp_name]
+
+        for i, field in enumerate(["x", "y"]):
+            data = numpy.concatenate([elt[i] for elt in buffered[tile]])
+            n_old = grp[field].size
+            grp[field].resize((n_old + data.size,))
+            grp[field][n_old:] = data
+
+def writePyramid(pyramid_name, shape, tiles, tile_size, levels, pixel_size):
+    """
+    Write the tiles (an iterator in row major order) and the lower resolution
+    levels to a HDF5 file.
+    """
+    with h5py.File(pyramid_name, "w") as pyramid:
+        pyramid.attrs["levels"] = levels
+
+        # Full resolution.
+        dset = pyramid.create_dataset("level_0",
+                                      shape,
+                                      dtype = numpy.float32,
+                                      chunks = (min(tile_size, shape[0]), min(tile_size, shape[1])))
+        if pixel_size is not None:
+            dset.attrs["pixel_size"] = pixel_size
+        n_tx = nTiles(shape[1], tile_size)
+        for i, tile in enumerate(tiles):
+            y0 = (i//n_tx) * tile_size
+            x0 = (i%n_tx) * tile_size
+            dset[y0:(y0 + tile.shape[0]), x0:(x0 + tile.shape[1])] = tile
+
+        # Lower resolutions.
+        for i in range(1, levels):
+            last = pyramid["level_" + str(i-1)]
+            shape = ((last.shape[0] + 1)//2, (last.shape[1] + 1)//2)
+            dset = pyramid.create_dataset("level_" + str(i),
+                                          shape,
+                                          dtype = numpy.float32,
+                                          chunks = (min(tile_size, shape[0]), min(tile_size, shape[1])))
+            if pixel_size is not None:
+                dset.attrs["pixel_size"] = pixel_size * 2**i
+            for ty in range(nTiles(shape[0], tile_size)):
+                for tx in range(nTiles(shape[1], tile_size)):
+                    tile = downsampleTile(last, [ty, tx], tile_size)
+                    y0 = ty * tile_size
+                    x0 = tx * tile_size
+                    dset[y0:(y0 + tile.shape[0]), x0:(x0 + tile.shape[1])] = tile
+
+def writeTiff(tiff_name, level_tiles, tile_size, pixel_size):
+    """
+    Write a tiled BigTIFF file. level_tiles is a list of [shape, iterator
+    of tiles in row major order], one for each resolution level. The lower
+    resolution levels are saved as SubIFDs of the full resolution image.
+    """
+    import tifffile
+
+    with tifffile.TiffWriter(tiff_name, bigtiff = True) as tf:
+        for i, [shape, tiles] in enumerate(level_tiles):
+            options = {"dtype" : numpy.float32,
+                       "shape" : shape,
+                       "tile" : (tile_size, tile_size)}
+            if pixel_size is not None:
+                options["resolution"] = (1.0e+7/(pixel_size * 2**i), 1.0e+7/(pixel_size * 2**i))
+                options["resolutionunit"] = "CENTIMETER"
+            if (i > 0):
+                options["subfiletype"] = 1
+            elif (len(level_tiles) > 1):
+                options["subifds"] = len(level_tiles) - 1
+            tf.write(tiles, **options)
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Create a (large) 2D image from an HDF5 format localization file, tile by tile.')
+
+    parser.add_argument('--image', dest='image', type=str, required=True,
+                        help = "The name of the output image, a (BigTIFF) .tif file or a .hdf5 file.")
+    parser.add_argument('--bin', dest='hdf5', type=str, required=True,
+                        help = "The name of the localizations HDF5 file.")
+    parser.add_argument('--scale', dest='scale', type=int, required=False, default = 2,
+                        help = "The 'zoom' of the output image (an integer).")
+    parser.add_argument('--sigma', dest='sigma', type=float, required=False, default = 1.5,
+                        help = "The sigma for gaussian render. Use 0.0 for a histogram.")
+    parser.add_argument('--tile_size', dest='tile_size', type=int, required=False, default = 1024,
+                        help = "The tile size in pixels, the default is 1024.")
+    parser.add_argument('--levels', dest='levels', type=int, required=False, default = 1,
+                        help = "The number of resolution levels, the default is 1.")
+    parser.add_argument('--threads', dest='threads', type=int, required=False, default = 4,
+                        help = "The number of rendering threads, the default is 4.")
+    parser.add_argument('--work_dir', dest='work_dir', type=str, required=False,
+                        help = "The directory for the temporary files.")
+
+    args = parser.parse_args()
+
+    sigma = args.sigma
+    if (sigma <= 0.0):
+        sigma = None
+
+    renderTiled(args.hdf5,
+                args.image,
+                scale = args.scale,
+                sigma = sigma,
+                tile_size = args.tile_size,
+                levels = args.levels,
+                n_threads = args.threads,
+                work_dir = args.work_dir)
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
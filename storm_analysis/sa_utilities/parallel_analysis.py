@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+"""
+Analyze one or more movies using multiple processes on a single computer.
+
+The frames of each movie are divided into chunks, and each chunk is
+analyzed by a separate analysis process. The chunks are created as the
+processes become free, and they get smaller as the end of the movie
+approaches (guided self-scheduling). This way a chunk with a lot of
+localizations does not leave the other processes idle at the end of
+the analysis. Chunks that fail are retried.
+
+When all the chunks of a movie have been analyzed they are merged into
+a single HDF5 file, and then tracking, drift correction, etc. are done
+on the merged file.
+
+This does the same thing as the scripts in the slurm directory, but
+without a cluster.
+
+agent 10/26
+"""
+import glob
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from xml.etree import ElementTree
+
+import storm_analysis
+import storm_analysis.sa_library.batch_run as batchRun
+import storm_analysis.sa_library.datareader as datareader
+import storm_analysis.sa_library.parameters as params
+import storm_analysis.sa_library.sa_h5py as saH5Py
+import storm_analysis.sa_utilities.std_analysis as stdAnalysis
+
+
+def chunkXML(settings_xml, xml_name, start_frame, max_frame):
+    """
+    Create an analysis XML file for the frames start_frame <= frame < max_frame.
+
+    Tracking, drift correction and file format conversion are done after
+    the chunks are merged, and each chunk is analyzed by a single process.
+    """
+    settings = ElementTree.parse(settings_xml).getroot()
+
+    for [name, node_type, value] in [["start_frame", "int", start_frame],
+                                     ["max_frame", "int", max_frame],
+                                     ["radius", "float", 0.0]]:
+        node = settings.find(name)
+        if node is None:
+            node = ElementTree.SubElement(settings, name)
+            node.set("type", node_type)
+        node.text = str(value)
+
+    # These are only changed if they are set.
+    for [name, value] in [["drift_correction", 0],
+                          ["n_processes", 1]]:
+        node = settings.find(name)
+        if node is not None:
+            node.text = str(value)
+
+    node = settings.find("convert_to")
+    if node is not None:
+        settings.remove(node)
+
+    with open(xml_name, "wb") as fp:
+        fp.write(ElementTree.tostring(settings, 'ISO-8859-1'))
+
+
+def mergeChunks(chunk_h5_names, h5_name, layout = "frames"):
+    """
+    Merge the localizations from the analysis of each chunk into a single
+    file. chunk_h5_names must be in frame order.
+    """
+    storm_analysis.removeFile(h5_name)
+    with saH5Py.SAH5Py(chunk_h5_names[0]) as h5_in:
+        sa_type = h5_in.getFileType()
+        storage = h5_in.getStorage()
+
+    with saH5Py.SAH5Py(h5_name, is_existing = False, sa_type = sa_type, layout = layout, storage = storage) as merged_h5:
+        for i, chunk_h5_name in enumerate(chunk_h5_names):
+            with saH5Py.SAH5Py(chunk_h5_name) as h5_in:
+                if (i == 0):
+                    merged_h5.setMovieInformation(*h5_in.getMovieInformation())
+                    merged_h5.setPixelSize(h5_in.getPixelSize())
+                    merged_h5.addMetadata(h5_in.getMetadata())
+
+                # There is no tracking information at this stage of the analysis.
+                for fnum, locs in h5_in.localizationsIterator(drift_corrected = False):
+                    merged_h5.addLocalizations(locs, fnum)
+
+        merged_h5.setAnalysisFinished(True)
+
+
+class MovieChunks(object):
+    """
+    Creates the chunks for a single movie and keeps track of their analysis.
+    """
+    def __init__(self, movie_name = None, h5_name = None, work_dir = None, settings_xml = None, **kwds):
+        super(MovieChunks, self).__init__(**kwds)
+
+        self.chunks = []
+        self.failed = False
+        self.h5_name = h5_name
+        self.movie_name = movie_name
+        self.settings_xml = settings_xml
+        self.work_dir = work_dir
+
+        if not os.path.exists(self.work_dir):
+            os.makedirs(self.work_dir)
+
+        # Figure out which frames to analyze.
+        parameters = params.ParametersCommon().initFromFile(settings_xml, warnings = False)
+        with datareader.inferReader(movie_name) as movie:
+            self.stop_frame = movie.filmSize()[2]
+
+        self.next_frame = 0
+        if (parameters.getAttr("start_frame", -1) > 0):
+            self.next_frame = min(parameters.getAttr("start_frame"), self.stop_frame)
+        if (parameters.getAttr("max_frame", -1) > 0):
+            self.stop_frame = min(parameters.getAttr("max_frame"), self.stop_frame)
+
+    def finishChunk(self, chunk):
+        chunk["finished"] = True
+
+    def isFinished(self):
+        """
+        Returns True if all the chunks have been analyzed.
+        """
+        return (self.next_frame >= self.stop_frame) and all(map(lambda x: x["finished"], self.chunks))
+
+    def nextChunk(self, n_processes, chunk_size):
+        """
+        Returns the next chunk, or None if all the frames have already been
+        handed out. The chunk size is a fraction of the number of frames that
+        are left, with chunk_size as the maximum and chunk_size/10 as the
+        minimum.
+        """
+        if self.failed or (self.next_frame >= self.stop_frame):
+            return None
+
+        remaining = self.stop_frame - self.next_frame
+        size = max(remaining//(2*n_processes), chunk_size//10, 1)
+        size = min(size, chunk_size)
+
+        start = self.next_frame
+        stop = min(start + size, self.stop_frame)
+        self.next_frame = stop
+
+        basename = os.path.join(self.work_dir, "p_" + str(start))
+        chunk = {"finished" : False,
+                 "h5_name" : basename + ".hdf5",
+                 "log_name" : basename + ".log",
+                 "movie" : self,
+                 "retries" : 0,
+                 "start" : start,
+                 "stop" : stop,
+                 "xml_name" : basename + ".xml"}
+        chunkXML(self.settings_xml, chunk["xml_name"], start, stop)
+        self.chunks.append(chunk)
+        return chunk
+
+    def merge(self, keep_chunks = False, link = False, compact = False):
+        """
+        Merge the chunks and do tracking, drift correction, etc.
+
+        If link is True the merged file links to the localizations in the
+        chunk files instead of copying them, so the chunk files are kept
+        unless compact is also True. If compact is True the localizations
+        are copied into the merged file after tracking.
+        """
+        print("Merging", len(self.chunks), "chunks for", self.movie_name)
+        parameters = params.ParametersCommon().initFromFile(self.settings_xml, warnings = False)
+
+        chunk_h5_names = [chunk["h5_name"] for chunk in sorted(self.chunks, key = lambda x: x["start"])]
+        if link:
+            storm_analysis.removeFile(self.h5_name)
+            saH5Py.linkFiles(chunk_h5_names, self.h5_name)
+        else:
+            mergeChunks(chunk_h5_names,
+                        self.h5_name,
+                        layout = parameters.getAttr("hdf5_layout", "frames"))
+
+        stdAnalysis.trackDriftCorrect(self.h5_name, parameters)
+        if link and compact:
+            saH5Py.compactFile(self.h5_name)
+        stdAnalysis.convert(self.h5_name, parameters)
+
+        if not keep_chunks and (compact or not link):
+            for chunk in self.chunks:
+                for name in ["h5_name", "log_name", "xml_name"]:
+                    storm_analysis.removeFile(chunk[name])
+
+    def startChunk(self, chunk, analysis_exe, results):
+        """
+        Start the analysis of a chunk in a new process. [chunk, return code]
+        is added to results when the process finishes.
+        """
+        # Otherwise the analysis will try to restart from where it stopped.
+        storm_analysis.removeFile(chunk["h5_name"])
+
+        cmd_line = [sys.executable, analysis_exe,
+                    "--movie", self.movie_name,
+                    "--bin", chunk["h5_name"],
+                    "--xml", chunk["xml_name"]]
+        with open(chunk["log_name"], "w") as log_fp:
+            proc = subprocess.Popen(cmd_line,
+                                    env = os.environ.copy(),
+                                    stdout = log_fp,
+                                    stderr = subprocess.STDOUT)
+        t = threading.Thread(target = batchRun.processWaiter,
+                             args = (proc, chunk, results))
+        t.daemon = True
+        t.start()
+        return proc
+
+
+def chunkSucceeded(chunk, return_code):
+    """
+    Returns True if the analysis of the chunk finished.
+    """
+    if (return_code != 0) or (not os.path.exists(chunk["h5_name"])):
+        return False
+    try:
+        with saH5Py.SAH5Reader(chunk["h5_name"]) as h5:
+            return h5.isAnalysisFinished()
+    except Exception:
+        return False
+
+
+def parallelAnalysis(analysis_exe, movie_names, settings_xml, output_dir = None, n_processes = 2, chunk_size = 1000, max_retries = 2, keep_chunks = False, link = False, compact = False):
+    """
+    analysis_exe - The analysis program, for example storm_analysis/daostorm_3d/mufit_analysis.py.
+    movie_names - A list of movies to analyze.
+    settings_xml - The analysis settings XML file.
+    output_dir - Where to save the results, the default is the directory of each movie.
+    n_processes - The number of analysis processes to run at the same time.
+    chunk_size - The maximum number of frames in a chunk.
+    max_retries - How many times to retry a chunk that failed.
+    keep_chunks - Don't remove the files of each chunk after merging.
+    link - Link to the localizations in the files of each chunk instead of copying them.
+    compact - Copy the linked localizations into the merged file after tracking.
+
+    Returns a list of the movies whose analysis failed.
+    """
+    movies = []
+    for movie_name in movie_names:
+        [basename, ext] = os.path.splitext(movie_name)
+        if output_dir is not None:
+            basename = os.path.join(output_dir, os.path.basename(basename))
+        movies.append(MovieChunks(movie_name = movie_name,
+                                  h5_name = basename + ".hdf5",
+                                  work_dir = basename + "_chunks",
+                                  settings_xml = settings_xml))
+
+    failed = []
+    procs = []
+    results = queue.Queue()
+    retry = []
+    running = 0
+    try:
+        while True:
+
+            # Start chunks until all the processes are busy. Chunks that need to
+            # be retried are started first, then the chunks of the first movie
+            # that still has frames to analyze.
+            while (running < n_processes):
+                chunk = None
+                while (len(retry) > 0) and (chunk is None):
+                    chunk = retry.pop(0)
+                    if chunk["movie"].failed:
+                        chunk = None
+                if chunk is None:
+                    for movie in movies:
+                        chunk = movie.nextChunk(n_processes, chunk_size)
+                        if chunk is not None:
+                            break
+                if chunk is None:
+                    break
+                procs.append(chunk["movie"].startChunk(chunk, analysis_exe, results))
+                running += 1
+
+            if (running == 0):
+                break
+
+            # Wait for a chunk to finish.
+            [chunk, return_code] = results.get()
+            running -= 1
+            movie = chunk["movie"]
+
+            if chunkSucceeded(chunk, return_code):
+                print("Finished frames", chunk["start"], "-", chunk["stop"], "of", movie.movie_name)
+                movie.finishChunk(chunk)
+                if movie.isFinished():
+                    movie.merge(keep_chunks = keep_chunks, link = link, compact = compact)
+
+            elif (chunk["retries"] < max_retries):
+                print("Retrying frames", chunk["start"], "-", chunk["stop"], "of", movie.movie_name, "see", chunk["log_name"])
+                chunk["retries"] += 1
+                retry.append(chunk)
+
+            else:
+                print("Analysis of", movie.movie_name, "failed, see", chunk["log_name"])
+                movie.failed = True
+                if not movie.movie_name in failed:
+                    failed.append(movie.movie_name)
+
+    except KeyboardInterrupt:
+        print("Analysis stopped.")
+        for proc in procs:
+            if proc.poll() is None:
+                if (sys.platform == "win32"):
+                    proc.send_signal(signal.CTRL_C_EVENT)
+                else:
+                    proc.send_signal(signal.SIGINT)
+        return [movie.movie_name for movie in movies if not movie.isFinished()]
+
+    return failed
+
+
+if (__name__ == "__main__"):
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Analyze movies in parallel on a single computer.')
+
+    parser.add_argument('--exe', dest='exe', type=str, required=True,
+                        help = "The analysis program, for example storm_analysis/daostorm_3d/mufit_analysis.py.")
+    parser.add_argument('--movies', dest='movies', type=str, required=False, nargs = "*",
+                        help = "The names of the movies to analyze.")
+    parser.add_argument('--input_dir', dest='input_dir', type=str, required=False,
+                        help = "Analyze all the .dax movies in this directory.")
+    parser.add_argument('--output_dir', dest='output_dir', type=str, required=False,
+                        help = "The directory to save the results in, the default is the directory of each movie.")
+    parser.add_argument('--xml', dest='settings', type=str, required=True,
+                        help = "The name of the settings xml file.")
+    parser.add_argument('--processes', dest='processes', type=int, required=False, default = 2,
+                        help = "The number of analysis processes.")
+    parser.add_argument('--chunk_size', dest='chunk_size', type=int, required=False, default = 1000,
+                        help = "The maximum number of frames to analyze in one process.")
+    parser.add_argument('--retries', dest='retries', type=int, required=False, default = 2,
+                        help = "How many times to retry the analysis of a chunk that failed.")
+    parser.add_argument('--keep_chunks', dest='keep_chunks', action='store_true', default = False,
+                        help = "Keep the analysis files of each chunk.")
+    parser.add_argument('--link', dest='link', action='store_true', default = False,
+                        help = "Link to the localizations in the files of each chunk instead of copying them.")
+    parser.add_argument('--compact', dest='compact', action='store_true', default = False,
+                        help = "With --link, copy the localizations into the merged file after tracking.")
+
+    args = parser.parse_args()
+
+    movie_names = []
+    if args.movies is not None:
+        movie_names += args.movies
+    if args.input_dir is not None:
+        movie_names += sorted(glob.glob(os.path.join(args.input_dir, "*.dax")))
+
+    failed = parallelAnalysis(args.exe,
+                              movie_names,
+                              args.settings,
+                              output_dir = args.output_dir,
+                              n_processes = args.processes,
+                              chunk_size = args.chunk_size,
+                              max_retries = args.retries,
+                              keep_chunks = args.keep_chunks,
+                              link = args.link,
+                              compact = args.compact)
+    if (len(failed) > 0):
+        print("Failed:", ", ".join(failed))
+        sys.exit(1)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 agent
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
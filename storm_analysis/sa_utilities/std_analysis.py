@@ -4,8 +4,17 @@ Performs "standard" analysis on a SMLM movie given parameters.
 
 Hazen 1/18
 """
+import multiprocessing
 import numpy
 import os
+import signal
+import time
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 import storm_analysis
 
@@ -62,14 +71,29 @@ def driftCorrection(h5_name, parameters):
                                           max_z,
                                           z_correct)
 
-def peakFinding(find_peaks, movie_reader, data_writer, parameters):
+def peakFinding(find_peaks, movie_reader, data_writer, parameters, find_peaks_init = None):
     """
     Does the peak finding.
+
+    find_peaks_init - A function that creates a new find_peaks object from
+                      parameters, e.g. daostorm_3d.find_peaks.initFindAndFit.
+                      This is required in order to do the analysis in
+                      multiple processes.
     """
     verbosity = parameters.getAttr("verbosity")
     if (verbosity < 1):
         raise STDAnalysisException("Verbosity parameter must be >= 1.")
-    
+
+    if (parameters.getAttr("n_processes", 1) > 1):
+        if find_peaks_init is None:
+            print("No find_peaks initialization function, analyzing in a single process.")
+        else:
+            return peakFindingParallel(find_peaks, find_peaks_init, movie_reader, data_writer, parameters)
+
+    frame_stats = (parameters.getAttr("frame_stats", 0) != 0)
+    if frame_stats:
+        find_peaks.enableFrameStats()
+        
     curf = data_writer.getStartFrame()
     movie_reader.setup(curf)
 
@@ -80,11 +104,18 @@ def peakFinding(find_peaks, movie_reader, data_writer, parameters):
     try:
         while(movie_reader.nextFrame()):
 
-            # Find the localizations.
-            peaks = find_peaks.analyzeImage(movie_reader)
+            # Find the localizations, frames that are skipped have no localizations.
+            skipped = movie_reader.skipCurrentFrame()
+            if skipped:
+                peaks = find_peaks.getEmptyPeaks()
+            else:
+                peaks = find_peaks.analyzeImage(movie_reader)
 
             # Save results
+            start_time = time.time()
             data_writer.addPeaks(peaks, movie_reader)
+            if frame_stats and not skipped:
+                saveFrameStats(data_writer, find_peaks.getFrameStats(), movie_reader.getCurrentFrameNumber(), start_time)
 
             if ((movie_reader.getCurrentFrameNumber()%verbosity)==0):
                 print("Frame:",
@@ -92,6 +123,11 @@ def peakFinding(find_peaks, movie_reader, data_writer, parameters):
                       data_writer.getNumberAdded(),
                       data_writer.getTotalPeaks())
 
+            # Save the localizations if we have caught up with the acquisition
+            # of a movie that is still being acquired.
+            if not movie_reader.hasNextFrame():
+                data_writer.flush()
+
         print("")
         movie_reader.close()
         data_writer.close(True)
@@ -105,12 +141,185 @@ def peakFinding(find_peaks, movie_reader, data_writer, parameters):
         find_peaks.cleanUp()
         return False
 
-def standardAnalysis(find_peaks, movie_reader, data_writer, parameters):
+def peakFindingParallel(find_peaks, find_peaks_init, movie_reader, data_writer, parameters):
+    """
+    Does the peak finding using multiple processes.
+
+    Each process creates its own find_peaks object using find_peaks_init()
+    and analyzes the frames it takes from a shared queue. The results are
+    put back in frame order before they are saved, so the output is the
+    same as that of peakFinding() and an analysis restart works the same
+    way.
+    """
+    frame_stats = (parameters.getAttr("frame_stats", 0) != 0)
+    n_processes = parameters.getAttr("n_processes")
+    verbosity = parameters.getAttr("verbosity")
+
+    curf = data_writer.getStartFrame()
+    movie_reader.setup(curf)
+
+    # Limit the number of frames that are in memory at any one time.
+    max_pending = 4 * n_processes
+
+    frame_queue = multiprocessing.Queue()
+    results_queue = multiprocessing.Queue()
+    workers = []
+    for i in range(n_processes):
+        worker = multiprocessing.Process(target = peakFindingWorker,
+                                         args = (find_peaks_init, parameters, frame_queue, results_queue))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    # This is a dictionary of [analysisIO.MovieFrame, peaks, stats] keyed by frame number.
+    pending = {}
+    
+    try:
+        more_frames = True
+        while more_frames or bool(pending):
+
+            # Keep the workers busy.
+            while more_frames and (len(pending) < max_pending):
+
+                # If we have caught up with the acquisition of a movie that is still
+                # being acquired then save the results before waiting for more frames.
+                if not movie_reader.hasNextFrame():
+                    if bool(pending):
+                        break
+                    data_writer.flush()
+                    
+                more_frames = movie_reader.nextFrame()
+                if more_frames:
+                    movie_frame = movie_reader.getMovieFrame()
+                    if movie_reader.skipCurrentFrame():
+                        pending[movie_frame.getCurrentFrameNumber()] = [movie_frame, find_peaks.getEmptyPeaks(), None]
+                    else:
+                        pending[movie_frame.getCurrentFrameNumber()] = [movie_frame, None, None]
+                        frame_queue.put(movie_frame)
+
+            if not bool(pending):
+                break
+
+            # Wait for a result, unless the earliest frame was skipped.
+            if pending[min(pending)][1] is None:
+                [fnum, peaks, stats] = getWorkerResult(results_queue, workers)
+                pending[fnum][1] = peaks
+                pending[fnum][2] = stats
+
+            # Save results, in order, starting from the earliest frame.
+            while bool(pending):
+                fnum = min(pending)
+                [movie_frame, peaks, stats] = pending[fnum]
+                if peaks is None:
+                    break
+                del pending[fnum]
+
+                start_time = time.time()
+                data_writer.addPeaks(peaks, movie_frame)
+                if frame_stats and (stats is not None):
+                    saveFrameStats(data_writer, stats, fnum, start_time)
+
+                if ((fnum%verbosity)==0):
+                    print("Frame:",
+                          fnum,
+                          data_writer.getNumberAdded(),
+                          data_writer.getTotalPeaks())
+
+        for worker in workers:
+            frame_queue.put(None)
+        for worker in workers:
+            worker.join()
+            
+        print("")
+        movie_reader.close()
+        data_writer.close(True)
+        return True
+
+    except KeyboardInterrupt:
+        print("Analysis stopped.")
+        stopWorkers(workers)
+        movie_reader.close()
+        data_writer.close(False)
+        return False
+
+    except Exception:
+        stopWorkers(workers)
+        movie_reader.close()
+        data_writer.close(False)
+        raise
+
+    finally:
+        find_peaks.cleanUp()
+
+def getWorkerResult(results_queue, workers):
+    """
+    Wait for the next result from the peakFindingWorker() processes.
+    """
+    while True:
+        try:
+            [fnum, peaks, stats] = results_queue.get(timeout = 1.0)
+        except queue.Empty:
+            for worker in workers:
+                if not worker.is_alive():
+                    raise STDAnalysisException("Peak finding process exited unexpectedly.")
+            continue
+
+        if fnum is None:
+            raise STDAnalysisException("Peak finding process failed:\n" + peaks)
+
+        return [fnum, peaks, stats]
+
+def peakFindingWorker(find_peaks_init, parameters, frame_queue, results_queue):
+    """
+    Peak finding process, this analyzes analysisIO.MovieFrame objects from
+    frame_queue until it gets None.
+    """
+    # Let the main process handle keyboard interrupts.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    find_peaks = None
+    try:
+        find_peaks = find_peaks_init(parameters)
+        if (parameters.getAttr("frame_stats", 0) != 0):
+            find_peaks.enableFrameStats()
+        while True:
+            movie_frame = frame_queue.get()
+            if movie_frame is None:
+                break
+            peaks = find_peaks.analyzeImage(movie_frame)
+            results_queue.put([movie_frame.getCurrentFrameNumber(), peaks, find_peaks.getFrameStats()])
+        
+    except Exception:
+        results_queue.put([None, traceback.format_exc(), None])
+
+    finally:
+        if find_peaks is not None:
+            find_peaks.cleanUp()
+
+def saveFrameStats(data_writer, stats, frame_number, start_time):
+    """
+    Add the time spent saving the localizations of a frame to the frame
+    statistics and pass them to the data writer.
+    """
+    stats["time_save"] = time.time() - start_time
+    data_writer.addFrameStats(stats, frame_number)
+
+def stopWorkers(workers):
+    """
+    Stop the peakFindingWorker() processes after an error.
+    """
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join()
+
+def standardAnalysis(find_peaks, movie_reader, data_writer, parameters, find_peaks_init = None):
     """
     Perform standard analysis.
 
     movie_reader - sa_utilities.analysis_io.MovieReader object.
     data_writer - sa_utilities.analysis_io.DataWriter object.
+    find_peaks_init - (Optional) function to create more find_peaks objects, see peakFinding().
     """
     # Peak finding
     #
@@ -118,7 +327,7 @@ def standardAnalysis(find_peaks, movie_reader, data_writer, parameters):
     print("version", storm_analysis.__version__)
     print()
     print("Peak finding")
-    if peakFinding(find_peaks, movie_reader, data_writer, parameters):
+    if peakFinding(find_peaks, movie_reader, data_writer, parameters, find_peaks_init = find_peaks_init):
 
         # Do drift correction, tracking, and zfit (for '3d' model).
         #
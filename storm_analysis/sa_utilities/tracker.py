@@ -85,6 +85,130 @@ class Track(object):
         return self.props
 
 
+class Tracks(object):
+    """
+    Class to store & manipulate all of the tracks that are currently
+    active. This is equivalent to a list of Track objects, but with
+    each property stored in a numpy array (one element per track) so
+    that the tracks can be updated for all the localizations in a
+    frame at once.
+    """
+    def __init__(self, **kwds):
+        super(Tracks, self).__init__(**kwds)
+
+        self.category = numpy.zeros(0, dtype = numpy.int32)
+        self.frame_number = numpy.zeros(0, dtype = numpy.int32)
+        self.last_added = numpy.zeros(0, dtype = numpy.int32)
+        self.length = numpy.zeros(0, dtype = numpy.int32)
+        self.props = None
+        self.track_id = numpy.zeros(0, dtype = numpy.int64)
+        self.tw = numpy.zeros(0)
+        self.tx = numpy.zeros(0)
+        self.ty = numpy.zeros(0)
+        self.tz = numpy.zeros(0)
+
+    def addLocalizations(self, locs, weights, index_locs, index_tracks):
+        """
+        Add localizations to existing tracks. There must be at most one
+        localization per track.
+
+        locs - The localizations dictionary.
+        weights - The weight of each localization.
+        index_locs - The localizations to add.
+        index_tracks - The tracks to add them to.
+        """
+        if (index_locs.size == 0):
+            return
+        
+        w = weights[index_locs]
+        self.length[index_tracks] += 1
+        self.last_added[index_tracks] = 0
+        self.tw[index_tracks] += w
+        self.tx[index_tracks] += w*locs["x"][index_locs]
+        self.ty[index_tracks] += w*locs["y"][index_locs]
+        if "z" in locs:
+            self.tz[index_tracks] += w*locs["z"][index_locs]
+
+        for key in self.props:
+            self.props[key][index_tracks] += locs[key][index_locs]
+        
+    def getCenters(self):
+        """
+        Return current track centers.
+        """
+        return [self.tx/self.tw, self.ty/self.tw]
+
+    def getNTracks(self):
+        return self.track_id.size
+
+    def incLastAdded(self):
+        self.last_added += 1
+        
+    def newTracks(self, locs, weights, index_locs, category, frame_number, first_id):
+        """
+        Start a new track for each of the localizations in index_locs. The
+        tracks are added after the existing tracks.
+
+        Returns the track ids of the new tracks.
+        """
+        n_new = index_locs.size
+        track_id = numpy.arange(first_id, first_id + n_new, dtype = numpy.int64)
+        w = weights[index_locs]
+        
+        # Start from 0.0 like Track() does.
+        tz = numpy.zeros(n_new)
+        if "z" in locs:
+            tz += w*locs["z"][index_locs]
+
+        new = {"category" : numpy.full(n_new, category, dtype = numpy.int32),
+               "frame_number" : numpy.full(n_new, frame_number, dtype = numpy.int32),
+               "last_added" : numpy.zeros(n_new, dtype = numpy.int32),
+               "length" : numpy.ones(n_new, dtype = numpy.int32),
+               "track_id" : track_id,
+               "tw" : numpy.zeros(n_new) + w,
+               "tx" : numpy.zeros(n_new) + w*locs["x"][index_locs],
+               "ty" : numpy.zeros(n_new) + w*locs["y"][index_locs],
+               "tz" : tz}
+        for field in new:
+            setattr(self, field, numpy.concatenate((getattr(self, field), new[field])))
+
+        if self.props is None:
+            self.props = {}
+            for key in locs:
+                self.props[key] = locs[key][index_locs]
+        else:
+            for key in self.props:
+                self.props[key] = numpy.concatenate((self.props[key], locs[key][index_locs]))
+
+        return track_id
+
+    def removeTracks(self, mask):
+        """
+        Remove the tracks in mask.
+
+        Returns the removed tracks as a dictionary for TrackWriter.writeTracks().
+        """
+        removed = {}
+        if self.props is not None:
+            for key in self.props:
+                removed[key] = self.props[key][mask]
+                self.props[key] = self.props[key][~mask]
+
+        tw = self.tw[mask]
+        removed["category"] = self.category[mask]
+        removed["frame_number"] = self.frame_number[mask]
+        removed["track_id"] = self.track_id[mask]
+        removed["track_length"] = self.length[mask]
+        removed["x"] = self.tx[mask]/tw
+        removed["y"] = self.ty[mask]/tw
+        removed["z"] = self.tz[mask]/tw
+
+        for field in ["category", "frame_number", "last_added", "length", "track_id", "tw", "tx", "ty", "tz"]:
+            setattr(self, field, getattr(self, field)[~mask])
+
+        return removed
+
+    
 class TrackWriter(object):
     """
     This handles saving the tracks in the HDF5 file in blocks.
@@ -148,6 +272,44 @@ class TrackWriter(object):
         if (self.n_data == saH5Py.track_block_size):
             self.h5.addTracks(self.data)
             self.n_data = 0
+
+    def writeTracks(self, tracks):
+        """
+        Write a dictionary of tracks, as returned by Tracks.removeTracks().
+        """
+        n_tracks = tracks["track_id"].size
+        if (n_tracks == 0):
+            return
+        
+        # Check if we need to initialize self.data.
+        if not bool(self.data):
+            for field in tracks:
+                if field in ["category", "frame_number", "track_length"]:
+                    dtype = numpy.int32
+                elif (field == "track_id"):
+                    dtype = numpy.int64
+                elif field in ["x", "y", "z"]:
+                    dtype = numpy.float64
+                elif (tracks[field].dtype == numpy.int32):
+                    dtype = numpy.int32
+                else:
+                    dtype = numpy.float64
+                self.data[field] = numpy.zeros(saH5Py.track_block_size, dtype = dtype)
+
+        # Add tracks to data, one block at a time.
+        i = 0
+        while (i < n_tracks):
+            n_copy = min(n_tracks - i, saH5Py.track_block_size - self.n_data)
+            for field in self.data:
+                self.data[field][self.n_data:(self.n_data + n_copy)] = tracks[field][i:(i + n_copy)]
+            i += n_copy
+            self.n_data += n_copy
+            self.n_tracks += n_copy
+
+            # Add tracks to the HDF5 file if we have a full block.
+            if (self.n_data == saH5Py.track_block_size):
+                self.h5.addTracks(self.data)
+                self.n_data = 0
     
 
 def tracker(sa_hdf5_filename, descriptor = "", max_gap = 0, radius = 0.0):
@@ -175,7 +337,7 @@ def tracker(sa_hdf5_filename, descriptor = "", max_gap = 0, radius = 0.0):
     # Otherwise do the tracking.
     else:
         track_id = 0
-        current_tracks = []
+        current_tracks = Tracks()
         with saH5Py.SAH5Py(sa_hdf5_filename) as h5:
             tw = TrackWriter(h5)
             for fnum, locs in h5.localizationsIterator(skip_empty = False):
@@ -204,17 +366,24 @@ def tracker(sa_hdf5_filename, descriptor = "", max_gap = 0, radius = 0.0):
                 index_locs = None
                 locs_track_id = None
                 if bool(locs):
-
+                    n_locs = locs["x"].size
+                    
                     # Create numpy array for storage of the track id for each localization.
-                    locs_track_id = numpy.zeros(locs["x"].size, dtype = numpy.int64)
-                
-                    # Create arrays with current track centers. This is also increments
-                    # the tracks last added counter.
-                    tx = numpy.zeros(len(current_tracks))
-                    ty = numpy.zeros(len(current_tracks))
-                    for i, elt in enumerate(current_tracks):
-                        [tx[i], ty[i]] = elt.getCenter()
-                        elt.incLastAdded()
+                    locs_track_id = numpy.zeros(n_locs, dtype = numpy.int64)
+
+                    # Localization weights.
+                    #
+                    # FIXME: Weight values based on Mortensen error estimate? The current
+                    #        weighting is just a simple sqrt().
+                    #
+                    weights = numpy.ones(n_locs)
+                    if "sum" in locs:
+                        weights += numpy.sqrt(locs["sum"].astype(numpy.float64))
+                    
+                    # Get current track centers. This is also increments the tracks
+                    # last added counter.
+                    [tx, ty] = current_tracks.getCenters()
+                    current_tracks.incLastAdded()
                 
                     kd_locs = iaUtilsC.KDTree(locs["x"], locs["y"])
                     kd_tracks = iaUtilsC.KDTree(tx, ty)
@@ -222,70 +391,51 @@ def tracker(sa_hdf5_filename, descriptor = "", max_gap = 0, radius = 0.0):
                     # Query KD trees.
                     index_locs = kd_tracks.nearest(locs["x"], locs["y"], radius)[1]
                     index_tracks = kd_locs.nearest(tx, ty, radius)[1]
-                
+
+                    # Clean up KD trees.
+                    kd_locs.cleanup()
+                    kd_tracks.cleanup()
+                    
                     # Add localizations to tracks. The localization must be the closest
                     # one to the track and vice-versa. We're trying to avoid multiple
                     # localizations in a single frame in the track, and one localization
                     # in multiple tracks.
                     #
-                    for i in range(locs["x"].size):
-                        if (index_locs[i] > -1):
-                            
-                            # Check that the track and the localization agree that each
-                            # is closest to the other.
-                            #
-                            tr = None
-                            if (index_tracks[index_locs[i]] == i):
-                                tr = current_tracks[index_locs[i]]
-                                tr.addLocalization(locs, i)
-                            else:
-                                tr = Track(category = category,
-                                           frame_number = fnum,
-                                           track_id = track_id)
-                                tr.addLocalization(locs, i)
-                                current_tracks.append(tr)
-                                track_id += 1
-
-                            locs_track_id[i] = tr.track_id
-
-                    # Clean up KD trees.
-                    kd_locs.cleanup()
-                    kd_tracks.cleanup()
-
+                    matched = (index_locs > -1)
+                    mutual = numpy.zeros(n_locs, dtype = bool)
+                    mutual[matched] = (index_tracks[index_locs[matched]] == numpy.arange(n_locs)[matched])
+
+                    add_locs = numpy.nonzero(mutual)[0]
+                    add_tracks = index_locs[add_locs]
+                    current_tracks.addLocalizations(locs, weights, add_locs, add_tracks)
+                    locs_track_id[add_locs] = current_tracks.track_id[add_tracks]
+
+                    # Localizations that are close to a track but which are not the closest
+                    # localization to the track start a new track.
+                    new_locs = numpy.nonzero(matched & ~mutual)[0]
+                    locs_track_id[new_locs] = current_tracks.newTracks(locs, weights, new_locs, category, fnum, track_id)
+                    track_id += new_locs.size
+                    
                 # Otherwise just increment the current tracks last added counter.
                 else:
-                    for elt in current_tracks:
-                        elt.incLastAdded()
+                    current_tracks.incLastAdded()
 
                 # Remove tracks that have not had any localizations added for
                 # max_gap frames.
-                temp = current_tracks
-                current_tracks = []
-                for elt in temp:
-                    if(elt.getLastAdded() > max_gap):
-                        tw.writeTrack(elt)
-                    else:
-                        current_tracks.append(elt)
+                tw.writeTracks(current_tracks.removeTracks(current_tracks.last_added > max_gap))
 
                 # Start new tracks from the localizations that were not in
                 # a track.
                 if index_locs is not None:
-                    for i in range(locs["x"].size):
-                        if (index_locs[i] < 0):
-                            tr = Track(category = category,
-                                       frame_number = fnum,
-                                       track_id = track_id)
-                            tr.addLocalization(locs, i)
-                            current_tracks.append(tr)
-                            locs_track_id[i] = tr.track_id
-                            track_id += 1
+                    new_locs = numpy.nonzero(index_locs < 0)[0]
+                    locs_track_id[new_locs] = current_tracks.newTracks(locs, weights, new_locs, category, fnum, track_id)
+                    track_id += new_locs.size
 
                 # Add track information for localizations.
                 if locs_track_id is not None:
                     h5.addTrackID(locs_track_id, fnum)
 
             # Write the remaining tracks & close the track writer.
-            for elt in current_tracks:
-                tw.writeTrack(elt)
+            tw.writeTracks(current_tracks.removeTracks(numpy.ones(current_tracks.getNTracks(), dtype = bool)))
 
             tw.finish()
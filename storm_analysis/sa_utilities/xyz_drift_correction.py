@@ -87,6 +87,8 @@ def xyzDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
     
     xy_master = None
     xyz_master = None
+    xy_corr = imagecorrelation.XYCorrelator(shape = h5_dc.im_shape_2D, scale = scale)
+    z_corr = None
     t = []
     x = []
     y = []
@@ -114,8 +116,11 @@ def xyzDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
         if xy_master is None:
             if (numpy.sum(xy_curr) > 0):
                 xy_master = xy_curr
+                xy_corr.setReference(xy_master)
                 if correct_z:
                     xyz_master = h5_dc.grid3D(z_min, z_max)
+                    z_corr = imagecorrelation.ZCorrelator(shape = xyz_master.shape)
+                    z_corr.setReference(xyz_master)
             t.append(midp)
             x.append(0.0)
             y.append(0.0)
@@ -125,9 +130,9 @@ def xyzDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
                 
         # Correlate to master image, skipping empty images.
         if (numpy.sum(xy_curr) > 0):
-            [corr, dx, dy, xy_success] = imagecorrelation.xyOffset(xy_master, xy_curr, scale,
-                                                                   center = [x[i-1] * scale,
-                                                                             y[i-1] * scale])
+            [corr, dx, dy, xy_success] = xy_corr.offset(xy_curr,
+                                                        center = [x[i-1] * scale,
+                                                                  y[i-1] * scale])
         else:
             [corr, dx, dy, xy_success] = [0.0, 0.0, 0.0, False]
 
@@ -158,6 +163,7 @@ def xyzDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
         if xy_success:
             # Add current to master
             xy_master += h5_dc.grid2D(drift_corrected = True)
+            xy_corr.setReference(xy_master)
 
         #
         # Do Z correlation if requested.
@@ -172,7 +178,7 @@ def xyzDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
 
             # Do z correlation, skipping empty images.
             if (numpy.sum(xyz_curr) > 0):
-                [corr, fit, dz, z_success] = imagecorrelation.zOffset(xyz_master, xyz_curr)
+                [corr, fit, dz, z_success] = z_corr.offset(xyz_curr)
             else:
                 [corr, fit, dz, z_success] = [0.0, 0.0, 0.0, False]
             
@@ -187,6 +193,7 @@ def xyzDriftCorrection(hdf5_filename, drift_filename, step, scale, z_min, z_max,
             if z_success:
                 h5_dc.setDriftCorrectionZ(-dz)
                 xyz_master += h5_dc.grid3D(z_min, z_max, drift_corrected = True)
+                z_corr.setReference(xyz_master)
 
         z.append(-dz)
 
@@ -14,8 +14,36 @@ import storm_analysis.sa_library.sa_h5py as saH5Py
 
 import storm_analysis.slurm.check_analysis as checkAnalysis
 
-def mergeAnalysis(dir_name, h5_name):
+def linkAnalysis(dir_name, h5_name):
+    """
+    Like mergeAnalysis(), but the merged file links to the localizations
+    in the intermediate files instead of copying them. The intermediate
+    files must be kept. See sa_h5py.linkFiles().
+    """
+    job_xml_files = checkAnalysis.getSortedJobXML(dir_name)
+
+    sub_h5_names = []
+    for i in range(len(job_xml_files)):
+        sub_h5_name = os.path.join(dir_name, "p_" + str(i+1) + ".hdf5")
+        job_complete = False
+        if os.path.exists(sub_h5_name):
+            with saH5Py.SAH5Reader(sub_h5_name) as h5:
+                job_complete = h5.isAnalysisFinished()
 
+        if not job_complete:
+            print("Merge failed because", job_xml_files[i], "is incomplete.")
+            return
+        sub_h5_names.append(sub_h5_name)
+
+    saH5Py.linkFiles(sub_h5_names, h5_name, sa_type = "merged")
+    
+    
+def mergeAnalysis(dir_name, h5_name, link = False):
+
+    if link:
+        linkAnalysis(dir_name, h5_name)
+        return
+    
     with saH5Py.SAH5Py(h5_name, is_existing = False, sa_type = "merged") as merged_h5:
 
         # Get job XML files.
@@ -63,9 +91,9 @@ if (__name__ == "__main__"):
                         help = "The name of the analysis working directory.")
     parser.add_argument('--h5_name', dest='merged', type=str, required=True,
                         help = "The name for the merged localization file.")
-    parser.add_argument('--ext', dest='ext', type=str, required=False, default=[".bin"], nargs = "*",
-                        help = "The name of the extensions, if any.")
+    parser.add_argument('--link', dest='link', action='store_true', default = False,
+                        help = "Link to the localizations in the intermediate files instead of copying them.")
 
     args = parser.parse_args()
 
-    mergeAnalysis(args.wdir, args.merged, args.ext)
+    mergeAnalysis(args.wdir, args.merged, link = args.link)
@@ -30,6 +30,11 @@ def loadCubicFitC():
     cubic_fit.mFitGetNError.argtypes = [ctypes.c_void_p]
     cubic_fit.mFitGetNError.restype = ctypes.c_int
     
+    cubic_fit.mFitGetPeakProperties.argtypes = [ctypes.c_void_p,
+                                                ndpointer(dtype=numpy.float64),
+                                                ndpointer(dtype=numpy.int32),
+                                                ctypes.c_int]
+
     cubic_fit.mFitGetPeakPropertyDouble.argtypes = [ctypes.c_void_p,
                                                     ndpointer(dtype=numpy.float64),
                                                     ctypes.c_char_p]
@@ -57,7 +62,12 @@ def loadCubicFitC():
     cubic_fit.mFitRemoveRunningPeaks.argtypes = [ctypes.c_void_p]
 
     cubic_fit.mFitSetPeakStatus.argtypes = [ctypes.c_void_p,
-                                            ndpointer(dtype=numpy.int32)]    
+                                            ndpointer(dtype=numpy.int32)]
+
+    cubic_fit.mFitUpdateFitImage.argtypes = [ctypes.c_void_p,
+                                             ndpointer(dtype=numpy.float64),
+                                             ndpointer(dtype=numpy.int32)]
+    cubic_fit.mFitUpdateFitImage.restype = ctypes.c_int
     
     # From spliner/cubic_spline.c
     cubic_fit.getZSize.argtypes = [ctypes.c_void_p]
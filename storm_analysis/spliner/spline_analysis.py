@@ -4,6 +4,7 @@ Perform spline analysis on a dax file given parameters.
 
 Hazen 01/16
 """
+import functools
 
 import storm_analysis.spliner.find_peaks_decon as findPeaksDecon
 import storm_analysis.spliner.find_peaks_std as findPeaksSTD
@@ -29,9 +30,11 @@ def analyze(movie_name, mlist_name, settings_name):
     # Create appropriate finding and fitting object.
     if parameters.hasAttr("decon_method"):
         finder = findPeaksDecon.initFindAndFit(parameters, settings_name)
+        find_peaks_init = functools.partial(findPeaksDecon.initFindAndFit, settings_name = settings_name)
     else:
         parameters = params.ParametersSplinerSTD().initFromFile(settings_name)
         finder = findPeaksSTD.initFindAndFit(parameters)
+        find_peaks_init = findPeaksSTD.initFindAndFit
 
     # Create appropriate reader.
     if parameters.hasAttr("camera_offset"):
@@ -53,7 +56,8 @@ def analyze(movie_name, mlist_name, settings_name):
     std_analysis.standardAnalysis(finder,
                                   movie_reader,
                                   data_writer,
-                                  parameters)
+                                  parameters,
+                                  find_peaks_init = find_peaks_init)
 
 
 if (__name__ == "__main__"):
@@ -5,6 +5,7 @@ import storm_analysis
 
 import storm_analysis.daostorm_3d.find_peaks as findPeaks
 import storm_analysis.sa_library.parameters as params
+import storm_analysis.sa_library.sa_h5py as saH5Py
 
 import storm_analysis.test.verifications as veri
 
@@ -109,6 +110,62 @@ def test_3ddao_2d():
         raise Exception("3D-DAOSTORM 2D did not find the expected number of localizations.")
 
 
+def test_3ddao_2d_threads():
+    """
+    Test that multi-threaded fitting gives the same results as single-threaded fitting.
+    """
+    from storm_analysis.daostorm_3d.mufit_analysis import analyze
+
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    mlists = []
+    for n_threads in [1, 4]:
+        mt_settings = storm_analysis.getPathOutputTest("test_3d_2d_mt.xml")
+        parameters = params.ParametersDAO().initFromFile(settings)
+        parameters.changeAttr("fit_threads", n_threads)
+        parameters.toXMLFile(mt_settings, remove_paths = False)
+
+        mlist = storm_analysis.getPathOutputTest("test_3d_2d_mt_" + str(n_threads) + ".hdf5")
+        storm_analysis.removeFile(mlist)
+        analyze(movie_name, mlist, mt_settings)
+        mlists.append(mlist)
+
+    with saH5Py.SAH5Reader(mlists[0]) as h5_1:
+        with saH5Py.SAH5Reader(mlists[1]) as h5_2:
+            assert (h5_1.getNLocalizations() == h5_2.getNLocalizations())
+            for fnum, locs_1 in h5_1.localizationsIterator(drift_corrected = False):
+                locs_2 = h5_2.getLocalizationsInFrame(fnum)
+                for field in ["background", "height", "x", "y", "xsigma"]:
+                    assert numpy.array_equal(locs_1[field], locs_2[field])
+
+    
+def test_3ddao_2d_tiled():
+    """
+    Test analyzing the images as a grid of tiles.
+    """
+    from storm_analysis.daostorm_3d.mufit_analysis import analyze
+
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    for tile_threads in [1, 2]:
+        tile_settings = storm_analysis.getPathOutputTest("test_3d_2d_tiled.xml")
+        parameters = params.ParametersDAO().initFromFile(settings)
+        parameters.changeAttr("tile_size", 128)
+        parameters.changeAttr("tile_threads", tile_threads)
+        parameters.toXMLFile(tile_settings, remove_paths = False)
+
+        mlist = storm_analysis.getPathOutputTest("test_3d_2d_tiled.hdf5")
+        storm_analysis.removeFile(mlist)
+        analyze(movie_name, mlist, tile_settings)
+
+        # Verify number of localizations found.
+        num_locs = veri.verifyNumberLocalizations(mlist)
+        if not veri.verifyIsCloseEnough(num_locs, 1970):
+            raise Exception("3D-DAOSTORM 2D tiled did not find the expected number of localizations.")
+
+    
 def test_3ddao_3d():
 
     movie_name = storm_analysis.getData("test/data/test.dax")
@@ -172,6 +229,8 @@ if (__name__ == "__main__"):
     test_3ddao_2d_fixed_low_snr()
     test_3ddao_2d_fixed_non_square()
     test_3ddao_2d()
+    test_3ddao_2d_threads()
+    test_3ddao_2d_tiled()
     test_3ddao_3d()
     test_3ddao_Z()
     test_3ddao_scmos_cal()
@@ -3,15 +3,63 @@
 Test of sa_library.analysis_io
 """
 import numpy
+import os
 
 import storm_analysis
 import storm_analysis.sa_library.analysis_io as analysisIO
+import storm_analysis.sa_library.datawriter as datawriter
+import storm_analysis.sa_library.fitting as fitting
+import storm_analysis.sa_library.parameters as params
+import storm_analysis.sa_library.sa_h5py as saH5Py
+import storm_analysis.sa_utilities.std_analysis as stdAnalysis
 import storm_analysis.sCMOS.reslice_calibration as resliceCalibration
 
 
 cal_size = (20, 18)
 
 
+class FakeFinder(object):
+    """
+    A stand-in for a find_peaks object that finds one localization in every frame.
+    """
+    def analyzeImage(self, movie_reader):
+        return {"x" : numpy.array([1.0]),
+                "y" : numpy.array([2.0]),
+                "height" : numpy.array([numpy.max(movie_reader.getFrame())])}
+
+    def cleanUp(self):
+        pass
+
+    def getEmptyPeaks(self):
+        return {"x" : numpy.zeros(0), "y" : numpy.zeros(0), "height" : numpy.zeros(0)}
+
+
+class FollowDataWriter(analysisIO.DataWriterHDF5):
+    """
+    A HDF5 data writer that adds frames to a movie that is being acquired
+    every time that the analysis catches up with the acquisition.
+    """
+    def __init__(self, dax = None, frames = None, **kwds):
+        super(FollowDataWriter, self).__init__(**kwds)
+        self.dax = dax
+        self.frames = frames
+        self.n_saved = []
+
+    def flush(self):
+        super(FollowDataWriter, self).flush()
+
+        # Check that the localizations have been saved.
+        with saH5Py.SAH5Reader(self.filename) as h5:
+            self.n_saved.append(h5.getNLocalizations())
+
+        # Acquire the next frame, the last frame also finishes the acquisition.
+        self.dax.addFrame(self.frames[self.dax.l])
+        if (self.dax.l == self.frames.shape[0]):
+            self.dax.close()
+        else:
+            self.dax.fp.flush()
+
+
 def test_cal_v0():
     """
     Test loading a v0 calibration file.
@@ -123,6 +171,272 @@ def test_cal_reslice():
 
     assert(analysisIO.isLatestFormat(cal_rs_file))
     
+
+
+def test_movie_reader_prefetch():
+    """
+    Test that the prefetching MovieReader returns the same frames and backgrounds.
+    """
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    parameters = params.ParametersDAO().initFromFile(settings)
+    parameters.changeAttr("static_background_estimate", 4)
+
+    readers = []
+    for prefetch in [0, 3]:
+        parameters.changeAttr("prefetch_frames", prefetch)
+        frame_reader = analysisIO.FrameReaderStd(movie_file = movie_name,
+                                                 parameters = parameters)
+        movie_reader = analysisIO.MovieReader(frame_reader = frame_reader,
+                                              parameters = parameters)
+        movie_reader.setup(-1)
+        readers.append(movie_reader)
+
+    assert readers[0].getPrefetcher() is None
+    assert readers[1].getPrefetcher() is not None
+    
+    n_frames = 0
+    while readers[0].nextFrame():
+        assert readers[1].nextFrame()
+        assert (readers[0].getCurrentFrameNumber() == readers[1].getCurrentFrameNumber())
+        assert numpy.array_equal(readers[0].getFrame(), readers[1].getFrame())
+        assert numpy.array_equal(readers[0].getBackground(), readers[1].getBackground())
+        n_frames += 1
+    assert not readers[1].nextFrame()
+    assert (n_frames == readers[0].getMovieL())
+    assert (readers[1].getPrefetcher().getStatistics()[0] == n_frames)
+    
+    for movie_reader in readers:
+        movie_reader.close()
+
+def test_frame_reader_buffer():
+    """
+    Test that loading frames into a re-used buffer gives the same frames.
+    """
+    movie_name = storm_analysis.getData("test/data/test.dax")
+
+    # Offset is large enough that some pixels get clamped to 1.0.
+    frame_reader = analysisIO.FrameReaderStd(movie_file = movie_name,
+                                             camera_gain = 2.0,
+                                             camera_offset = 110.0)
+    [movie_x, movie_y, movie_l] = frame_reader.filmSize()
+    
+    buffer = numpy.zeros((movie_y, movie_x))
+    for i in range(movie_l):
+        frame = frame_reader.movie_data.loadAFrame(i)
+        expected = (frame - 110.0) * 0.5
+        expected[(expected < 1.0)] = 1.0
+        
+        assert numpy.array_equal(frame_reader.loadAFrame(i), expected)
+        assert (frame_reader.loadAFrame(i, out = buffer) is buffer)
+        assert numpy.array_equal(buffer, expected)
+
+    frame_reader.close()
+
+def test_frame_reader_crop():
+    """
+    Test cropping the frames to the analysis AOI.
+    """
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    parameters = params.ParametersDAO().initFromFile(settings)
+    parameters.changeAttr("x_start", 10)
+    parameters.changeAttr("x_stop", 40)
+    parameters.changeAttr("y_start", 20)
+    parameters.changeAttr("y_stop", 30)
+
+    readers = []
+    for aoi_crop in [-1, 5]:
+        parameters.changeAttr("aoi_crop", aoi_crop)
+        frame_reader = analysisIO.FrameReaderStd(movie_file = movie_name,
+                                                 parameters = parameters)
+        movie_reader = analysisIO.MovieReader(frame_reader = frame_reader,
+                                              parameters = parameters)
+        movie_reader.setup(-1)
+        readers.append(movie_reader)
+
+    assert readers[0].getCrop() is None
+    assert (readers[1].getCrop() == [5, 45, 15, 35])
+    assert (readers[0].getMovieX() == readers[1].getMovieX())
+    assert (readers[0].getMovieY() == readers[1].getMovieY())
+
+    while readers[0].nextFrame():
+        assert readers[1].nextFrame()
+        assert numpy.array_equal(readers[0].getFrame()[15:35,5:45], readers[1].getFrame())
+        
+    for movie_reader in readers:
+        movie_reader.close()
+
+def test_movie_reader_follow():
+    """
+    Test analyzing a movie while it is being acquired.
+    """
+    movie_name = storm_analysis.getPathOutputTest("test_follow.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    parameters = params.ParametersDAO().initFromFile(settings)
+    parameters.changeAttr("follow", 1)
+    parameters.changeAttr("follow_frame_size", [20, 16])
+    parameters.changeAttr("follow_timeout", 0.5)
+
+    # Remove the .inf file from a previous test, if any.
+    inf_name = os.path.splitext(movie_name)[0] + ".inf"
+    if os.path.exists(inf_name):
+        os.remove(inf_name)
+
+    frames = numpy.random.randint(100, 1000, size = (5, 16, 20))
+    dax = datawriter.DaxWriter(movie_name)
+    for i in range(3):
+        dax.addFrame(frames[i])
+    dax.fp.flush()
+
+    frame_reader = analysisIO.FrameReaderStd(movie_file = movie_name,
+                                             parameters = parameters,
+                                             camera_gain = 1.0,
+                                             camera_offset = 0.0)
+    movie_reader = analysisIO.MovieReader(frame_reader = frame_reader,
+                                          parameters = parameters)
+    movie_reader.setup(-1)
+
+    for i in range(3):
+        assert movie_reader.hasNextFrame()
+        assert movie_reader.nextFrame()
+        assert numpy.allclose(movie_reader.getFrame(), frames[i])
+    assert not movie_reader.hasNextFrame()
+
+    # More frames and then the .inf file.
+    for i in range(3, 5):
+        dax.addFrame(frames[i])
+    dax.close()
+
+    for i in range(3, 5):
+        assert movie_reader.hasNextFrame()
+        assert movie_reader.nextFrame()
+        assert numpy.allclose(movie_reader.getFrame(), frames[i])
+    assert movie_reader.hasNextFrame()
+    assert not movie_reader.nextFrame()
+    assert (movie_reader.getMovieL() == 5)
+    
+    movie_reader.close()
+
+def test_movie_reader_follow_bigendian():
+    """
+    Test analyzing a big endian movie while it is being acquired.
+    """
+    movie_name = storm_analysis.getPathOutputTest("test_follow_be.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    parameters = params.ParametersDAO().initFromFile(settings)
+    parameters.changeAttr("follow", 1)
+    parameters.changeAttr("follow_bigendian", 1)
+    parameters.changeAttr("follow_frame_size", [20, 16])
+    parameters.changeAttr("follow_timeout", 0.5)
+
+    inf_name = os.path.splitext(movie_name)[0] + ".inf"
+    if os.path.exists(inf_name):
+        os.remove(inf_name)
+
+    frames = numpy.random.randint(100, 1000, size = (3, 16, 20))
+    frames.astype(">u2").tofile(movie_name)
+
+    frame_reader = analysisIO.FrameReaderStd(movie_file = movie_name,
+                                             parameters = parameters,
+                                             camera_gain = 1.0,
+                                             camera_offset = 0.0)
+    movie_reader = analysisIO.MovieReader(frame_reader = frame_reader,
+                                          parameters = parameters)
+    movie_reader.setup(-1)
+
+    for i in range(3):
+        assert movie_reader.hasNextFrame()
+        assert movie_reader.nextFrame()
+        assert numpy.allclose(movie_reader.getFrame(), frames[i])
+    assert not movie_reader.hasNextFrame()
+
+    movie_reader.close()
+
+def test_peak_finding_follow():
+    """
+    Test that the localizations are saved whenever the analysis catches up
+    with the acquisition of the movie.
+    """
+    movie_name = storm_analysis.getPathOutputTest("test_follow.dax")
+    h5_name = storm_analysis.getPathOutputTest("test_follow.hdf5")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    parameters = params.ParametersDAO().initFromFile(settings)
+    parameters.changeAttr("follow", 1)
+    parameters.changeAttr("follow_frame_size", [20, 16])
+    parameters.changeAttr("follow_timeout", 0.5)
+
+    for name in [h5_name, os.path.splitext(movie_name)[0] + ".inf"]:
+        if os.path.exists(name):
+            os.remove(name)
+
+    frames = numpy.random.randint(100, 1000, size = (5, 16, 20))
+    dax = datawriter.DaxWriter(movie_name)
+    for i in range(3):
+        dax.addFrame(frames[i])
+    dax.fp.flush()
+
+    frame_reader = analysisIO.FrameReaderStd(movie_file = movie_name,
+                                             parameters = parameters,
+                                             camera_gain = 1.0,
+                                             camera_offset = 0.0)
+    movie_reader = analysisIO.MovieReader(frame_reader = frame_reader,
+                                          parameters = parameters)
+    data_writer = FollowDataWriter(dax = dax,
+                                   frames = frames,
+                                   data_file = h5_name,
+                                   parameters = parameters,
+                                   sa_type = "3D-DAOSTORM")
+
+    assert stdAnalysis.peakFinding(FakeFinder(), movie_reader, data_writer, parameters)
+
+    # The analysis caught up with the acquisition after the 3rd and the 4th frames.
+    assert (data_writer.n_saved == [3, 4])
+
+    with saH5Py.SAH5Reader(h5_name) as h5:
+        assert h5.isAnalysisFinished()
+        assert (h5.getMovieLength() == 5)
+        assert (h5.getNLocalizations() == 5)
+        locs = h5.getLocalizations()
+        assert numpy.allclose(locs["height"], numpy.max(frames, axis = (1, 2)))
+
+def test_storage_options():
+    """
+    Test getting the HDF5 storage options from the parameters.
+    """
+    parameters = params.ParametersDAO()
+    assert (analysisIO.getStorageOptions(parameters) is None)
+
+    parameters.changeAttr("hdf5_compression", "gzip")
+    parameters.changeAttr("hdf5_compression_level", 9)
+    parameters.changeAttr("hdf5_shuffle", 1)
+    storage = analysisIO.getStorageOptions(parameters)
+    assert (storage == {"compression" : "gzip", "compression_level" : 9, "shuffle" : True})
+
+    h5_name = storm_analysis.getPathOutputTest("test_storage.hdf5")
+    with saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True, storage = storage) as h5:
+        h5.setMovieInformation(100, 100, 1, "")
+        h5.addLocalizations({"x" : numpy.arange(10.0)}, 0)
+        assert (h5.getGroup(0)["x"].compression_opts == 9)
+
+def test_pad_array():
+    """
+    Test padding into an existing array.
+    """
+    image = numpy.random.uniform(size = (10, 12))
+    for margin in [1, 3]:
+        expected = numpy.pad(image, margin, mode = "symmetric")
+        assert numpy.array_equal(fitting.padArray(image, margin), expected)
+        
+        out = numpy.zeros(expected.shape)
+        assert (fitting.padArray(image, margin, out = out) is out)
+        assert numpy.array_equal(out, expected)
+        
     
 if (__name__ == "__main__"):
     test_cal_v0()
@@ -130,3 +444,11 @@ if (__name__ == "__main__"):
     test_cal_v2()
     test_cal_error_handling()
     test_cal_reslice()
+    test_movie_reader_prefetch()
+    test_frame_reader_buffer()
+    test_frame_reader_crop()
+    test_movie_reader_follow()
+    test_movie_reader_follow_bigendian()
+    test_peak_finding_follow()
+    test_storage_options()
+    test_pad_array()
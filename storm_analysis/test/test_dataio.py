@@ -167,8 +167,77 @@ def test_io_5():
     assert(numpy.allclose(data[0,:,:], rd.loadAFrame(0)))
 
     
+
+
+def test_io_6():
+    """
+    Test memmap DAX movie IO.
+    """
+    for movie_name in [storm_analysis.getData("test/data/test.dax"),
+                       storm_analysis.getPathOutputTest("test_dataio.dax")]:
+
+        if not ("data" in movie_name):
+            data = numpy.random.randint(0, 60000, (10, 50, 40)).astype(numpy.uint16)
+            wr = datawriter.inferWriter(movie_name)
+            for i in range(data.shape[0]):
+                wr.addFrame(data[i,:,:])
+            wr.close()
+        
+        rd = datareader.inferReader(movie_name)
+        rd_mm = datareader.inferReader(movie_name, memmap = True)
+        assert not rd.isMemmap()
+        assert rd_mm.isMemmap()
+        assert (rd.filmSize() == rd_mm.filmSize())
+        assert (rd.hashID() == rd_mm.hashID())
+
+        ml = rd.filmSize()[2]
+        for i in range(ml):
+            assert numpy.array_equal(rd.loadAFrame(i), rd_mm.loadAFrame(i))
+        assert numpy.array_equal(rd.loadFrames(2, ml), rd_mm.loadFrames(2, ml))
+        assert numpy.allclose(rd.averageFrames(), rd_mm.averageFrames())
+
+        rd.close()
+        rd_mm.close()
+
+def test_io_7():
+    """
+    Test SPE movie IO.
+    """
+    movie_h = 50
+    movie_w = 40
+    movie_l = 10
+    
+    data = numpy.random.randint(0, 60000, (movie_l, movie_h, movie_w)).astype(numpy.uint16)
+
+    movie_name = storm_analysis.getPathOutputTest("test_dataio.spe")
+
+    # Write a minimal SPE file, uint16 data.
+    header = numpy.zeros(4100, dtype = numpy.uint8)
+    header[42:44] = numpy.array([movie_w], dtype = numpy.uint16).view(numpy.uint8)
+    header[108:110] = numpy.array([3], dtype = numpy.uint16).view(numpy.uint8)
+    header[656:658] = numpy.array([movie_h], dtype = numpy.uint16).view(numpy.uint8)
+    header[1446:1450] = numpy.array([movie_l], dtype = numpy.uint32).view(numpy.uint8)
+    with open(movie_name, "wb") as fp:
+        header.tofile(fp)
+        data.tofile(fp)
+
+    for memmap in [False, True]:
+        rd = datareader.inferReader(movie_name, memmap = memmap)
+        [mw, mh, ml] = rd.filmSize()
+
+        assert(mh == movie_h)
+        assert(mw == movie_w)
+        assert(ml == movie_l)
+        assert(rd.isMemmap() == memmap)
+        for i in range(movie_l):
+            assert(numpy.array_equal(data[i,:,:], rd.loadAFrame(i)))
+        assert(numpy.array_equal(data[3:7,:,:], rd.loadFrames(3, 7)))
+        rd.close()
+
+
 if (__name__ == "__main__"):
     test_io_1()
     test_io_2()
     test_io_3()
-    
+    test_io_6()
+    test_io_7()
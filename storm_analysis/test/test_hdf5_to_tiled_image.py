@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Tests of tiled HDF5 to image conversion.
+"""
+import h5py
+import numpy
+import tifffile
+
+import storm_analysis
+
+import storm_analysis.sa_library.sa_h5py as saH5Py
+import storm_analysis.sa_utilities.hdf5_to_image as hdf5ToImage
+import storm_analysis.sa_utilities.hdf5_to_tiled_image as hdf5ToTiledImage
+
+
+def makeTestFile(h5_name):
+    numpy.random.seed(0)
+    with saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True) as h5:
+        h5.setMovieInformation(40,30,10,"")
+        h5.setPixelSize(100.0)
+        for i in range(10):
+            peaks = {"x" : numpy.random.uniform(high = 40.0, size = 50),
+                     "y" : numpy.random.uniform(high = 30.0, size = 50)}
+            h5.addLocalizations(peaks, i)
+    
+
+def test_hdf5_to_tiled_image_1():
+    """
+    Test that the tiled images are the same as the standard images.
+    """
+    h5_name = storm_analysis.getPathOutputTest("test_hdf5_to_tiled_image.hdf5")
+    makeTestFile(h5_name)
+
+    for sigma in [None, 1.0]:
+        image = hdf5ToImage.render2DImage(h5_name, scale = 2, sigma = sigma)
+
+        # HDF5 pyramid.
+        p_name = storm_analysis.getPathOutputTest("test_hdf5_to_tiled_image_p.hdf5")
+        hdf5ToTiledImage.renderTiled(h5_name, p_name, scale = 2, sigma = sigma, tile_size = 16, levels = 2)
+        with h5py.File(p_name, "r") as pyramid:
+            level_0 = pyramid["level_0"][()]
+            level_1 = pyramid["level_1"][()]
+            assert numpy.allclose(pyramid["level_1"].attrs["pixel_size"], 100.0)
+
+        assert (level_0.shape == image.shape)
+        assert numpy.allclose(level_0, image, atol = 1.0e-5)
+        assert (level_1.shape == (30, 40))
+        assert numpy.allclose(level_1, image.reshape(30, 2, 40, 2).mean(axis = (1,3)), atol = 1.0e-5)
+
+        # TIFF, single threaded.
+        t_name = storm_analysis.getPathOutputTest("test_hdf5_to_tiled_image.tif")
+        hdf5ToTiledImage.renderTiled(h5_name, t_name, scale = 2, sigma = sigma, tile_size = 16, n_threads = 1)
+        assert numpy.allclose(tifffile.imread(t_name), image, atol = 1.0e-5)
+        
+
+if (__name__ == "__main__"):
+    test_hdf5_to_tiled_image_1()
+    
@@ -130,9 +130,67 @@ def test_align3d_4():
     assert(q_score > 10.0)
     assert(numpy.allclose(image1, aligned, rtol = 1.0e-2, atol = 1.0e-2))
     
+
+def test_xy_correlator_1():
+    """
+    Test that XYCorrelator matches xyOffset().
+    """
+    numpy.random.seed(1)
+    image1 = numpy.random.poisson(lam = 1.0, size = (60, 80))
+    images = [numpy.roll(numpy.roll(image1, 3, axis = 0), -5, axis = 1),
+              numpy.roll(image1, 2, axis = 1),
+              numpy.random.poisson(lam = 1.0, size = (60, 80))]
+
+    xy_corr = imgCorr.XYCorrelator(shape = image1.shape, scale = 1)
+    xy_corr.setReference(image1)
+    offsets = xy_corr.offsets(numpy.array(images))
+    for i, image in enumerate(images):
+        [corr, dx, dy, success] = imgCorr.xyOffset(image1, image, 1)
+        assert(numpy.allclose(corr, offsets[i][0]))
+        assert(numpy.allclose([dx, dy], offsets[i][1:3]))
+        assert(success == offsets[i][3])
+
+    assert(numpy.allclose(offsets[0][1:3], [-3.0, 5.0], atol = 0.1))
+
+
+def test_z_correlator_1():
+    """
+    Test that ZCorrelator matches zOffset().
+    """
+    numpy.random.seed(1)
+    image1 = numpy.random.poisson(lam = 1.0, size = (20, 30, 10))
+    image2 = numpy.zeros(image1.shape)
+    image2[:,:,2:] = image1[:,:,:-2]
+
+    z_corr = imgCorr.ZCorrelator(shape = image1.shape)
+    z_corr.setReference(image1)
+    [corr1, fit1, dz1, success1] = z_corr.offset(image2)
+    [corr2, fit2, dz2, success2] = imgCorr.zOffset(image1, image2)
+    assert(numpy.allclose(corr1, corr2))
+    assert(abs(dz1 - dz2) < 1.0e-3)
+    assert(success1 == success2)
+
+
+def test_z_correlator_2():
+    """
+    Test ZCorrelator with data that is actually 2D.
+    """
+    image1 = numpy.zeros((20, 30, 10))
+    image1[5:10,5:10,4] = 1.0
+
+    z_corr = imgCorr.ZCorrelator(shape = image1.shape)
+    z_corr.setReference(image1)
+    [corr1, fit1, dz1, success1] = z_corr.offset(image1)
+    [corr2, fit2, dz2, success2] = imgCorr.zOffset(image1, image1)
+    assert(numpy.array_equal(corr1 > 0.0, corr2 > 0.0))
+    assert(dz1 == dz2)
+    
     
 if (__name__ == "__main__"):
     test_align3d_1()
     test_align3d_2()
     test_align3d_3()
     test_align3d_4()
+    test_xy_correlator_1()
+    test_z_correlator_1()
+    test_z_correlator_2()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Tests of sa_library.loadclib
+"""
+import ctypes
+import numpy
+from numpy.ctypeslib import ndpointer
+
+import storm_analysis.sa_library.loadclib as loadclib
+
+
+def test_loadclib_1():
+    """
+    Test that libraries are only loaded when a function is called.
+    """
+    grid = loadclib.loadCLibrary("grid")
+    grid.grid2D.argtypes = [ndpointer(dtype=numpy.int32),
+                            ndpointer(dtype=numpy.int32),
+                            ndpointer(dtype=numpy.int32),
+                            ctypes.c_int,
+                            ctypes.c_int,
+                            ctypes.c_int]
+    grid2D = grid.grid2D
+    assert not grid.isLoaded()
+
+    image = numpy.zeros((4,5), dtype = numpy.int32)
+    x = numpy.array([1, 1, 3], dtype = numpy.int32)
+    y = numpy.array([2, 2, 4], dtype = numpy.int32)
+    grid.grid2D(image, x, y, image.shape[0], image.shape[1], x.size)
+    assert grid.isLoaded()
+    assert (image[1,2] == 2)
+    assert (image[3,4] == 1)
+
+    # The argument types were set when the library was loaded.
+    assert (len(grid.grid2D.argtypes) == 6)
+    try:
+        grid.grid2D(image.astype(numpy.float64), x, y, image.shape[0], image.shape[1], x.size)
+    except ctypes.ArgumentError:
+        pass
+    else:
+        assert False
+
+    # References to the function from before the library was loaded also work.
+    grid2D(image, x, y, image.shape[0], image.shape[1], x.size)
+    assert (image[1,2] == 4)
+    
+
+if (__name__ == "__main__"):
+    test_loadclib_1()
+
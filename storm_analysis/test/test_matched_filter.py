@@ -5,7 +5,10 @@ Tests for sa_library.matched_filter_c.py
 Hazen 06/17
 """
 import numpy
+import os
 
+import storm_analysis
+import storm_analysis.sa_library.fftw_wisdom as fftwWisdom
 import storm_analysis.sa_library.matched_filter_c as matchedFilterC
 import storm_analysis.sa_library.recenter_psf as recenterPSF
 import storm_analysis.simulator.draw_gaussians_c as dg
@@ -177,8 +180,87 @@ def test_matched_filter5():
     assert(numpy.allclose(mf_conv, np_conv))
 
     flt.cleanup()
+
+
+def test_matched_filter6():
+    """
+    Verify that FFTW wisdom is saved, that it is only saved again if there is
+    new wisdom, and that it has no effect on the results.
+    """
+    x_size = 80
+    y_size = 90
+
+    wisdom_file = storm_analysis.getPathOutputTest("test_fftw_wisdom.txt")
+    if os.path.exists(wisdom_file):
+        os.remove(wisdom_file)
+
+    objects = numpy.zeros((1, 5))
+    objects[0,:] = [x_size/2, y_size/2, 1.0, 1.0, 1.0]
+    psf = dg.drawGaussians((x_size, y_size), objects)
+    psf = psf/numpy.sum(psf)
+
+    image = numpy.zeros((x_size, y_size))
+    image[int(x_size/2), int(y_size/2)] = float(100)
+
+    old_wisdom = os.environ.get("STORM_ANALYSIS_FFTW_WISDOM")
+    os.environ["STORM_ANALYSIS_FFTW_WISDOM"] = wisdom_file
+    try:
+        flt1 = matchedFilterC.MatchedFilter(psf)
+        assert os.path.exists(wisdom_file)
+        inode = os.stat(wisdom_file).st_ino
+
+        # Filters created with wisdom should give the same answer.
+        fftwWisdom.importWisdom()
+        flt2 = matchedFilterC.MatchedFilter(psf)
+        assert(numpy.allclose(flt1.convolve(image), flt2.convolve(image)))
+
+        # No new wisdom so the file should not have been replaced.
+        assert (os.stat(wisdom_file).st_ino == inode)
+    finally:
+        if old_wisdom is None:
+            del os.environ["STORM_ANALYSIS_FFTW_WISDOM"]
+        else:
+            os.environ["STORM_ANALYSIS_FFTW_WISDOM"] = old_wisdom
+
+    flt1.cleanup()
+    flt2.cleanup()
+
+
+def test_matched_filter7():
+    """
+    Verify that MultiMatchedFilter gives the same results as MatchedFilter.
+    """
+    x_size = 80
+    y_size = 90
+
+    objects = numpy.zeros((1, 5))
+
+    psfs = []
+    for sigma in [1.0, 1.5, 2.0]:
+        objects[0,:] = [x_size/2, y_size/2, 1.0, sigma, sigma]
+        psf = dg.drawGaussians((x_size, y_size), objects)
+        psfs.append(psf/numpy.sum(psf))
+
+    image = numpy.random.uniform(size = (x_size, y_size))
+
+    for [memoize, n_threads] in [[False, 1], [True, 1], [False, 2]]:
+        mflt = matchedFilterC.MultiMatchedFilter(psfs, memoize = memoize, n_threads = n_threads)
+
+        # Do this twice to check memoization.
+        for i in range(2):
+            convs = mflt.convolve(image)
+            assert (convs.shape == (len(psfs), x_size, y_size))
+
+            for j, psf in enumerate(psfs):
+                flt = matchedFilterC.MatchedFilter(psf)
+                assert(numpy.allclose(convs[j], flt.convolve(image)))
+                flt.cleanup()
+
+        mflt.cleanup()
     
 
 if (__name__ == "__main__"):
     test_matched_filter5()
+    test_matched_filter6()
+    test_matched_filter7()
 
@@ -499,6 +499,93 @@ def test_mfit_12():
 
     mfit.cleanup(verbose = False)
 
+def test_mfit_13():
+    """
+    Test that getPeakProperties() matches getPeakProperty().
+    """
+    sigma = 1.5
+    background = numpy.zeros((50, 60)) + 10.0
+    image = dg.drawGaussians((50, 60),
+                             numpy.array([[20.0, 15.0, 100.0, sigma, sigma],
+                                          [30.0, 35.0, 150.0, sigma, sigma]]))
+    image += background
+
+    mfit = daoFitC.MultiFitter3D(sigma_range = [1.0, 2.0])
+    mfit.initializeC(image)
+    mfit.newImage(image)
+    mfit.newBackground(background)
+
+    # No peaks.
+    props = mfit.getPeakProperties(["status", "x"])
+    assert (props["status"].size == 0)
+    assert (props["x"].size == 0)
+    
+    peaks = {"x" : numpy.array([15.0, 35.0]),
+             "y" : numpy.array([20.0, 30.0]),
+             "z" : numpy.array([0.0, 0.0]),
+             "sigma" : numpy.array([sigma, sigma])}
+
+    mfit.newPeaks(peaks, "finder")
+    mfit.doFit()
+
+    p_names = ["background", "bg_sum", "error", "fg_sum", "height", "iterations", "jacobian",
+               "significance", "status", "sum", "x", "xsigma", "y", "ysigma", "z"]
+    props = mfit.getPeakProperties(p_names)
+    for p_name in p_names:
+        values = mfit.getPeakProperty(p_name)
+        assert (props[p_name].dtype == values.dtype)
+        assert numpy.array_equal(props[p_name], values)
+
+    mfit.cleanup(verbose = False)
+
+
+def test_mfit_14():
+    """
+    Test that the incrementally updated fit image matches the full fit image.
+    """
+    sigma = 1.5
+    background = numpy.zeros((50, 60)) + 10.0
+    image = dg.drawGaussians((50, 60),
+                             numpy.array([[20.0, 15.0, 100.0, sigma, sigma],
+                                          [30.0, 35.0, 150.0, sigma, sigma]]))
+    image += background
+
+    mfit = daoFitC.MultiFitter3D(sigma_range = [1.0, 2.0])
+    mfit.initializeC(image)
+    mfit.newImage(image)
+    mfit.newBackground(background)
+
+    def fullFitImage():
+        fit_image = numpy.zeros(image.shape)
+        mfit.clib.mFitGetFitImage(mfit.mfit, fit_image)
+        return fit_image
+
+    # No peaks.
+    assert numpy.allclose(mfit.getFitImage(), numpy.zeros(image.shape))
+
+    # Add one peak at a time, only the region around the new peak should change.
+    for i, [x, y] in enumerate([[15.0, 20.0], [35.0, 30.0]]):
+        peaks = {"x" : numpy.array([x]),
+                 "y" : numpy.array([y]),
+                 "z" : numpy.array([0.0]),
+                 "sigma" : numpy.array([sigma])}
+        mfit.newPeaks(peaks, "finder")
+        assert numpy.array_equal(mfit.getFitImage(), fullFitImage())
+        
+        bounds = mfit.fit_image_bounds
+        assert (bounds[0] <= x) and (x < bounds[1])
+        assert (bounds[2] <= y) and (y < bounds[3])
+        assert ((bounds[1] - bounds[0]) < image.shape[1])
+
+        mfit.doFit()
+        assert numpy.array_equal(mfit.getFitImage(), fullFitImage())
+
+    # A new image resets the fit image.
+    mfit.newImage(image)
+    assert numpy.allclose(mfit.getFitImage(), numpy.zeros(image.shape))
+
+    mfit.cleanup(verbose = False)
+    
 
 if (__name__ == "__main__"):
     test_mfit_1()
@@ -513,4 +600,6 @@ if (__name__ == "__main__"):
     test_mfit_10()
     test_mfit_11()
     test_mfit_12()
+    test_mfit_13()
+    test_mfit_14()
     
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Tests of sa_utilities.parallel_analysis
+"""
+import numpy
+import os
+
+import storm_analysis
+
+import storm_analysis.sa_library.sa_h5py as saH5Py
+import storm_analysis.sa_utilities.parallel_analysis as parallelAnalysis
+
+
+def test_parallel_analysis_1():
+    """
+    Test dividing a movie into chunks.
+    """
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    movie = parallelAnalysis.MovieChunks(movie_name = movie_name,
+                                         h5_name = storm_analysis.getPathOutputTest("test_pa.hdf5"),
+                                         work_dir = storm_analysis.getPathOutputTest("test_pa_chunks"),
+                                         settings_xml = settings)
+
+    chunks = []
+    chunk = movie.nextChunk(2, 4)
+    while chunk is not None:
+        chunks.append(chunk)
+        chunk = movie.nextChunk(2, 4)
+
+    # The chunks cover the whole movie, and they get smaller towards the end.
+    assert (chunks[0]["start"] == 0)
+    assert (chunks[-1]["stop"] == 10)
+    for i in range(1, len(chunks)):
+        assert (chunks[i]["start"] == chunks[i-1]["stop"])
+        assert ((chunks[i]["stop"] - chunks[i]["start"]) <= (chunks[i-1]["stop"] - chunks[i-1]["start"]))
+    assert not movie.isFinished()
+
+    for chunk in chunks:
+        movie.finishChunk(chunk)
+    assert movie.isFinished()
+
+
+def test_parallel_analysis_2():
+    """
+    Test that parallel analysis gives the same localizations as standard analysis.
+    """
+    from storm_analysis.daostorm_3d.mufit_analysis import analyze
+
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    h5_std = storm_analysis.getPathOutputTest("test_pa_std.hdf5")
+    storm_analysis.removeFile(h5_std)
+    analyze(movie_name, h5_std, settings)
+
+    analysis_exe = os.path.join(os.path.dirname(storm_analysis.__file__), "daostorm_3d", "mufit_analysis.py")
+    failed = parallelAnalysis.parallelAnalysis(analysis_exe,
+                                               [movie_name],
+                                               settings,
+                                               output_dir = storm_analysis.getPathOutputTest(),
+                                               n_processes = 2,
+                                               chunk_size = 4)
+    assert (len(failed) == 0)
+
+    h5_pa = storm_analysis.getPathOutputTest("test.hdf5")
+    with saH5Py.SAH5Reader(h5_std) as h5_1:
+        with saH5Py.SAH5Reader(h5_pa) as h5_2:
+            assert h5_2.isAnalysisFinished()
+            assert (h5_1.getMovieLength() == h5_2.getMovieLength())
+            assert (h5_1.getNLocalizations() == h5_2.getNLocalizations())
+            for fnum, locs_1 in h5_1.localizationsIterator():
+                locs_2 = h5_2.getLocalizationsInFrame(fnum)
+                for field in ["background", "height", "x", "y"]:
+                    assert numpy.array_equal(locs_1[field], locs_2[field])
+
+
+if (__name__ == "__main__"):
+    test_parallel_analysis_1()
+    test_parallel_analysis_2()
+
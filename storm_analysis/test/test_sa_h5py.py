@@ -5,6 +5,7 @@ understanding of how to use the h5py module.
 """
 import h5py
 import numpy
+import os
 
 import storm_analysis
 
@@ -571,7 +572,269 @@ def test_sa_h5py_19():
         for elt in ["bar", "y"]:
             assert not elt in locs
     
+def writeTestFile(h5_name, layout, frames = [0, 1, 2, 4]):
+    """
+    Write the same localizations using the requested layout.
+    """
+    with saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True, layout = layout) as h5:
+        h5.setMovieInformation(100, 100, 6, "")
+        for i in frames:
+            n_locs = 2*i
+            peaks = {"x" : numpy.arange(n_locs, dtype = numpy.float64),
+                     "y" : i * numpy.ones(n_locs)}
+            h5.addLocalizations(peaks, i)
+            h5.addLocalizations({"x" : -peaks["x"]}, i, channel = 1)
+            h5.setDriftCorrection(i, dx = 0.1 * i, dz = 0.01 * i)
+        if 4 in frames:
+            h5.addCategory(2, 4)
+
         
+def test_sa_h5py_20():
+    """
+    Test that the 'columnar' layout returns the same localizations as the 'frames' layout.
+    """
+    filenames = []
+    for layout in ["frames", "columnar"]:
+        h5_name = storm_analysis.getPathOutputTest("test_sa_hdf5_" + layout + ".hdf5")
+        writeTestFile(h5_name, layout)
+        filenames.append(h5_name)
+
+    with saH5Py.SAH5Reader(filenames[0]) as h5_f:
+        with saH5Py.SAH5Reader(filenames[1]) as h5_c:
+            assert not h5_f.isColumnar()
+            assert h5_c.isColumnar()
+            assert (h5_f.getAnalyzedFrames() == [0, 1, 2, 4])
+            assert (h5_c.getAnalyzedFrames() == [0, 1, 2, 4])
+            assert (h5_c.getNLocalizations() == h5_f.getNLocalizations())
+            assert (h5_c.getNChannels() == 2)
+
+            for i in range(6):
+                assert (h5_c.isAnalyzed(i) == h5_f.isAnalyzed(i))
+
+            for drift_corrected in [False, True]:
+                locs_f = h5_f.getLocalizations(drift_corrected = drift_corrected)
+                locs_c = h5_c.getLocalizations(drift_corrected = drift_corrected)
+                assert (sorted(locs_f.keys()) == sorted(locs_c.keys()))
+                for field in ["x", "y", "c1_x"]:
+                    assert numpy.allclose(locs_f[field], locs_c[field])
+
+            # Frame 4 is the only one with the category field.
+            assert numpy.array_equal(h5_c.getLocalizationsInFrame(4)["category"], 2*numpy.ones(8))
+
+            iter_f = list(h5_f.localizationsIterator(skip_empty = False, fields = ["x", "y"]))
+            iter_c = list(h5_c.localizationsIterator(skip_empty = False, fields = ["x", "y"]))
+            assert (len(iter_f) == 6)
+            assert (len(iter_c) == 6)
+            for [fnum_f, locs_f], [fnum_c, locs_c] in zip(iter_f, iter_c):
+                assert (fnum_f == fnum_c)
+                assert (sorted(locs_f.keys()) == sorted(locs_c.keys()))
+                for field in locs_f:
+                    assert numpy.allclose(locs_f[field], locs_c[field])
+
+            
+def test_sa_h5py_21():
+    """
+    Test adding to an existing 'columnar' file and conversion between layouts.
+    """
+    h5_name = storm_analysis.getPathOutputTest("test_sa_hdf5_columnar.hdf5")
+    writeTestFile(h5_name, "columnar")
+
+    with saH5Py.SAH5Py(h5_name) as h5:
+        assert h5.isColumnar()
+        h5.addLocalizations({"x" : numpy.ones(3), "y" : numpy.ones(3)}, 5)
+        h5.addLocalizationZ(numpy.zeros(3), 5)
+
+    with saH5Py.SAH5Reader(h5_name) as h5:
+        assert (h5.getNLocalizations() == 17)
+        locs = h5.getLocalizationsInFrame(5)
+        assert numpy.allclose(locs["x"], numpy.ones(3))
+        assert numpy.allclose(locs["z"], numpy.zeros(3))
+        assert numpy.allclose(h5.getDriftCorrection(4), [0.4, 0.0, 0.04])
+
+    # Round trip through the 'frames' layout.
+    f_name = storm_analysis.getPathOutputTest("test_sa_hdf5_frames.hdf5")
+    c_name = storm_analysis.getPathOutputTest("test_sa_hdf5_columnar2.hdf5")
+    saH5Py.convertLayout(h5_name, f_name, "frames")
+    saH5Py.convertLayout(f_name, c_name, "columnar")
+
+    for name in [f_name, c_name]:
+        with saH5Py.SAH5Reader(h5_name) as h5_in:
+            with saH5Py.SAH5Reader(name) as h5_out:
+                assert (h5_out.isColumnar() == (name == c_name))
+                assert (h5_in.getAnalyzedFrames() == h5_out.getAnalyzedFrames())
+                assert (h5_in.getMovieInformation() == h5_out.getMovieInformation())
+                for fnum in h5_in.getAnalyzedFrames():
+                    assert numpy.allclose(h5_in.getDriftCorrection(fnum), h5_out.getDriftCorrection(fnum))
+                locs_in = h5_in.getLocalizations(drift_corrected = True, fields = ["x", "y", "c1_x"])
+                locs_out = h5_out.getLocalizations(drift_corrected = True, fields = ["x", "y", "c1_x"])
+                for field in locs_in:
+                    assert numpy.allclose(locs_in[field], locs_out[field])
+    
+def test_sa_h5py_22():
+    """
+    Test getting localizations in a frame range, with and without the frame column.
+    """
+    for layout in ["frames", "columnar"]:
+        h5_name = storm_analysis.getPathOutputTest("test_sa_hdf5_" + layout + ".hdf5")
+        writeTestFile(h5_name, layout)
+
+        with saH5Py.SAH5Reader(h5_name) as h5:
+            locs = h5.getLocalizationsInFrameRange(1, 5, drift_corrected = True, frame_column = True)
+            assert numpy.array_equal(locs["frame"], numpy.array([1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 4, 4, 4]))
+            assert numpy.allclose(locs["y"], locs["frame"])
+            
+            for i in [1, 2, 4]:
+                temp = h5.getLocalizationsInFrame(i, drift_corrected = True)
+                mask = (locs["frame"] == i)
+                for field in temp:
+                    assert numpy.allclose(locs[field][mask], temp[field])
+
+            locs = h5.getLocalizationsInFrameRange(0, 2, fields = ["x"])
+            assert (list(locs.keys()) == ["x"])
+            assert (locs["x"].size == 2)
+
+            assert not bool(h5.getLocalizationsInFrameRange(3, 4))
+
+
+def test_sa_h5py_23():
+    """
+    Test linking files together and compacting the linked file.
+    """
+    for layout in ["frames", "columnar"]:
+        h5_name = storm_analysis.getPathOutputTest("test_sa_hdf5_" + layout + ".hdf5")
+        writeTestFile(h5_name, layout)
+
+        part_names = []
+        for frames in [[0, 1], [2, 4]]:
+            part_name = storm_analysis.getPathOutputTest("test_sa_hdf5_part" + str(frames[0]) + ".hdf5")
+            writeTestFile(part_name, layout, frames = frames)
+            part_names.append(part_name)
+
+        # Metadata and pixel size are optional.
+        if (layout == "frames"):
+            with saH5Py.SAH5Py(part_names[0]) as h5:
+                h5.addMetadata("<xml><field1>data</field1></xml>")
+                h5.setPixelSize(100.0)
+
+        l_name = storm_analysis.getPathOutputTest("test_sa_hdf5_linked.hdf5")
+        saH5Py.linkFiles(part_names, l_name)
+
+        with saH5Py.SAH5Reader(l_name) as h5:
+            if (layout == "frames"):
+                assert (h5.getPixelSize() == 100.0)
+                with saH5Py.SAH5Reader(part_names[0]) as h5_part:
+                    assert (h5.getMetadata() == h5_part.getMetadata())
+            else:
+                assert not ("pixel_size" in h5.hdf5.attrs)
+                assert not ("metadata.xml" in h5.hdf5)
+
+        # Changes to the localizations are made in the linked files.
+        for name in [h5_name, l_name]:
+            with saH5Py.SAH5Py(name) as h5:
+                h5.addCategory(3, 1)
+                h5.addLocalizationData(5.0 * numpy.ones(2), 1, "y")
+        with saH5Py.SAH5Reader(part_names[0]) as h5:
+            assert numpy.allclose(h5.getLocalizationsInFrame(1)["y"], 5.0)
+
+        for compact in [False, True]:
+            if compact:
+                saH5Py.compactFile(l_name)
+                for part_name in part_names:
+                    os.remove(part_name)
+
+            with saH5Py.SAH5Reader(h5_name) as h5_in:
+                with saH5Py.SAH5Reader(l_name) as h5_out:
+                    assert (h5_out.isColumnar() == (layout == "columnar"))
+                    assert (h5_in.getAnalyzedFrames() == h5_out.getAnalyzedFrames())
+                    assert (h5_in.getMovieInformation() == h5_out.getMovieInformation())
+                    assert (h5_in.getNLocalizations() == h5_out.getNLocalizations())
+                    assert (h5_in.getNChannels() == h5_out.getNChannels())
+                    for fnum in h5_in.getAnalyzedFrames():
+                        assert numpy.allclose(h5_in.getDriftCorrection(fnum), h5_out.getDriftCorrection(fnum))
+                        locs_in = h5_in.getLocalizationsInFrame(fnum, drift_corrected = True)
+                        locs_out = h5_out.getLocalizationsInFrame(fnum, drift_corrected = True)
+                        assert (sorted(locs_in.keys()) == sorted(locs_out.keys()))
+                        for field in locs_in:
+                            assert numpy.allclose(locs_in[field], locs_out[field])
+
+
+def test_sa_h5py_24():
+    """
+    Test storage options.
+    """
+    storage = {"chunk_size" : 4,
+               "compression" : "gzip",
+               "shuffle" : True,
+               "single_precision" : "y,tx"}
+    
+    for layout in ["frames", "columnar"]:
+        h5_name = storm_analysis.getPathOutputTest("test_sa_hdf5_" + layout + ".hdf5")
+        with saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True, layout = layout, storage = storage) as h5:
+            h5.setMovieInformation(100, 100, 10, "")
+            for i in range(3):
+                h5.addLocalizations({"x" : numpy.arange(10.0), "y" : numpy.arange(10.0)}, i)
+            h5.addLocalizations({"x" : numpy.zeros(0), "y" : numpy.zeros(0)}, 3)
+            h5.addTracks({"tx" : numpy.arange(10.0), "x" : numpy.arange(10.0)})
+
+        # The options also apply to datasets that are added later.
+        with saH5Py.SAH5Py(h5_name) as h5:
+            assert (h5.getStorage()["compression"] == "gzip")
+            h5.addCategory(1, 2)
+
+        with saH5Py.SAH5Reader(h5_name) as h5:
+            if (layout == "frames"):
+                datasets = [h5.getGroup(0)["x"], h5.getGroup(2)["category"]]
+            else:
+                datasets = [h5.hdf5["locs"]["x"], h5.hdf5["locs"]["category"]]
+            for dset in datasets:
+                assert (dset.compression == "gzip")
+                assert dset.shuffle
+                assert (dset.chunks == (4,))
+
+            for fnum, locs in h5.localizationsIterator(fields = ["x", "y"]):
+                assert (locs["x"].dtype == numpy.float64)
+                assert (locs["y"].dtype == numpy.float32)
+                assert numpy.allclose(locs["x"], numpy.arange(10.0))
+                assert numpy.allclose(locs["y"], numpy.arange(10.0))
+            assert numpy.allclose(h5.getLocalizationsInFrame(2)["category"], 1)
+
+            tracks = h5.getTracks()
+            assert (tracks["tx"].dtype == numpy.float32)
+            assert numpy.allclose(tracks["x"], numpy.arange(10.0))
+
+    # Unknown options.
+    h5_name = storm_analysis.getPathOutputTest("test_sa_hdf5.hdf5")
+    for bad in [{"compress" : "gzip"}, {"compression" : "bzip2"}]:
+        try:
+            saH5Py.SAH5Py(h5_name, is_existing = False, overwrite = True, storage = bad)
+        except saH5Py.SAH5PyException:
+            pass
+        else:
+            assert False
+                    
+        
+def test_sa_h5py_25():
+    """
+    Test setting the drift corrections of multiple frames at once.
+    """
+    fnums = numpy.arange(6)
+    dx = 0.1 * fnums
+    dy = -0.2 * fnums
+    dz = 0.03 * fnums
+    for layout in ["frames", "columnar"]:
+        h5_name = storm_analysis.getPathOutputTest("test_sa_hdf5_" + layout + ".hdf5")
+        writeTestFile(h5_name, layout)
+
+        # Frames 3 and 5 are not in the file and are ignored.
+        with saH5Py.SAH5Py(h5_name) as h5:
+            h5.setDriftCorrections(fnums, dx, dy, dz)
+
+        with saH5Py.SAH5Reader(h5_name) as h5:
+            for fnum in h5.getAnalyzedFrames():
+                assert numpy.allclose(numpy.array(h5.getDriftCorrection(fnum)),
+                                      numpy.array([dx[fnum], dy[fnum], dz[fnum]]))
+
+
 if (__name__ == "__main__"):
     test_sa_h5py_1()
     test_sa_h5py_2()
@@ -592,4 +855,10 @@ if (__name__ == "__main__"):
     test_sa_h5py_17()
     test_sa_h5py_18()
     test_sa_h5py_19()
+    test_sa_h5py_20()
+    test_sa_h5py_21()
+    test_sa_h5py_22()
+    test_sa_h5py_23()
+    test_sa_h5py_24()
+    test_sa_h5py_25()
     
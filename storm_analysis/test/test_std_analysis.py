@@ -53,7 +53,119 @@ def test_std_analysis_1():
             assert(numpy.allclose(tracks["category"], category))
     
 
+def test_std_analysis_2():
+    """
+    Test that multi-process analysis gives the same results as single process analysis.
+    """
+    from storm_analysis.daostorm_3d.mufit_analysis import analyze
+
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+    mp_settings = storm_analysis.getPathOutputTest("test_3d_2d_mp.xml")
+
+    parameters = params.ParametersDAO().initFromFile(settings)
+    parameters.changeAttr("n_processes", 2)
+    parameters.toXMLFile(mp_settings, remove_paths = False)
+
+    h5_names = []
+    for i, xml in enumerate([settings, mp_settings]):
+        h5_name = storm_analysis.getPathOutputTest("test_std_analysis_" + str(i) + ".hdf5")
+        storm_analysis.removeFile(h5_name)
+        analyze(movie_name, h5_name, xml)
+        h5_names.append(h5_name)
+
+    with saH5Py.SAH5Reader(h5_names[0]) as h5_sp:
+        with saH5Py.SAH5Reader(h5_names[1]) as h5_mp:
+            assert h5_mp.isAnalysisFinished()
+            assert (h5_sp.getNLocalizations() == h5_mp.getNLocalizations())
+            for fnum, locs_sp in h5_sp.localizationsIterator():
+                locs_mp = h5_mp.getLocalizationsInFrame(fnum)
+                assert (sorted(locs_sp.keys()) == sorted(locs_mp.keys()))
+                for field in locs_sp:
+                    assert numpy.array_equal(locs_sp[field], locs_mp[field])
+
+
+def test_std_analysis_3():
+    """
+    Test saving per-frame analysis statistics, single and multi-process.
+    """
+    from storm_analysis.daostorm_3d.mufit_analysis import analyze
+
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    for n_processes in [1, 2]:
+        fs_settings = storm_analysis.getPathOutputTest("test_3d_2d_fs.xml")
+        parameters = params.ParametersDAO().initFromFile(settings)
+        parameters.changeAttr("n_processes", n_processes)
+        parameters.changeAttr("frame_stats", 1)
+        parameters.toXMLFile(fs_settings, remove_paths = False)
+
+        h5_name = storm_analysis.getPathOutputTest("test_std_analysis_fs.hdf5")
+        storm_analysis.removeFile(h5_name)
+        analyze(movie_name, h5_name, fs_settings)
+
+        with saH5Py.SAH5Reader(h5_name) as h5:
+            stats = h5.getFrameStats()
+            n_frames = h5.getMovieLength()
+            assert numpy.array_equal(stats["frame"], numpy.arange(n_frames))
+            assert (numpy.sum(stats["n_peaks"]) == h5.getNLocalizations())
+            for fnum, locs in h5.localizationsIterator():
+                assert (stats["n_peaks"][fnum] == locs["x"].size)
+            assert (numpy.sum(stats["iterations"]) > 0)
+            for field in ["n_dposv", "n_margin", "n_neg_height", "time_fit", "time_save", "time_total"]:
+                assert (stats[field].size == n_frames)
+            assert numpy.all(stats["time_total"] >= stats["time_fit"])
+
+
+def test_std_analysis_4():
+    """
+    Test skipping frames based on their descriptor, single and multi-process.
+    """
+    from storm_analysis.daostorm_3d.mufit_analysis import analyze
+
+    movie_name = storm_analysis.getData("test/data/test.dax")
+    settings = storm_analysis.getData("test/data/test_3d_2d.xml")
+
+    h5_all = storm_analysis.getPathOutputTest("test_std_analysis_all.hdf5")
+    storm_analysis.removeFile(h5_all)
+    analyze(movie_name, h5_all, settings)
+
+    for n_processes in [1, 2]:
+        skip_settings = storm_analysis.getPathOutputTest("test_3d_2d_skip.xml")
+        parameters = params.ParametersDAO().initFromFile(settings)
+        parameters.changeAttr("descriptor", "01")
+        parameters.changeAttr("n_processes", n_processes)
+        parameters.changeAttr("skip_descriptors", "0")
+        parameters.toXMLFile(skip_settings, remove_paths = False)
+
+        h5_name = storm_analysis.getPathOutputTest("test_std_analysis_skip.hdf5")
+        storm_analysis.removeFile(h5_name)
+        analyze(movie_name, h5_name, skip_settings)
+
+        with saH5Py.SAH5Reader(h5_all) as h5_1:
+            with saH5Py.SAH5Reader(h5_name) as h5_2:
+                assert h5_2.isAnalysisFinished()
+                for fnum in range(h5_1.getMovieLength()):
+                    assert h5_2.isAnalyzed(fnum)
+                    locs_2 = h5_2.getLocalizationsInFrame(fnum, fields = ["x"])
+
+                    # Even frames are skipped.
+                    if ((fnum%2) == 0):
+                        assert (not bool(locs_2)) or (locs_2["x"].size == 0)
+                        
+                    # Odd frames are analyzed normally.
+                    else:
+                        locs_1 = h5_1.getLocalizationsInFrame(fnum)
+                        locs_2 = h5_2.getLocalizationsInFrame(fnum)
+                        for field in ["background", "height", "x", "y"]:
+                            assert numpy.array_equal(locs_1[field], locs_2[field])
+
+
 if (__name__ == "__main__"):
     test_std_analysis_1()
+    test_std_analysis_2()
+    test_std_analysis_3()
+    test_std_analysis_4()
 
     
@@ -324,6 +324,38 @@ def test_tracker_8():
         assert(h5.getNTracks() == 6)
         for t in h5.tracksIterator():
             assert(numpy.allclose(numpy.ones(6), t["track_length"]))
+
+
+def test_tracker_9():
+    """
+    Test tracking with more tracks than fit in a single block.
+    """
+    n_locs = saH5Py.track_block_size + 500
+    peaks = {"x" : numpy.arange(n_locs, dtype = numpy.float64),
+             "y" : numpy.ones(n_locs),
+             "sum" : numpy.ones(n_locs)}
+
+    filename = "test_sa_hdf5.hdf5"
+    h5_name = storm_analysis.getPathOutputTest(filename)
+    storm_analysis.removeFile(h5_name)
+
+    # Write data.
+    with saH5Py.SAH5Py(h5_name, is_existing = False) as h5:
+        for i in range(3):
+            h5.addLocalizations(peaks, i)
+        h5.addMovieInformation(FakeReader(n_frames = 3))
+
+    # Track.
+    tracker.tracker(h5_name, max_gap = 1, radius = 0.1)
+
+    # Tracking.
+    with saH5Py.SAH5Py(h5_name) as h5:
+        assert(h5.getNTracks() == n_locs)
+        tracks = h5.getTracks()
+        assert(numpy.array_equal(tracks["track_id"], numpy.arange(n_locs)))
+        assert(numpy.allclose(tracks["x"], peaks["x"]))
+        assert(numpy.allclose(tracks["track_length"], 3*numpy.ones(n_locs)))
+        assert(numpy.allclose(tracks["sum"], 3*numpy.ones(n_locs)))
             
             
 if (__name__ == "__main__"):
@@ -335,5 +367,6 @@ if (__name__ == "__main__"):
     test_tracker_6()
     test_tracker_7()
     test_tracker_8()
+    test_tracker_9()
 
     